@@ -0,0 +1,147 @@
+"""
+corpus_dedup.py
+
+Near-duplicate filtering for the Doc2Vec training corpus.
+
+Each MNISQ directory holds tens of thousands of QASM files, and many of
+them encode almost the same circuit. Every document is reduced to a MinHash
+signature over the k-token shingles (with repeats) of its simple_preprocess tokens, the same
+tokens Doc2Vec sees. Locality-sensitive hashing (LSH) bands the signatures
+into buckets to find candidates. Documents are visited in corpus order: one
+joins the first earlier representative whose estimated Jaccard similarity
+to it reaches the threshold, or becomes a representative itself. Every
+member is compared with its representative, so A~B and B~C do not put A
+and C together unless A~C.
+
+Training then keeps one document per cluster, the representative, with its
+own tags only; a document with many tags would be trained on the sum of
+their vectors, at a cost that grows with the tag count. The dropped
+documents' tags are returned as aliases of the representative's first tag,
+and train_embedding.py copies that vector to them after training, so every
+file still has a vector in model.dv.
+
+Token and shingle hashes use crc32 and fixed-seed permutations, not
+Python's salted hash(), so signatures from different worker processes can
+be compared.
+"""
+
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 32          # 32 bands x 4 rows: pairs at Jaccard 0.9 share a bucket with probability > 0.99
+SHINGLE_SIZE = 5
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, 2**63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2**63, size=NUM_PERM, dtype=np.uint64)
+_SHINGLE_MULT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def shingle_hashes(tokens, k=SHINGLE_SIZE):
+    """
+    Distinct uint64 hashes of the k-token shingles as a multiset: the n-th
+    repeat of a shingle hashes differently from the first. simple_preprocess
+    keeps gate names but drops qubit indices, so with plain sets a 15- and a
+    100-qubit GHZ circuit would look identical.
+    """
+    if not tokens:
+        return np.zeros(0, dtype=np.uint64)
+    tok = np.fromiter((zlib.crc32(t.encode()) for t in tokens), dtype=np.uint64, count=len(tokens))
+    k = min(k, len(tok))
+    n = len(tok) - k + 1
+    h = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for j in range(k):
+            h = h * _SHINGLE_MULT + tok[j:j + n]
+        h.sort()
+        # Occurrence number within each run of equal hashes.
+        starts = np.flatnonzero(np.r_[True, h[1:] != h[:-1]])
+        run_start = np.repeat(starts, np.diff(np.r_[starts, n]))
+        rank = np.arange(n, dtype=np.uint64) - run_start.astype(np.uint64)
+        return h ^ (rank * _SHINGLE_MULT)
+
+
+def minhash(shingles, chunk=4096):
+    """uint32[NUM_PERM] MinHash signature; multiply-shift hashing, mod 2^64."""
+    sig = np.full(NUM_PERM, 0xFFFFFFFF, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for i in range(0, len(shingles), chunk):
+            block = shingles[i:i + chunk]
+            hashed = (_PERM_A[:, None] * block[None, :] + _PERM_B[:, None]) >> np.uint64(32)
+            np.minimum(sig, hashed.min(axis=1), out=sig)
+    return (sig & _MASK32).astype(np.uint32)
+
+
+def _signature(tokens):
+    return minhash(shingle_hashes(tokens))
+
+
+def signatures(token_lists, workers=None):
+    """[len(token_lists), NUM_PERM] signatures, computed in a process pool when workers > 1."""
+    if workers and workers > 1 and len(token_lists) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            sigs = list(pool.map(_signature, token_lists, chunksize=64))
+    else:
+        sigs = [_signature(t) for t in token_lists]
+    return np.stack(sigs) if sigs else np.zeros((0, NUM_PERM), dtype=np.uint32)
+
+
+def near_duplicate_clusters(sigs, threshold, bands=BANDS):
+    """
+    Cluster id per document: the index of its representative, the first
+    earlier representative sharing an LSH bucket whose signature agreement
+    with it reaches the threshold (itself if there is none).
+    """
+    n = len(sigs)
+    rows = NUM_PERM // bands
+    keys = [list(map(bytes, np.ascontiguousarray(sigs[:, b * rows:(b + 1) * rows]))) for b in range(bands)]
+    # Only representatives are entered into the buckets.
+    buckets = [{} for _ in range(bands)]
+    cluster = np.arange(n, dtype=np.int64)
+
+    for i in range(n):
+        candidates = set()
+        for b in range(bands):
+            candidates.update(buckets[b].get(keys[b][i], ()))
+        rep = next((r for r in sorted(candidates) if np.mean(sigs[i] == sigs[r]) >= threshold), None)
+        if rep is not None:
+            cluster[i] = rep
+            continue
+        for b in range(bands):
+            buckets[b].setdefault(keys[b][i], []).append(i)
+
+    return cluster
+
+
+def dedup_corpus(corpus, threshold=0.9, workers=None):
+    """
+    (near-duplicate-free list of TaggedDocuments, stats dict, aliases).
+    aliases maps every tag of a dropped document to the first tag of its
+    cluster's representative.
+    """
+    sigs = signatures([doc.words for doc in corpus], workers)
+    cluster = near_duplicate_clusters(sigs, threshold)
+
+    deduped = []
+    aliases = {}
+    for i, doc in enumerate(corpus):
+        if cluster[i] == i:
+            deduped.append(doc)
+        else:
+            rep_tag = corpus[cluster[i]].tags[0]
+            aliases.update((tag, rep_tag) for tag in doc.tags)
+
+    total_tokens = sum(len(doc.words) for doc in corpus)
+    kept_tokens = sum(len(doc.words) for doc in deduped)
+    stats = {
+        "documents": len(corpus),
+        "kept_documents": len(deduped),
+        "tokens": total_tokens,
+        "kept_tokens": kept_tokens,
+        "token_reduction": 1 - kept_tokens / total_tokens if total_tokens else 0.,
+    }
+    return deduped, stats, aliases
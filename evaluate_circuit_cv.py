@@ -0,0 +1,250 @@
+"""
+evaluate_circuit_cv.py
+
+Leave-circuit-out evaluation of the fidelity + runtime XGBoost models,
+scored with the official Model 1A rules.
+
+The notebooks split rows with KFold(shuffle=True), so the same circuit shows
+up in both train and validation, and they report RMSE rather than the
+threshold/runtime score. Here every (backend, precision, threshold) row of a
+circuit stays in the same fold (GroupKFold on the circuit file). The feature
+matrix comes from the training_cache.py cache, which each fold process
+memory-maps, and folds train in parallel. Validation circuits are turned into
+holdout-style tasks, predicted the same way fidelity_prediction.py and
+runtime_prediction.py do (first rung whose predicted fidelity clears the
+cutoff, runtime at that rung), written as public/truth/submission JSON and
+scored with scripts/score_holdout_submission.py.
+
+Usage (from the repo root):
+  python evaluate_circuit_cv.py --folds 5 --workers 5 --out cv_report
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import xgboost as xgb
+from sklearn.model_selection import GroupKFold, GroupShuffleSplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from score_holdout_submission import score_arrays, mean_score, group_breakdown  # noqa: E402
+from training_cache import CACHE_DIR, load_training_matrix, normalized_threshold  # noqa: E402
+
+THRESHOLD_RUNGS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+fidelity_params = dict(
+    n_estimators=2000,
+    max_depth=6,
+    learning_rate=0.03,
+    subsample=0.8,
+    colsample_bytree=0.8,
+    random_state=42,
+    early_stopping_rounds=50,
+    objective="reg:squarederror",
+)
+
+runtime_params = dict(
+    n_estimators=3000,
+    max_depth=4,
+    min_child_weight=2,
+    gamma=0.015148663160556427,
+    learning_rate=0.03821282278824164,
+    subsample=0.7784344006861772,
+    colsample_bytree=0.8998057403862029,
+    reg_alpha=0.016935465021023638,
+    reg_lambda=0.07053319610596764,
+    early_stopping_rounds=50,
+    eval_metric="rmse",
+    objective="reg:squarederror",
+    random_state=42,
+)
+
+
+def first_cross(sweep, target):
+    for s in sorted(sweep, key=lambda s: s.get("threshold") or 0):
+        fid = s.get("sdk_get_fidelity")
+        if fid is not None and fid >= target:
+            return s["threshold"]
+    return None
+
+
+def load_truth(hackathon_json):
+    """Organizer-style labels for every result with a usable threshold and forward run."""
+    with open(hackathon_json, 'r') as f:
+        data = json.load(f)
+    family = {c["file"]: c.get("family") for c in data.get("circuits", [])}
+
+    labels = []
+    for r in data.get("results", []):
+        if r.get("status") != "ok":
+            continue
+        target = (r.get("selection") or {}).get("target", 0.99)
+        thr = first_cross(r.get("threshold_sweep", []), target)
+        wall = (r.get("forward") or {}).get("run_wall_s")
+        if thr not in THRESHOLD_RUNGS or not wall:
+            continue
+        labels.append({
+            "id": f"{r['file']}|{r['backend']}|{r['precision']}",
+            "file": r["file"],
+            "processor": r["backend"],
+            "precision": r["precision"],
+            "family": family.get(r["file"]),
+            "true_threshold_min": thr,
+            "true_forward_wall_s": wall,
+        })
+    return labels
+
+
+def _fit(params, X, y, groups, seed):
+    # Early stopping uses a slice of *training* circuits, never the fold's validation set.
+    inner = GroupShuffleSplit(n_splits=1, test_size=0.15, random_state=seed)
+    fit_idx, stop_idx = next(inner.split(X, y, groups))
+    model = xgb.XGBRegressor(**params, n_jobs=1)
+    model.fit(X[fit_idx], y[fit_idx], eval_set=[(X[stop_idx], y[stop_idx])], verbose=False)
+    return model
+
+
+def run_fold(job):
+    """Train one fold from the memory-mapped cache and predict its validation tasks."""
+    X = np.load(job["X_path"], mmap_mode='r')
+    arrays = np.load(job["labels_path"])
+    groups = arrays["circuit"]
+    fidelity = arrays["fidelity"]
+    runtime = arrays["runtime"]
+    train_idx = job["train_idx"]
+
+    fid_rows = train_idx[~np.isnan(fidelity[train_idx])]
+    fid_model = _fit(fidelity_params, np.asarray(X[fid_rows]), fidelity[fid_rows],
+                     groups[fid_rows], job["fold"])
+
+    rt_rows = train_idx[np.isfinite(runtime[train_idx])]
+    rt_model = _fit(runtime_params, np.asarray(X[rt_rows]), np.log10(runtime[rt_rows]),
+                    groups[rt_rows], job["fold"])
+
+    # One grid row per (task, rung): task features with the threshold column swapped.
+    base = np.asarray(X[job["task_rows"]])
+    n_tasks, n_rungs = len(base), len(job["rungs"])
+    grid = np.repeat(base, n_rungs, axis=0)
+    grid[:, job["threshold_col"]] = np.tile(normalized_threshold(np.asarray(job["rungs"])), n_tasks)
+
+    fid_pred = fid_model.predict(grid).reshape(n_tasks, n_rungs)
+    rt_pred = rt_model.predict(grid).reshape(n_tasks, n_rungs)
+
+    crossed = fid_pred >= job["cutoff"]
+    rung_idx = np.where(crossed.any(axis=1), crossed.argmax(axis=1), n_rungs - 1)
+    wall = 10 ** rt_pred[np.arange(n_tasks), rung_idx]
+
+    return [
+        {
+            "id": tid,
+            "predicted_threshold_min": int(job["rungs"][k]),
+            "predicted_forward_wall_s": float(w),
+        }
+        for tid, k, w in zip(job["task_ids"], rung_idx, wall)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leave-circuit-out CV scored with the official metric")
+    parser.add_argument("--public_json", type=str, default="data/hackathon_public.json")
+    parser.add_argument("--public_csv", type=str, default="extracted_public_data.csv")
+    parser.add_argument("--features", type=str, default="qasm_features_scaled.csv")
+    parser.add_argument("--embeddings", type=str, default="generated_embeddings.csv")
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR,
+                        help="Training matrix cache (rebuilt automatically when a source CSV changes)")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cutoff", type=float, default=0.79,
+                        help="Predicted fidelity that counts as crossing (fidelity_prediction.py uses 0.79)")
+    parser.add_argument("--min_rung", type=int, default=2, choices=THRESHOLD_RUNGS,
+                        help="Lowest rung tried (fidelity_prediction.py starts at 2)")
+    parser.add_argument("--out", type=str, default="cv_report")
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    tm = load_training_matrix(args.public_csv, args.features, args.embeddings, args.cache_dir)
+    X, feature_cols = tm.X, tm.feature_cols
+    task_ids = tm.labels['task']
+    known_tasks = set(task_ids)
+    labels = [t for t in load_truth(args.public_json) if t["id"] in known_tasks]
+
+    # A task's non-threshold features are the same on every row of its
+    # (circuit, backend, precision) block, so any one row stands in for it.
+    task_row = {k: i for i, k in reversed(list(enumerate(task_ids)))}
+
+    circuits = tm.labels['circuit']
+    unique_circuits = np.unique(circuits)
+    n_folds = min(args.folds, len(unique_circuits))
+    rungs = [r for r in THRESHOLD_RUNGS if r >= args.min_rung]
+
+    jobs = []
+    for fold, (train_idx, val_idx) in enumerate(GroupKFold(n_splits=n_folds).split(X, groups=circuits)):
+        val_circuits = set(circuits[val_idx])
+        fold_labels = [t for t in labels if t["file"] in val_circuits]
+        jobs.append({
+            "fold": fold,
+            "X_path": str(tm.X_path),
+            "labels_path": str(tm.labels_path),
+            "train_idx": train_idx,
+            "task_ids": [t["id"] for t in fold_labels],
+            "task_rows": np.array([task_row[t["id"]] for t in fold_labels], dtype=np.int64),
+            "threshold_col": feature_cols.index('normalized_threshold'),
+            "rungs": rungs,
+            "cutoff": args.cutoff,
+        })
+
+    print(f"Rows: {len(X)}  circuits: {len(unique_circuits)}  tasks: {len(labels)}  folds: {n_folds}")
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, n_folds))) as pool:
+        fold_preds = list(pool.map(run_fold, jobs))
+    predictions = [p for fp in fold_preds for p in fp]
+    print('Fold training complete')
+
+    tasks = [{"id": t["id"], "processor": t["processor"], "precision": t["precision"]} for t in labels]
+    for name, obj in [("public.json", {"schema": "iqhack_holdout_tasks_v1", "tasks": tasks}),
+                      ("truth.json", {"labels": labels}),
+                      ("submission.json", {"predictions": sorted(predictions, key=lambda p: p["id"])})]:
+        (out / name).write_text(json.dumps(obj, indent=2) + "\n", encoding="utf-8")
+
+    pred_map = {p["id"]: p for p in predictions}
+    has_pred = np.array([t["id"] in pred_map for t in labels], dtype=bool)
+    pred_thr = np.array([pred_map[t["id"]]["predicted_threshold_min"] if h else 1
+                         for t, h in zip(labels, has_pred)], dtype=np.float64)
+    pred_t = np.array([pred_map[t["id"]]["predicted_forward_wall_s"] if h else 1.0
+                       for t, h in zip(labels, has_pred)], dtype=np.float64)
+    true_thr = np.array([t["true_threshold_min"] for t in labels], dtype=np.float64)
+    true_t = np.array([t["true_forward_wall_s"] for t in labels], dtype=np.float64)
+
+    result = score_arrays(has_pred, pred_thr, pred_t, true_thr, true_t)
+    task_score = result["task_score"]
+    report = {
+        "overall_score": mean_score(task_score),
+        "mean_threshold_score": float(result["threshold_score"].mean()),
+        "mean_runtime_score": float(result["runtime_score"].mean()),
+        "fidelity_violations": int(result["fidelity_violated"].sum()),
+        "breakdown": {
+            "processor": group_breakdown([t["processor"] for t in labels], task_score, has_pred,
+                                         result["fidelity_violated"]),
+            "precision": group_breakdown([t["precision"] for t in labels], task_score, has_pred,
+                                         result["fidelity_violated"]),
+            "family": group_breakdown([t["family"] or "unknown" for t in labels], task_score, has_pred,
+                                      result["fidelity_violated"]),
+        },
+    }
+    (out / "score.json").write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+    print(f"Overall score: {report['overall_score']:.6f}")
+    print(f"Mean threshold score: {report['mean_threshold_score']:.6f}")
+    print(f"Mean runtime score: {report['mean_runtime_score']:.6f}")
+    print(f"Fidelity violations: {report['fidelity_violations']} / {len(labels)}")
+    print(f"Wrote {out / 'score.json'} (re-score with scripts/score_holdout_submission.py "
+          f"--truth {out / 'truth.json'} --public {out / 'public.json'} --submission {out / 'submission.json'})")
+
+
+if __name__ == "__main__":
+    main()
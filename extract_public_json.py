@@ -1,16 +1,25 @@
 import json
 import pandas as pd
 
-def get_expected_runtime_sec(result):
-    forward = result.get("forward")
-    if forward and forward.get("run_wall_s") is not None:
-        return forward["run_wall_s"]
-
+def get_timing_terms(result):
+    """(setup seconds, seconds per shot) at the selected threshold, or None."""
     est = result.get("forward_timing_estimates") or {}
     setup = est.get("estimated_setup_s")
     per_shot = est.get("estimated_per_shot_s")
     if setup is not None and per_shot is not None:
-        return setup + 10_000 * per_shot
+        return setup, per_shot
+    return None
+
+
+def get_expected_runtime_sec(result, shots=10_000):
+    forward = result.get("forward")
+    if forward and forward.get("run_wall_s") is not None and forward.get("shots", shots) == shots:
+        return forward["run_wall_s"]
+
+    terms = get_timing_terms(result)
+    if terms is not None:
+        setup, per_shot = terms
+        return setup + shots * per_shot
 
     return None
 
@@ -47,8 +56,37 @@ def extract_to_dataframe(file_path):
     return pd.DataFrame(records)
 
 
+def extract_timing_dataframe(file_path):
+    """One row per result with separate setup and per-shot cost at the forward threshold."""
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+
+    records = []
+
+    for result in data.get("results", []):
+        terms = get_timing_terms(result)
+        if terms is None:
+            continue
+        threshold = (result.get("forward") or {}).get("threshold")
+        if threshold is None:
+            threshold = (result.get("selection") or {}).get("selected_threshold")
+
+        records.append({
+            "circuit": result.get("file"),
+            "precision": result.get("precision"),
+            "backend": result.get("backend"),
+            "threshold": threshold,
+            "setup_sec": terms[0],
+            "per_shot_sec": terms[1],
+        })
+
+    return pd.DataFrame(records)
+
+
 df = extract_to_dataframe("data/hackathon_public.json")
 
 pd.set_option("display.max_rows", None)
 
-df.to_csv("extracted_public_data.csv", index=False)
\ No newline at end of file
+df.to_csv("extracted_public_data.csv", index=False)
+
+extract_timing_dataframe("data/hackathon_public.json").to_csv("extracted_timing_data.csv", index=False)
\ No newline at end of file
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+json_stream.py
+
+Incremental reader for the large JSON files used by the holdout scripts.
+
+Truth, task and submission files are a top-level object holding one big array
+(`labels`, `tasks`, `predictions`) or, for submissions, a bare top-level
+array. iter_json_array() yields the array elements one at a time while
+reading the file in fixed-size chunks, so memory stays bounded by the size
+of a single element instead of the whole document. iter_json_batches()
+yields the same elements a buffer's worth at a time, for callers that pull
+columns out with map() instead of a Python loop per element.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from pathlib import Path
+from typing import Any, Iterator, List, Optional
+
+CHUNK_SIZE = 1 << 20
+
+_WS = re.compile(r"[ \t\r\n]*")
+_DELIMS = " \t\r\n,]}:"
+_SEP = re.compile(r"[ \t\r\n]*([,\]])[ \t\r\n]*")
+
+
+class _Reader:
+    def __init__(self, f) -> None:
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > CHUNK_SIZE:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"Expected {ch!r} at offset {self.pos}, got {got!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        if self.pos >= len(self.buf) or self.buf[self.pos] in " \t\r\n":
+            self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number cut at the chunk boundary ("12" of "123", "2." of
+            # "2.5") still decodes, so only trust a value that is followed by
+            # a delimiter.
+            if (end == len(self.buf) or self.buf[end] not in _DELIMS) and self.fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def _last_separator(buf: str, start: int) -> int:
+    """Index of the last ',' after `start` between a closing and an opening bracket, or -1."""
+    end = len(buf)
+    while True:
+        i = buf.rfind(",", start, end)
+        if i < 0:
+            return -1
+        j = _WS.match(buf, i + 1).end()
+        k = i - 1
+        while k >= start and buf[k] in " \t\r\n":
+            k -= 1
+        if j < len(buf) and buf[j] in "{[" and k >= start and buf[k] in "}]":
+            return i
+        end = i
+
+
+def _iter_batches(reader: _Reader) -> Iterator[List[Any]]:
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    decode = reader.decoder.raw_decode
+    while True:
+        buf, pos = reader.buf, reader.pos
+        # Fastest path: every buffered element up to the last top-level-looking
+        # separator, in a single json.loads call. A wrong guess (the comma is
+        # nested or inside a string) leaves a bracket or string open and fails
+        # to parse, and then the elements are decoded one by one.
+        cut = _last_separator(buf, pos)
+        if cut > pos:
+            try:
+                batch = json.loads("[" + buf[pos:cut] + "]")
+            except json.JSONDecodeError:
+                pass
+            else:
+                reader.pos = cut + 1
+                reader.peek()
+                yield batch
+                continue
+        # Fast path: every element whose separator is already buffered, in one batch.
+        batch = []
+        while True:
+            try:
+                obj, end = decode(buf, pos)
+            except json.JSONDecodeError:
+                break
+            m = _SEP.match(buf, end)
+            if m is None or m.end() >= len(buf):
+                break
+            batch.append(obj)
+            pos = m.end()
+            if m.group(1) == "]":
+                reader.pos = pos
+                yield batch
+                return
+        reader.pos = pos
+        if batch:
+            yield batch
+        # Slow path: the next element or its separator crosses the end of the buffer.
+        obj = reader.value()
+        sep = reader.peek()
+        reader.pos += 1
+        yield [obj]
+        if sep == "]":
+            return
+        if sep != ",":
+            raise ValueError(f"Expected ',' or ']' in array, got {sep!r}")
+        reader.peek()
+
+
+def iter_json_batches(path: Path, key: Optional[str] = None) -> Iterator[List[Any]]:
+    """
+    Like iter_json_array(), but yield the elements in lists: all the ones
+    decoded from the buffered text at once, so at most about CHUNK_SIZE of
+    input per list.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _Reader(f)
+        first = reader.peek()
+        if first == "[":
+            yield from _iter_batches(reader)
+            return
+        if first != "{" or key is None:
+            raise ValueError(f"{path}: expected a JSON array or an object with key {key!r}")
+
+        reader.expect("{")
+        if reader.peek() == "}":
+            raise KeyError(key)
+        while True:
+            name = reader.value()
+            reader.expect(":")
+            if name == key:
+                if reader.peek() != "[":
+                    raise ValueError(f"{path}: {key!r} must be a list.")
+                yield from _iter_batches(reader)
+                return
+            reader.value()
+            sep = reader.peek()
+            reader.pos += 1
+            if sep == "}":
+                raise KeyError(key)
+            if sep != ",":
+                raise ValueError(f"{path}: expected ',' or '}}' in object, got {sep!r}")
+
+
+def iter_json_array(path: Path, key: Optional[str] = None) -> Iterator[Any]:
+    """
+    Yield the elements of the array stored under top-level `key` in `path`.
+
+    If the document itself is an array it is iterated directly, whatever
+    `key` is; a top-level object without `key` raises KeyError.
+    """
+    for batch in iter_json_batches(path, key):
+        yield from batch
+
+
+def json_root_kind(path: Path) -> str:
+    """Return 'list' or 'object' for the top-level JSON value in `path`."""
+    with open(path, "r", encoding="utf-8") as f:
+        first = _Reader(f).peek()
+    return {"[": "list", "{": "object"}.get(first, "other")
@@ -17,6 +17,14 @@ Overall score = mean(task_score over all tasks)
 Hackathon-facing labels:
 - processor: CPU / GPU
 - precision: single / double
+
+Truth, task and submission files are stream-parsed into columns, the
+predictions and labels are matched to the tasks by sorting and binary search
+on the ids, and every task is scored in one set of NumPy array operations, so internal evaluations with hundreds
+of thousands of tasks finish in seconds. The report also breaks the score
+down by processor, precision and circuit family. Family comes from a
+`family` field on the truth label or, when the label carries a `file`, from
+the `circuits[]` table of the JSON passed with --circuits.
 """
 
 from __future__ import annotations
@@ -24,8 +32,16 @@ from __future__ import annotations
 import argparse
 import json
 import math
+import operator
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from json_stream import iter_json_array, iter_json_batches
+
+
+UNKNOWN_GROUP = "unknown"
 
 
 def load_json(path: Path) -> Any:
@@ -36,91 +52,238 @@ def rung_index(thr: int) -> int:
     return int(math.log2(thr))
 
 
-def main() -> None:
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--truth", required=True, help="private holdout_truth.json")
-    ap.add_argument("--public", required=True, help="holdout_public.json")
-    ap.add_argument("--submission", required=True, help="normalized submission JSON")
-    ap.add_argument("--out", required=True, help="output score report JSON")
-    ap.add_argument("--topk", type=int, default=10, help="print top/bottom K tasks")
-    args = ap.parse_args()
+def rung_indices(thr: np.ndarray) -> np.ndarray:
+    # Vector form of rung_index(); int() truncation == floor for thr >= 1.
+    return np.floor(np.log2(thr))
+
+
+def load_family_map(path: Optional[str]) -> Dict[str, str]:
+    if not path:
+        return {}
+    return {c["file"]: c.get("family") for c in iter_json_array(Path(path), "circuits")}
+
+
+def load_columns(path: Path, key: str, fields: Tuple[str, ...],
+                 optional: Optional[Dict[str, Any]] = None) -> List[List[Any]]:
+    """
+    One list per field over the array under `key`: the required `fields`,
+    then the `optional` ones (missing -> their default). The file is read
+    a batch at a time and the elements are not kept.
+    """
+    optional = optional or {}
+    required = operator.itemgetter(*fields)
+    columns: List[List[Any]] = [[] for _ in range(len(fields) + len(optional))]
+    for batch in iter_json_batches(path, key):
+        values = list(map(required, batch))
+        if len(fields) == 1:
+            columns[0].extend(values)
+        else:
+            for column, col_values in zip(columns, zip(*values)):
+                column.extend(col_values)
+        for column, (name, default) in zip(columns[len(fields):], optional.items()):
+            column.extend([e.get(name, default) for e in batch])
+    return columns
+
+
+def align_ids(keys: np.ndarray, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Position in `keys` of every entry of `ids`, and whether it is there at
+    all. A repeated key resolves to its last occurrence, like a dict built
+    from the file.
+    """
+    if len(keys) == 0:
+        return np.zeros(len(ids), dtype=np.intp), np.zeros(len(ids), dtype=bool)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    pos = np.searchsorted(sorted_keys, ids, side="right") - 1
+    found = pos >= 0
+    pos = np.maximum(pos, 0)
+    found &= sorted_keys[pos] == ids
+    return order[pos], found
+
+
+def take_aligned(values: List[Any], idx: np.ndarray, found: np.ndarray, fill: Any,
+                 dtype: Any = np.float64) -> np.ndarray:
+    """values[idx] where found, `fill` elsewhere."""
+    if not values:
+        return np.full(len(idx), fill, dtype=dtype)
+    return np.where(found, np.asarray(values, dtype=dtype)[idx], fill)
+
+
+def score_arrays(
+    has_pred: np.ndarray,
+    pred_thr: np.ndarray,
+    pred_t: np.ndarray,
+    true_thr: np.ndarray,
+    true_t: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """Model 1A scores for aligned per-task arrays (entries without a prediction are ignored)."""
+    scored = has_pred & (pred_thr >= true_thr)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        steps_over = rung_indices(pred_thr) - rung_indices(true_thr)
+        threshold_score = np.where(scored, 2.0 ** (-steps_over), 0.0)
+
+        r = pred_t / true_t
+        runtime_score = np.where(scored, np.minimum(r, 1.0 / r), 0.0)
+
+    task_score = threshold_score * runtime_score
+    return {
+        "task_score": task_score,
+        "threshold_score": threshold_score,
+        "runtime_score": runtime_score,
+        "fidelity_violated": has_pred & ~scored,
+    }
 
-    truth = load_json(Path(args.truth))
-    public = load_json(Path(args.public))
-    submission = load_json(Path(args.submission))
 
-    truth_map = {t["id"]: t for t in truth["labels"]}
-    tasks = public["tasks"]
-    preds = {p["id"]: p for p in submission["predictions"]}
+def mean_score(task_score: np.ndarray) -> float:
+    # cumsum accumulates left to right like the builtin sum(), so the overall
+    # score is bit-identical to summing the per-task scores one by one.
+    if len(task_score) == 0:
+        raise ZeroDivisionError("no tasks to score")
+    return float(np.cumsum(task_score)[-1]) / len(task_score)
+
+
+def group_breakdown(labels: List[str], task_score: np.ndarray, has_pred: np.ndarray,
+                    violated: np.ndarray) -> Dict[str, Dict[str, Any]]:
+    keys, inverse = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)
+    n = np.bincount(inverse, minlength=len(keys))
+    total = np.bincount(inverse, weights=task_score, minlength=len(keys))
+    missing = np.bincount(inverse, weights=~has_pred, minlength=len(keys))
+    violations = np.bincount(inverse, weights=violated, minlength=len(keys))
+    return {
+        str(k): {
+            "tasks": int(n[i]),
+            "mean_score": float(total[i] / n[i]),
+            "missing": int(missing[i]),
+            "fidelity_violations": int(violations[i]),
+        }
+        for i, k in enumerate(keys)
+    }
 
-    scores = []
-    missing = 0
 
-    for task in tasks:
-        tid = task["id"]
+_TASK_ROW = (
+    "    {{\n"
+    '      "id": {},\n'
+    '      "task_score": {},\n'
+    '      "threshold_score": {},\n'
+    '      "runtime_score": {}\n'
+    "    }}"
+)
 
-        if tid not in preds:
-            missing += 1
-            scores.append((tid, 0.0, 0.0, 0.0))
-            continue
 
-        pred = preds[tid]
-        true = truth_map[tid]
+def _json_number(x: float) -> str:
+    return repr(x) if math.isfinite(x) else json.dumps(x)
 
-        pred_thr = pred["predicted_threshold_min"]
-        true_thr = true["true_threshold_min"]
 
-        # Fidelity constraint
-        if pred_thr < true_thr:
-            scores.append((tid, 0.0, 0.0, 0.0))
-            continue
+def _json_numbers(values: np.ndarray) -> List[str]:
+    """json.dumps() text of every value; repr() straight through map() when all are finite."""
+    if np.isfinite(values).all():
+        return list(map(repr, values.tolist()))
+    return list(map(_json_number, values.tolist()))
 
-        steps_over = rung_index(pred_thr) - rung_index(true_thr)
-        threshold_score = 2.0 ** (-steps_over)
 
-        pred_t = pred["predicted_forward_wall_s"]
-        true_t = true["true_forward_wall_s"]
+def _json_ids(ids: List[Any]) -> List[str]:
+    # For str, json.dumps() is encode_basestring_ascii(); calling it directly skips the encoder setup.
+    if all(type(tid) is str for tid in ids):
+        return list(map(json.encoder.encode_basestring_ascii, ids))
+    return list(map(json.dumps, ids))
 
-        r = pred_t / true_t
-        runtime_score = min(r, 1.0 / r)
 
-        task_score = threshold_score * runtime_score
-        scores.append((tid, task_score, threshold_score, runtime_score))
+def write_report(path: Path, report: Dict[str, Any], ids: List[Any], task_score: np.ndarray,
+                 threshold_score: np.ndarray, runtime_score: np.ndarray) -> None:
+    """
+    Write `report` plus a trailing "tasks" list, formatted exactly like
+    json.dumps(..., indent=2) but without running the pure-Python indenting
+    encoder over every task row.
+    """
+    head = json.dumps(report, indent=2)
+    rows = list(map(_TASK_ROW.format, _json_ids(ids), _json_numbers(task_score),
+                    _json_numbers(threshold_score), _json_numbers(runtime_score)))
+    tasks = "[\n" + ",\n".join(rows) + "\n  ]" if rows else "[]"
+    text = head[: -len("\n}")] + ',\n  "tasks": ' + tasks + "\n}\n"
 
-    overall = sum(s[1] for s in scores) / len(scores)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
 
-    scores_sorted = sorted(scores, key=lambda x: x[1])
 
-    print(f"Tasks: {len(scores)}")
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--truth", required=True, help="private holdout_truth.json")
+    ap.add_argument("--public", required=True, help="holdout_public.json")
+    ap.add_argument("--submission", required=True, help="normalized submission JSON")
+    ap.add_argument("--out", required=True, help="output score report JSON")
+    ap.add_argument("--topk", type=int, default=10, help="print top/bottom K tasks")
+    ap.add_argument("--circuits", help="optional JSON with circuits[] (file, family) for the family breakdown")
+    args = ap.parse_args()
+
+    family_by_file = load_family_map(args.circuits)
+
+    truth_ids, true_thr_all, true_t_all, family_field, files = load_columns(
+        Path(args.truth), "labels", ("id", "true_threshold_min", "true_forward_wall_s"),
+        {"family": None, "file": None})
+    truth_families = [f or family_by_file.get(file) or UNKNOWN_GROUP for f, file in zip(family_field, files)]
+    pred_ids, pred_thr_all, pred_t_all = load_columns(
+        Path(args.submission), "predictions", ("id", "predicted_threshold_min", "predicted_forward_wall_s"))
+    ids, processors, precisions = load_columns(
+        Path(args.public), "tasks", ("id",), {"processor": UNKNOWN_GROUP, "precision": UNKNOWN_GROUP})
+
+    task_ids = np.asarray(ids, dtype=str)
+    pred_idx, has_pred = align_ids(np.asarray(pred_ids, dtype=str), task_ids)
+    truth_idx, has_truth = align_ids(np.asarray(truth_ids, dtype=str), task_ids)
+    unlabeled = has_pred & ~has_truth
+    if unlabeled.any():
+        # Missing predictions never need a label; scored ones do.
+        raise KeyError(ids[int(np.argmax(unlabeled))])
+
+    pred_thr = take_aligned(pred_thr_all, pred_idx, has_pred, 1)
+    pred_t = take_aligned(pred_t_all, pred_idx, has_pred, 1.0)
+    true_thr = take_aligned(true_thr_all, truth_idx, has_pred, 1)
+    true_t = take_aligned(true_t_all, truth_idx, has_pred, 1.0)
+    families = take_aligned(truth_families, truth_idx, has_truth, UNKNOWN_GROUP, dtype=object)
+
+    result = score_arrays(has_pred, pred_thr, pred_t, true_thr, true_t)
+    task_score = result["task_score"]
+    threshold_score = result["threshold_score"]
+    runtime_score = result["runtime_score"]
+
+    missing = int((~has_pred).sum())
+    overall = mean_score(task_score)
+
+    order = np.argsort(task_score, kind="stable")
+
+    print(f"Tasks: {len(ids)}")
     print(f"Missing predictions: {missing}")
     print(f"Overall score: {overall:.6f}")
 
+    def show(idx: np.ndarray) -> None:
+        for i in idx:
+            print(f"  {ids[i]}: task={task_score[i]:.4f} thr={threshold_score[i]:.4f} time={runtime_score[i]:.4f}")
+
     print(f"\nWorst {args.topk}:")
-    for s in scores_sorted[: args.topk]:
-        print(f"  {s[0]}: task={s[1]:.4f} thr={s[2]:.4f} time={s[3]:.4f}")
+    show(order[: args.topk])
 
     print(f"\nBest {args.topk}:")
-    for s in scores_sorted[-args.topk :]:
-        print(f"  {s[0]}: task={s[1]:.4f} thr={s[2]:.4f} time={s[3]:.4f}")
+    show(order[-args.topk :])
+
+    breakdown = {
+        "processor": group_breakdown(processors, task_score, has_pred, result["fidelity_violated"]),
+        "precision": group_breakdown(precisions, task_score, has_pred, result["fidelity_violated"]),
+        "family": group_breakdown(families, task_score, has_pred, result["fidelity_violated"]),
+    }
+    for name, groups in breakdown.items():
+        print(f"\nBy {name}:")
+        for key, g in groups.items():
+            print(f"  {key}: tasks={g['tasks']} score={g['mean_score']:.6f} "
+                  f"missing={g['missing']} violations={g['fidelity_violations']}")
 
     report = {
         "overall_score": overall,
-        "tasks": [
-            {
-                "id": s[0],
-                "task_score": s[1],
-                "threshold_score": s[2],
-                "runtime_score": s[3],
-            }
-            for s in scores
-        ],
+        "breakdown": breakdown,
     }
-
-    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
-    Path(args.out).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    write_report(Path(args.out), report, ids, task_score, threshold_score, runtime_score)
     print(f"\nWrote report: {args.out}")
 
 
 if __name__ == "__main__":
     main()
-
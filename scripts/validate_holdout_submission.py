@@ -14,6 +14,10 @@ This script:
 - enforces finite positive runtime
 - writes a canonical normalized submission JSON
 
+Task and submission files are stream-parsed and the per-record value
+checks run column-wise with NumPy, so very large submissions validate in
+seconds.
+
 Usage:
   python scripts/validate_holdout_submission.py \
     --public data/holdout_public.json \
@@ -27,7 +31,11 @@ import argparse
 import json
 import math
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterable, List, Any
+
+import numpy as np
+
+from json_stream import iter_json_array, json_root_kind
 
 
 THRESHOLD_RUNGS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
@@ -42,6 +50,87 @@ def save_json(path: Path, obj: Any) -> None:
     path.write_text(json.dumps(obj, indent=2) + "\n", encoding="utf-8")
 
 
+def _check_columns(ids: List[Any], thrs: List[Any], times: List[Any]) -> None:
+    """Vectorized per-record value checks; raises for the first offending record."""
+    n = len(ids)
+    if n == 0:
+        return
+
+    thr_is_int = np.fromiter((isinstance(x, int) for x in thrs), dtype=bool, count=n)
+    # Anything outside the ladder's range maps to -1 so np.isin stays in int64.
+    thr_vals = np.fromiter(
+        (x if ok and 0 < x <= THRESHOLD_RUNGS[-1] else -1 for x, ok in zip(thrs, thr_is_int)),
+        dtype=np.int64, count=n,
+    )
+    thr_on_ladder = np.isin(thr_vals, THRESHOLD_RUNGS)
+
+    t_vals = np.fromiter(
+        (float(t) if isinstance(t, (int, float)) else math.nan for t in times),
+        dtype=np.float64, count=n,
+    )
+    t_ok = np.isfinite(t_vals) & (t_vals > 0)
+
+    bad = ~thr_is_int | ~thr_on_ladder | ~t_ok
+    if not bad.any():
+        return
+
+    i = int(np.argmax(bad))
+    pid = ids[i]
+    if not thr_is_int[i]:
+        raise ValueError(f"predicted_threshold_min must be int for id={pid}")
+    if not thr_on_ladder[i]:
+        raise ValueError(
+            f"id={pid}: predicted_threshold_min={thrs[i]} "
+            f"is not one of {THRESHOLD_RUNGS}"
+        )
+    raise ValueError(
+        f"id={pid}: predicted_forward_wall_s must be a finite positive number"
+    )
+
+
+def normalize_prediction_records(preds: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Validate prediction records (e.g. streamed from disk) and return them
+    normalized. Structure is checked while collecting the id/threshold/runtime
+    columns; value checks then run over whole columns at once. The error
+    raised is the same one a record-by-record scan would hit first.
+    """
+    ids = []
+    thrs = []
+    times = []
+    structural_error = None
+
+    for p in preds:
+        if not isinstance(p, dict):
+            structural_error = ValueError("Each prediction must be an object.")
+        elif "id" not in p:
+            structural_error = ValueError("Each prediction must include 'id'.")
+        elif "predicted_threshold_min" not in p:
+            structural_error = ValueError(f"Missing predicted_threshold_min for id={p.get('id')}")
+        elif "predicted_forward_wall_s" not in p:
+            structural_error = ValueError(f"Missing predicted_forward_wall_s for id={p.get('id')}")
+        if structural_error is not None:
+            break
+
+        ids.append(p["id"])
+        thrs.append(p["predicted_threshold_min"])
+        times.append(p["predicted_forward_wall_s"])
+
+    # Records before a structural error are checked first, matching a serial scan.
+    _check_columns(ids, thrs, times)
+    if structural_error is not None:
+        raise structural_error
+
+    return [
+        {
+            "id": pid,
+            "predicted_threshold_min": int(thr),
+            "predicted_forward_wall_s": float(t),
+        }
+        for pid, thr, t in zip(ids, thrs, times)
+    ]
+
+
 def normalize_predictions(obj: Any) -> List[Dict[str, Any]]:
     if isinstance(obj, list):
         preds = obj
@@ -53,46 +142,18 @@ def normalize_predictions(obj: Any) -> List[Dict[str, Any]]:
     if not isinstance(preds, list):
         raise ValueError("'predictions' must be a list.")
 
-    normalized = []
-    for p in preds:
-        if not isinstance(p, dict):
-            raise ValueError("Each prediction must be an object.")
-
-        if "id" not in p:
-            raise ValueError("Each prediction must include 'id'.")
-
-        if "predicted_threshold_min" not in p:
-            raise ValueError(f"Missing predicted_threshold_min for id={p.get('id')}")
-
-        if "predicted_forward_wall_s" not in p:
-            raise ValueError(f"Missing predicted_forward_wall_s for id={p.get('id')}")
-
-        thr = p["predicted_threshold_min"]
-        t = p["predicted_forward_wall_s"]
+    return normalize_prediction_records(preds)
 
-        if not isinstance(thr, int):
-            raise ValueError(f"predicted_threshold_min must be int for id={p['id']}")
 
-        if thr not in THRESHOLD_RUNGS:
-            raise ValueError(
-                f"id={p['id']}: predicted_threshold_min={thr} "
-                f"is not one of {THRESHOLD_RUNGS}"
-            )
-
-        if not isinstance(t, (int, float)) or not math.isfinite(t) or t <= 0:
-            raise ValueError(
-                f"id={p['id']}: predicted_forward_wall_s must be a finite positive number"
-            )
-
-        normalized.append(
-            {
-                "id": p["id"],
-                "predicted_threshold_min": int(thr),
-                "predicted_forward_wall_s": float(t),
-            }
-        )
-
-    return normalized
+def load_predictions(path: Path) -> List[Dict[str, Any]]:
+    """Stream-parse and normalize a submission file without loading it whole."""
+    kind = json_root_kind(path)
+    if kind not in ("list", "object"):
+        raise ValueError("Submission must be a list or an object with key 'predictions'.")
+    try:
+        return normalize_prediction_records(iter_json_array(path, "predictions"))
+    except KeyError:
+        raise ValueError("Submission must be a list or an object with key 'predictions'.") from None
 
 
 def main() -> None:
@@ -102,11 +163,9 @@ def main() -> None:
     ap.add_argument("--write-normalized", help="output normalized JSON")
     args = ap.parse_args()
 
-    public = load_json(Path(args.public))
-    expected_ids = {task["id"] for task in public["tasks"]}
+    expected_ids = {task["id"] for task in iter_json_array(Path(args.public), "tasks")}
 
-    submission_raw = load_json(Path(args.submission))
-    preds = normalize_predictions(submission_raw)
+    preds = load_predictions(Path(args.submission))
 
     pred_ids = [p["id"] for p in preds]
     pred_id_set = set(pred_ids)
@@ -0,0 +1,350 @@
+"""
+circuit_ir.py
+
+Compact, array-backed intermediate representation (IR) of a circuit.
+
+A QASM file is standardized (standardize_qasm_gates, in memory), parsed by
+qiskit once and lowered to a directory `<name>.qir/` of plain .npy columns:
+
+    op.npy           int32   [n_gates]     index into meta["opcodes"]
+    qubits.npy       int32   [n_gates, 3]  qubit operands, -1 padded
+    clbits.npy       int32   [n_gates]     clbit operand (measure), -1 if none
+    params.npy       float64 [n_gates, P]  gate parameters, NaN padded
+    angle_class.npy  int8    [n_gates]     highest angle class over the params:
+                                           -1 no params, 0 multiple of 2*pi,
+                                           1 odd multiple of pi, 2 anything else
+    tokens.npy       int32   [n_tokens]    Doc2Vec token stream, index into meta["vocab"]
+    meta.json        name, qubit/clbit counts, opcode + vocab tables, source hash
+
+Barriers are dropped, as in extract_features(). Every column can be opened
+with np.load(mmap_mode='r'), so features, embeddings and later analyses run
+vectorized passes without re-reading QASM text or building qiskit objects.
+
+Usage:
+  python circuit_ir.py --circuit_dir circuits --out_dir circuit_ir
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+import qiskit.qasm2 as qasm
+from qiskit.circuit import Barrier
+
+import qasm_parsing
+import tracing
+
+IR_FORMAT = "qir-v1"
+IR_SUFFIX = ".qir"
+MAX_GATE_QUBITS = 3
+
+ANGLE_NONE = -1
+ANGLE_ZERO = 0
+ANGLE_PI = 1
+ANGLE_OTHER = 2
+
+_COLUMNS = ['op', 'qubits', 'clbits', 'params', 'angle_class', 'tokens']
+
+
+def classify_angles(params):
+    """Vectorized angle classes, same tests as calc_runtime_weight/calc_magic_weight."""
+    indicator = np.mod(params / (2*math.pi), 1.)
+    classes = np.where(np.abs(indicator) < qasm_parsing.eps, ANGLE_ZERO,
+                       np.where(np.abs(indicator - 0.5) < qasm_parsing.eps, ANGLE_PI, ANGLE_OTHER))
+    return np.where(np.isnan(params), ANGLE_NONE, classes).astype(np.int8)
+
+
+class CircuitIR:
+    """Column arrays plus metadata for one lowered circuit."""
+
+    def __init__(self, meta, columns):
+        self.meta = meta
+        self.name = meta['name']
+        self.num_qubits = meta['num_qubits']
+        self.num_clbits = meta['num_clbits']
+        self.opcodes = meta['opcodes']
+        for col in _COLUMNS:
+            setattr(self, col, columns[col])
+
+    def __len__(self):
+        return len(self.op)
+
+    @property
+    def arity(self):
+        return (self.qubits >= 0).sum(axis=1)
+
+    def opcode_table(self, table, default=0.):
+        """Per-opcode lookup array for a {gate name: value} dict."""
+        return np.array([table.get(name, default) for name in self.opcodes], dtype=np.float64)
+
+    def token_list(self):
+        vocab = self.meta['vocab']
+        return [vocab[i] for i in self.tokens.tolist()]
+
+    def gate_wires(self):
+        """(qubit wires, clbit wires) per gate, in the layout cut_profile_from_wires() expects."""
+        clbit_wire = np.where(self.clbits >= 0, self.clbits + self.num_qubits, -1)
+        for qb, cb in zip(self.qubits.tolist(), clbit_wire.tolist()):
+            yield [q for q in qb if q >= 0], ([cb] if cb >= 0 else [])
+
+
+def qasm_tokens(qasm_text):
+    """(vocab, token indices) of the Doc2Vec token stream of a QASM text."""
+    from gensim.utils import simple_preprocess
+    # Same preprocessing as gen_embeddings.get_qasm_vector (min_len=1).
+    words = simple_preprocess(qasm_text, min_len=1)
+    if not words:
+        return [], np.zeros(0, dtype=np.int32)
+    vocab, inverse = np.unique(np.asarray(words, dtype=object).astype(str), return_inverse=True)
+    return vocab.tolist(), inverse.astype(np.int32)
+
+
+def lower_circuit(qc, name, qasm_text=None):
+    """Lower a qiskit circuit to IR columns (and the Doc2Vec tokens of `qasm_text`, if given)."""
+    qubit_index = {qb: i for i, qb in enumerate(qc.qubits)}
+    clbit_index = {cb: i for i, cb in enumerate(qc.clbits)}
+
+    opcodes = []
+    opcode_index = {}
+    ops, qubits, clbits, params = [], [], [], []
+    max_params = 0
+
+    for instr in qc.data:
+        operation = instr.operation
+        if isinstance(operation, Barrier):
+            continue
+        if len(instr.qubits) > MAX_GATE_QUBITS:
+            raise ValueError(f"{name}: {operation.name} acts on {len(instr.qubits)} qubits; "
+                             f"the IR holds at most {MAX_GATE_QUBITS}")
+
+        code = opcode_index.get(operation.name)
+        if code is None:
+            code = opcode_index[operation.name] = len(opcodes)
+            opcodes.append(operation.name)
+        ops.append(code)
+
+        qb = [qubit_index[b] for b in instr.qubits]
+        qubits.append(qb + [-1] * (MAX_GATE_QUBITS - len(qb)))
+        clbits.append(clbit_index[instr.clbits[0]] if instr.clbits else -1)
+
+        p = [float(x) for x in operation.params]
+        max_params = max(max_params, len(p))
+        params.append(p)
+
+    n = len(ops)
+    param_arr = np.full((n, max_params), np.nan, dtype=np.float64)
+    for i, p in enumerate(params):
+        param_arr[i, :len(p)] = p
+    if max_params:
+        angle_class = classify_angles(param_arr).max(axis=1)
+    else:
+        angle_class = np.full(n, ANGLE_NONE, dtype=np.int8)
+
+    vocab, tokens = qasm_tokens(qasm_text) if qasm_text is not None else ([], np.zeros(0, dtype=np.int32))
+
+    meta = {
+        'format': IR_FORMAT,
+        'name': name,
+        'num_qubits': qc.num_qubits,
+        'num_clbits': qc.num_clbits,
+        'opcodes': opcodes,
+        'vocab': vocab,
+    }
+    columns = {
+        'op': np.asarray(ops, dtype=np.int32),
+        'qubits': np.asarray(qubits, dtype=np.int32).reshape(n, MAX_GATE_QUBITS),
+        'clbits': np.asarray(clbits, dtype=np.int32),
+        'params': param_arr,
+        'angle_class': angle_class.astype(np.int8),
+        'tokens': tokens,
+    }
+    return CircuitIR(meta, columns)
+
+
+def save_ir(ir, out_path):
+    out_path = Path(out_path)
+    out_path.mkdir(parents=True, exist_ok=True)
+    # Each file is written under a per-process name and renamed into place, so
+    # runs compiling the same circuit at once never expose a partial file.
+    tmp_suffix = f".{os.getpid()}.tmp"
+    for col in _COLUMNS:
+        tmp = out_path / f"{col}.npy{tmp_suffix}"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(getattr(ir, col)))
+        os.replace(tmp, out_path / f"{col}.npy")
+    # meta.json goes last: its presence marks a complete IR directory.
+    tmp = out_path / f"meta.json{tmp_suffix}"
+    tmp.write_text(json.dumps(ir.meta) + "\n", encoding="utf-8")
+    os.replace(tmp, out_path / "meta.json")
+    return out_path
+
+
+def load_ir(path, mmap_mode='r'):
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+    if meta.get('format') != IR_FORMAT:
+        raise ValueError(f"{path}: unsupported IR format {meta.get('format')!r}")
+    columns = {col: np.load(path / f"{col}.npy", mmap_mode=mmap_mode) for col in _COLUMNS}
+    return CircuitIR(meta, columns)
+
+
+def ir_path_for(qasm_path, out_dir):
+    return Path(out_dir) / (Path(qasm_path).name + IR_SUFFIX)
+
+
+def compile_qasm_file(qasm_path, out_dir, force=False, templates=None):
+    """
+    Standardize, parse and lower one QASM file; skipped if its IR is current.
+    With a circuit_templates.TemplateCache, files sharing a skeleton with an
+    earlier one are built from its template instead of parsed by qiskit.
+    """
+    qasm_path = Path(qasm_path)
+    raw = qasm_path.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    out_path = ir_path_for(qasm_path, out_dir)
+
+    meta_path = out_path / "meta.json"
+    if not force and meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get('format') == IR_FORMAT and meta.get('source_sha256') == digest:
+            tracing.count("ir_cache_hits")
+            return out_path
+
+    with tracing.span("ir_compile", file=qasm_path.name):
+        clean_qasm = qasm_parsing.standardize_qasm_gates(raw.decode('utf-8'))
+        if templates is not None:
+            ir = templates.lower(clean_qasm, qasm_path.name)
+        else:
+            ir = lower_circuit(qasm.loads(clean_qasm), qasm_path.name, clean_qasm)
+        ir.meta['source_sha256'] = digest
+        save_ir(ir, out_path)
+    return out_path
+
+
+def domain_sizes(num_qubits, qubits, arity):
+    """Union-find over multi-qubit gates; returns the size of every qubit domain."""
+    parent = list(range(num_qubits))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for row in qubits[arity > 1].tolist():
+        root = find(row[0])
+        for q in row[1:]:
+            if q < 0:
+                break
+            other = find(q)
+            if other != root:
+                parent[other] = root
+
+    roots = np.fromiter((find(i) for i in range(num_qubits)), dtype=np.int64, count=num_qubits)
+    return np.bincount(roots)[np.unique(roots)]
+
+
+def ir_skeleton_key(ir):
+    """Hash of everything but the parameter values: opcodes, operands and parameter count per gate."""
+    h = hashlib.sha256()
+    h.update(json.dumps([ir.num_qubits, ir.num_clbits, ir.opcodes]).encode())
+    for column in (ir.op, ir.qubits, ir.clbits, (~np.isnan(ir.params)).sum(axis=1).astype(np.int32)):
+        h.update(np.ascontiguousarray(column).tobytes())
+    return h.hexdigest()
+
+
+def ir_skeleton_features(ir):
+    """
+    The angle-independent part of ir_features(): every feature but the two
+    weight sums, plus the per-gate base weights those sums start from.
+    """
+    num_qubits = ir.num_qubits
+    arity = ir.arity
+    multi = arity > 1
+
+    qubits = np.asarray(ir.qubits)
+    hi = qubits.max(axis=1)
+    lo = np.where(qubits >= 0, qubits, np.iinfo(np.int32).max).min(axis=1)
+    entanglement_metric = int((hi - lo)[multi].sum())
+
+    cut_profile = qasm_parsing.cut_profile_from_wires(num_qubits, num_qubits + ir.num_clbits, ir.gate_wires())
+    depth = cut_profile['depth']
+
+    sizes = domain_sizes(num_qubits, qubits, arity)
+
+    features = {
+        'num_qubits': num_qubits,
+        'depth': depth,
+        'mul_qb_gate_density': int(multi.sum()) / (num_qubits * depth),
+        'entanglement_metric': entanglement_metric,
+        # Same average as calc_domain_size().
+        'entanglement_domain_size': sizes.sum() / num_qubits,
+    }
+    for col in qasm_parsing.cut_feature_columns:
+        features[col] = cut_profile[col]
+    return {
+        'features': features,
+        'conditional': np.isin(np.asarray(ir.opcodes, dtype=object), qasm_parsing.conditional_gates)[ir.op],
+        'base_runtime': ir.opcode_table(qasm_parsing.runtime_weights)[ir.op],
+        'base_magic': ir.opcode_table(qasm_parsing.magic_weights)[ir.op],
+    }
+
+
+def ir_angle_features(skeleton, angle_class):
+    """Runtime and magic weight sums from the per-gate angle classes, as calc_runtime_weight/calc_magic_weight."""
+    cond = skeleton['conditional']
+    angle_class = np.asarray(angle_class)
+
+    base_runtime = skeleton['base_runtime']
+    runtime = np.where(cond, np.select([angle_class == ANGLE_NONE, angle_class == ANGLE_ZERO],
+                                       [0., base_runtime / 1.5], base_runtime), base_runtime)
+
+    # Highest angle class -> magic weight, as in calc_magic_weight (0, 1, 3).
+    class_magic = np.array([0., 0., 1., 3.])[angle_class + 1]
+    magic = np.where(cond, class_magic, skeleton['base_magic'])
+
+    # cumsum keeps the builtin sum()'s left-to-right order, so totals match extract_features().
+    return {
+        'weighted_gate_count': float(np.cumsum(runtime)[-1]) if len(runtime) else 0,
+        'magic_metric': float(np.cumsum(magic)[-1]) if len(magic) else 0,
+    }
+
+
+def combine_features(skeleton, angle_features):
+    """Feature dict in extract_features() column order."""
+    features = dict(skeleton['features'])
+    features.update(angle_features)
+    order = ['num_qubits', 'weighted_gate_count', 'depth', 'mul_qb_gate_density', 'entanglement_metric',
+             'magic_metric', 'entanglement_domain_size'] + qasm_parsing.cut_feature_columns
+    return {col: features[col] for col in order}
+
+
+def ir_features(ir):
+    """extract_features() computed from IR columns instead of a QuantumCircuit."""
+    skeleton = ir_skeleton_features(ir)
+    return combine_features(skeleton, ir_angle_features(skeleton, ir.angle_class))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile QASM files to the array IR")
+    parser.add_argument("--circuit_dir", type=str, required=True, help="Directory containing QASM files")
+    parser.add_argument("--out_dir", type=str, required=True, help="Directory for the <name>.qir outputs")
+    parser.add_argument("--force", action="store_true", help="Recompile even if the IR is current")
+    tracing.add_argument(parser)
+    args = parser.parse_args()
+    tracing.configure(args.trace)
+
+    paths = sorted(p for p in Path(args.circuit_dir).iterdir() if p.is_file() and p.suffix == '.qasm')
+    for path in paths:
+        out_path = compile_qasm_file(path, args.out_dir, force=args.force)
+        ir = load_ir(out_path)
+        print(f"{path.name}: {len(ir)} gates, {len(ir.tokens)} tokens -> {out_path}")
+    print('IR compilation complete')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+circuit_templates.py
+
+Structure-template memoization for parameterized circuit families.
+
+Families such as qnn, portfoliovqe, portfolioqaoa and twolocalrandom come
+in many variants with the same gate/qubit skeleton that differ only in
+rotation angles. Almost all of the per-file work does not depend on the
+angles: qiskit parsing, lowering, depth and cut profile, qubit spans,
+domain sizes, multi-qubit density. TemplateCache does that work once per
+skeleton.
+
+qasm_skeleton() keys a standardized QASM text by its structure. Every gate
+call's parameter list is replaced by its length; gate definitions,
+registers, gate names and operands are kept. The first file of a skeleton
+is parsed by qiskit. Its IR columns, minus params/angle_class/tokens, are
+kept together with a map from each gate to the statement it came from.
+Later variants evaluate their angle expressions into a parameter matrix and
+gather it per gate. The angle classes are recomputed from that matrix with
+array operations, and so are the runtime and magic weight sums
+(calc_runtime_weight/calc_magic_weight). The Doc2Vec token stream is
+reused as well unless comments or words inside parameter lists differ.
+
+A template is only used if the text statements reproduce the qiskit
+lowering of the file that created it: gate count, gate names and parameter
+values. Otherwise every file of that skeleton is parsed by qiskit.
+
+features() caches the angle-independent features by circuit_ir.ir_skeleton_key(),
+so IRs loaded from disk share them too.
+
+Usage:
+  python circuit_templates.py --circuit_dir circuits      # skeleton groups and template hit rate
+"""
+
+import argparse
+import hashlib
+import math
+import re
+from pathlib import Path
+
+import numpy as np
+import qiskit.qasm2 as qasm
+
+import circuit_ir
+import qasm_expr
+import qasm_parsing
+import tracing
+
+_gate_def = re.compile(r'gate\s+\w+\s*(?:\([^)]*\))?[^{]*\{[^}]*\}')
+_comment = re.compile(r'//[^\n]*')
+# [if (...)] name [(params, one level of nested parentheses)] operands ;
+_statement = re.compile(r'\s*(if\s*\([^)]*\))?\s*(\w+)\s*(?:\(((?:[^()]|\([^()]*\))*)\))?\s*([^;]*);')
+# gensim.utils.PAT_ALPHABETIC, the word pattern simple_preprocess tokenizes with.
+_word = re.compile(r'(?:(?!\d)\w)+')
+_register = re.compile(r'^(\w+)\s*\[\s*(\d+)\s*\]$')
+structural_statements = {'OPENQASM', 'include', 'qreg', 'creg', 'barrier', 'opaque'}
+
+
+def _eval_param(expr, memo):
+    value = memo.get(expr)
+    if value is None:
+        try:
+            value = float(expr)
+        except ValueError:
+            value = None
+        # float() also accepts 'nan'/'inf', which are not QASM numbers.
+        if value is None or not math.isfinite(value):
+            value = qasm_expr.eval_expr(expr)
+        memo[expr] = value
+    return value
+
+
+def _broadcast(operands, registers):
+    """Number of instructions a call expands to: the register size if an operand is a whole register."""
+    if operands.count('[') == operands.count(',') + operands.count('->') + 1:
+        return 1
+    count = 1
+    for operand in re.split(r',|->', operands):
+        operand = operand.strip()
+        if operand and '[' not in operand:
+            count = max(count, registers.get(operand, 1))
+    return count
+
+
+def qasm_skeleton(text):
+    """
+    (skeleton key, calls) of a standardized QASM text. calls lists every gate
+    statement as (name, parameter expressions, instructions it expands to).
+    """
+    text = _comment.sub('', text)
+    skeleton = _gate_def.findall(text)
+    body = _gate_def.sub('', text)
+
+    registers = {}
+    calls = []
+    for condition, name, params, operands in _statement.findall(body):
+        if name in structural_statements:
+            skeleton.append(f"{condition}{name} {params} {operands}")
+            if name in ('qreg', 'creg'):
+                reg = _register.match(operands)
+                if reg:
+                    registers[reg.group(1)] = int(reg.group(2))
+            continue
+        if not params:
+            exprs = []
+        elif '(' in params:
+            exprs = qasm_expr.split_args(params)
+        else:
+            exprs = [p.strip() for p in params.split(',')]
+        operands = operands.replace(' ', '')
+        skeleton.append(f"{condition}{name}(#{len(exprs)}){operands}")
+        calls.append((name, exprs, _broadcast(operands, registers)))
+
+    key = hashlib.sha256('\n'.join(skeleton).encode()).hexdigest()
+    return key, calls
+
+
+def token_signature(text, calls):
+    """
+    What a text's Doc2Vec tokens depend on besides its skeleton: comment
+    text and the words inside parameter lists ('pi', the 'e' of '1e-05').
+    Texts with the same skeleton and signature have the same token stream.
+    """
+    words = _word.findall('\0'.join(e for _, exprs, _ in calls for e in exprs))
+    return _comment.findall(text), words
+
+
+def call_parameters(calls, width):
+    """[calls, width] float64 matrix of evaluated parameters, NaN padded."""
+    params = np.full((len(calls), width), np.nan, dtype=np.float64)
+    memo = {}
+    for i, (_, exprs, _) in enumerate(calls):
+        for j, expr in enumerate(exprs[:width]):
+            params[i, j] = _eval_param(expr, memo)
+    return params
+
+
+def build_template(ir, calls, qasm_text):
+    """Template dict from a qiskit-lowered IR and the calls of its text, or None if they do not line up."""
+    gate_call = np.repeat(np.arange(len(calls)), [n for _, _, n in calls])
+    if len(gate_call) != len(ir):
+        return None
+    names = np.asarray(ir.opcodes, dtype=object)[ir.op]
+    if any(names[i].lower() != calls[c][0].lower() for i, c in enumerate(gate_call.tolist())):
+        return None
+    width = ir.params.shape[1]
+    if any(len(exprs) > width for _, exprs, _ in calls):
+        return None
+    try:
+        params = call_parameters(calls, width)[gate_call]
+    except (ValueError, SyntaxError, NameError, ZeroDivisionError, TypeError):
+        return None
+    if not np.array_equal(np.isnan(params), np.isnan(ir.params)) or not np.allclose(
+            np.nan_to_num(params), np.nan_to_num(ir.params), rtol=1e-12, atol=1e-12):
+        return None
+    return {
+        'meta': {k: ir.meta[k] for k in ('format', 'num_qubits', 'num_clbits', 'opcodes')},
+        'op': np.asarray(ir.op),
+        'qubits': np.asarray(ir.qubits),
+        'clbits': np.asarray(ir.clbits),
+        'width': width,
+        'gate_call': gate_call,
+        'token_signature': token_signature(qasm_text, calls),
+        'vocab': ir.meta['vocab'],
+        'tokens': np.asarray(ir.tokens),
+    }
+
+
+def instantiate(template, calls, name, qasm_text):
+    """CircuitIR of a variant: the template's columns with this text's parameters, angle classes and tokens."""
+    params = call_parameters(calls, template['width'])[template['gate_call']]
+    if template['width']:
+        angle_class = circuit_ir.classify_angles(params).max(axis=1)
+    else:
+        angle_class = np.full(len(params), circuit_ir.ANGLE_NONE, dtype=np.int8)
+    if token_signature(qasm_text, calls) == template['token_signature']:
+        vocab, tokens = template['vocab'], template['tokens']
+    else:
+        vocab, tokens = circuit_ir.qasm_tokens(qasm_text)
+    # Key order as in circuit_ir.lower_circuit(), so meta.json is byte-identical.
+    meta = {'format': template['meta']['format'], 'name': name, **template['meta'], 'vocab': vocab}
+    columns = {
+        'op': template['op'],
+        'qubits': template['qubits'],
+        'clbits': template['clbits'],
+        'params': params,
+        'angle_class': angle_class.astype(np.int8),
+        'tokens': tokens,
+    }
+    return circuit_ir.CircuitIR(meta, columns)
+
+
+class TemplateCache:
+    """Per-skeleton lowering templates and angle-independent features, shared across files."""
+
+    def __init__(self):
+        self.templates = {}
+        self.skeletons = {}
+        self.stats = {'parsed': 0, 'instantiated': 0, 'feature_hits': 0, 'feature_misses': 0}
+
+    def lower(self, qasm_text, name):
+        """CircuitIR of a standardized QASM text, from its skeleton's template when there is one."""
+        key, calls = qasm_skeleton(qasm_text)
+        template = self.templates.get(key)
+        if template is not None:
+            try:
+                ir = instantiate(template, calls, name, qasm_text)
+            except (ValueError, SyntaxError, NameError, ZeroDivisionError, TypeError):
+                ir = None
+            if ir is not None:
+                self.stats['instantiated'] += 1
+                tracing.count("template_hits")
+                return ir
+
+        ir = circuit_ir.lower_circuit(qasm.loads(qasm_text), name, qasm_text)
+        self.stats['parsed'] += 1
+        if key not in self.templates:
+            # None marks a skeleton the text calls cannot reproduce; it is not retried.
+            self.templates[key] = build_template(ir, calls, qasm_text)
+        return ir
+
+    def features(self, ir):
+        """circuit_ir.ir_features(), with the angle-independent part computed once per skeleton."""
+        key = circuit_ir.ir_skeleton_key(ir)
+        skeleton = self.skeletons.get(key)
+        if skeleton is None:
+            self.stats['feature_misses'] += 1
+            skeleton = self.skeletons[key] = circuit_ir.ir_skeleton_features(ir)
+        else:
+            self.stats['feature_hits'] += 1
+        return circuit_ir.combine_features(skeleton, circuit_ir.ir_angle_features(skeleton, ir.angle_class))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group QASM files by structure skeleton")
+    parser.add_argument("--circuit_dir", type=str, required=True, help="Directory containing QASM files")
+    args = parser.parse_args()
+
+    groups = {}
+    for path in sorted(Path(args.circuit_dir).glob('*.qasm')):
+        text = qasm_parsing.standardize_qasm_gates(path.read_text(encoding='utf-8'))
+        key, calls = qasm_skeleton(text)
+        groups.setdefault(key, []).append((path.name, len(calls)))
+
+    shared = [g for g in groups.values() if len(g) > 1]
+    files = sum(len(g) for g in groups.values())
+    print(f"{files} files, {len(groups)} skeletons, {sum(len(g) - 1 for g in shared)} files reuse a template")
+    for group in shared:
+        print(f"  {len(group)} x {group[0][1]} calls: {', '.join(name for name, _ in group)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+clifford_fast_path.py
+
+Fast path for stabilizer (Clifford-only) circuits.
+
+GHZ, graph-state and DJ-style circuits contain only h/cx/cz/x and Clifford
+angles. In the public data they meet the fidelity target at the lowest
+rungs, and their runtime follows from circuit size, so they can be answered
+without qiskit parsing, the feature pipeline, Doc2Vec inference or XGBoost.
+That is an observation on a small sample, not a property of stabilizer
+states: across a cut with k qubits on the smaller side a stabilizer state
+can have Schmidt rank up to 2^k (graph and cluster states reach it), so a
+larger or differently wired Clifford circuit can need a higher rung. Until
+the rules are validated on held-out circuits, the wrappers use the fast
+path only with --fast_path.
+
+is_clifford_qasm() is a single pass over the QASM text. It strips comments,
+expands custom `gate` definitions with their parameters bound, and
+evaluates angle expressions with qasm_expr. A circuit counts as Clifford only if every
+gate is a known Clifford at the given angles; any unknown gate or
+expression means "not Clifford".
+
+The rule table clifford_rules.json is fitted from the Clifford circuits of
+the public data, per backend/precision:
+- threshold: the highest first-crossing rung over the ~10 Clifford circuits
+  seen. Under-predicting scores 0, over-predicting only halves the score.
+- fidelity: the lowest measured fidelity at that threshold, reported as
+  predicted_fidelity.
+- runtime: log10 forward run_wall_s = a + b * log10(gate count), measured at
+  the selected rung, so it only answers for that threshold.
+
+Usage:
+  python clifford_fast_path.py --fit --public_json ../data/hackathon_public.json
+  python clifford_fast_path.py --report                 # how often the fast path fires on circuits/
+  python clifford_fast_path.py --circuit ghz_indep_qiskit_30.qasm --backend CPU --precision single
+"""
+
+import argparse
+import json
+import math
+import re
+from pathlib import Path
+
+import numpy as np
+
+import qasm_expr
+
+RULES_PATH = "clifford_rules.json"
+THRESHOLD_RUNGS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+clifford_gates = {'id', 'x', 'y', 'z', 'h', 's', 'sdg', 'sx', 'sxdg', 'cx', 'CX', 'cy', 'cz',
+                  'swap', 'iswap', 'dcx', 'ecr'}
+# Gate -> angle quantum (in units of pi) every parameter must be a multiple of.
+clifford_angle_gates = {
+    'rx': 0.5, 'ry': 0.5, 'rz': 0.5, 'u1': 0.5, 'p': 0.5, 'phase': 0.5,
+    'u2': 0.5, 'u3': 0.5, 'u': 0.5, 'U': 0.5,
+    'rxx': 0.5, 'ryy': 0.5, 'rzz': 0.5,
+    'cu1': 1.0, 'cp': 1.0,
+    'crx': 2.0, 'cry': 2.0, 'crz': 2.0,
+}
+ignored_statements = {'OPENQASM', 'include', 'qreg', 'creg', 'barrier', 'measure', 'reset'}
+
+_gate_def = re.compile(r'gate\s+(\w+)\s*(?:\(([^)]*)\))?\s*([^{]*)\{([^}]*)\}')
+_statement = re.compile(r'^(\w+)\s*(?:\((.*)\))?\s*(.*)$', re.S)
+
+
+def _is_multiple(angle, quantum):
+    x = angle / (quantum * math.pi)
+    return abs(x - round(x)) < 1e-9
+
+
+def _statements(body):
+    for stmt in body.split(';'):
+        stmt = stmt.strip()
+        if stmt.startswith('if'):
+            stmt = stmt[stmt.index(')') + 1:].strip()
+        if stmt:
+            yield stmt
+
+
+def _clifford_call(name, params, definitions, scope, depth=0):
+    if name in definitions and depth < 16:
+        formals, body = definitions[name]
+        inner = dict(zip(formals, params))
+        return all(_clifford_statement(s, definitions, inner, depth + 1) for s in _statements(body))
+    if name in clifford_gates:
+        return True
+    quantum = clifford_angle_gates.get(name)
+    return quantum is not None and all(_is_multiple(p, quantum) for p in params)
+
+
+def _clifford_statement(stmt, definitions, scope, depth=0):
+    m = _statement.match(stmt)
+    if not m:
+        return False
+    name, params, _ = m.groups()
+    if name in ignored_statements:
+        return True
+    try:
+        values = [qasm_expr.eval_expr(p, scope) for p in qasm_expr.split_args(params or '')]
+    except ValueError:
+        return False
+    return _clifford_call(name, values, definitions, scope, depth)
+
+
+def is_clifford_qasm(text):
+    """(is Clifford, gate count) from one pass over the QASM text."""
+    text = re.sub(r'//[^\n]*', '', text)
+    definitions = {}
+    for name, formals, _, body in _gate_def.findall(text):
+        definitions[name] = ([f.strip() for f in formals.split(',') if f.strip()], body)
+    text = _gate_def.sub('', text)
+
+    gates = 0
+    for stmt in _statements(text):
+        if not _clifford_statement(stmt, definitions, {}):
+            return False, None
+        if stmt.split(None, 1)[0].split('(')[0] not in ignored_statements:
+            gates += 1
+    return True, gates
+
+
+def fit_rules(public_json, circuit_dir, out_path=RULES_PATH):
+    with open(public_json, 'r') as f:
+        data = json.load(f)
+
+    gate_counts = {}
+    for path in Path(circuit_dir).glob('*.qasm'):
+        clifford, gates = is_clifford_qasm(path.read_text(encoding='utf-8'))
+        if clifford:
+            gate_counts[path.name] = gates
+
+    rules = {"circuits": sorted(gate_counts), "groups": {}}
+    for backend in ["CPU", "GPU"]:
+        for precision in ["single", "double"]:
+            thresholds, log_gates, log_wall, sweeps = [], [], [], []
+            for r in data["results"]:
+                if (r["file"] not in gate_counts or r["backend"] != backend
+                        or r["precision"] != precision or r.get("status") != "ok"):
+                    continue
+                target = (r.get("selection") or {}).get("target", 0.99)
+                sweep = {s["threshold"]: s["sdk_get_fidelity"] for s in r.get("threshold_sweep", [])
+                         if s.get("sdk_get_fidelity") is not None}
+                crossed = [t for t, fidelity in sweep.items() if fidelity >= target]
+                wall = (r.get("forward") or {}).get("run_wall_s")
+                if not crossed or not wall:
+                    continue
+                thresholds.append(min(crossed))
+                log_gates.append(math.log10(max(gate_counts[r["file"]], 1)))
+                log_wall.append(math.log10(wall))
+                sweeps.append(sweep)
+            if not thresholds:
+                continue
+            threshold = int(max(thresholds))
+            at_threshold = [sweep[threshold] for sweep in sweeps if threshold in sweep]
+
+            A = np.column_stack([np.ones(len(log_gates)), log_gates])
+            if len(set(log_gates)) > 1:
+                (a, b), *_ = np.linalg.lstsq(A, np.asarray(log_wall), rcond=None)
+            else:
+                a, b = float(np.mean(log_wall)), 0.0
+            rules["groups"][f"{backend}|{precision}"] = {
+                "threshold": threshold,
+                "fidelity": float(min(at_threshold)) if at_threshold else None,
+                "log10_wall_intercept": float(a),
+                "log10_wall_per_log10_gate": float(b),
+                "samples": len(thresholds),
+            }
+
+    with open(out_path, 'w') as f:
+        json.dump(rules, f, indent=2)
+    return rules
+
+
+def load_rules(path=RULES_PATH):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def fast_path_predict(qasm_path, backend, precision, rules):
+    """
+    (threshold, forward runtime seconds, fidelity) for a Clifford circuit, or None if the fast path
+    does not apply. The fidelity is the lowest measured at the rule threshold (None if none was).
+    """
+    group = rules["groups"].get(f"{backend}|{precision}")
+    if group is None:
+        return None
+    clifford, gates = is_clifford_qasm(Path(qasm_path).read_text(encoding='utf-8'))
+    if not clifford:
+        return None
+    runtime = 10 ** (group["log10_wall_intercept"] + group["log10_wall_per_log10_gate"] * math.log10(max(gates, 1)))
+    return group["threshold"], runtime, group.get("fidelity")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clifford-only fast path")
+    parser.add_argument("--fit", action="store_true", help="Fit the rule table from the public data")
+    parser.add_argument("--report", action="store_true", help="Report how often the fast path fires on --circuit_dir")
+    parser.add_argument("--public_json", type=str, default="../data/hackathon_public.json")
+    parser.add_argument("--circuit_dir", type=str, default="circuits")
+    parser.add_argument("--rules", type=str, default=RULES_PATH)
+    parser.add_argument("--circuit", type=str, help="Circuit file name inside --circuit_dir")
+    parser.add_argument("--backend", type=str, choices=["GPU", "CPU"], default="CPU")
+    parser.add_argument("--precision", type=str, choices=["single", "double"], default="single")
+    args = parser.parse_args()
+
+    if args.fit:
+        rules = fit_rules(args.public_json, args.circuit_dir, args.rules)
+        print(f"Clifford circuits: {', '.join(rules['circuits'])}")
+        for key, g in rules["groups"].items():
+            print(f"{key}: threshold={g['threshold']} fidelity={g['fidelity']} samples={g['samples']}")
+        print(f"Rules written to {args.rules}")
+        return
+
+    if args.report:
+        paths = sorted(Path(args.circuit_dir).glob('*.qasm'))
+        hits = [p.name for p in paths if is_clifford_qasm(p.read_text(encoding='utf-8'))[0]]
+        print(f"Fast path fires on {len(hits)} of {len(paths)} circuits ({100 * len(hits) / max(len(paths), 1):.1f}%)")
+        for name in hits:
+            print(f"  {name}")
+        return
+
+    result = fast_path_predict(Path(args.circuit_dir) / args.circuit, args.backend, args.precision,
+                               load_rules(args.rules))
+    if result is None:
+        print(f"{args.circuit}: not Clifford, use the full pipeline")
+    else:
+        print(f"{args.circuit}: threshold={result[0]} predicted_fidelity={result[2]} "
+              f"predicted_forward_wall_s={result[1]:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+cost_model.py
+
+Closed-form mirror runtime model with calibrated gate weights.
+
+runtime_weights in qasm_parsing.py are hand-picked (cx: 10, ccx: 70, ...),
+and a zero angle divides a gate's weight by 1.5. Here the weights are fitted
+to the measured threshold_sweep run_wall_s instead. Separate tables are
+fitted for each backend/precision:
+
+    run_wall_s ~ setup + rung[threshold] * sum_g w[g] * sum_c angle[c] * n[g, c]
+
+- n[g, c] counts gate g at angle class c (circuit_ir classes: no params,
+  multiple of 2*pi, odd multiple of pi, other).
+- angle[other] = 1, so w[g] is the cost of a gate with a generic angle.
+- All terms are non-negative.
+
+The gate weights, angle multipliers and rung multipliers are each linear
+once the other two are fixed, so they are fitted by alternating NNLS on the
+relative error (rows scaled by 1/run_wall_s). With 36 circuits an
+unconstrained fit overfits: its leave-circuit-out error is worse than the
+hand-picked table's. --ridge therefore pulls every weight towards its
+hand-picked value, rescaled to seconds. At the default of 3, --cv gives
+about the same error as the hand table on CPU and a lower one on GPU.
+
+A prediction is a dot product
+of the circuit's count matrix with the fitted table, in microseconds and
+without Doc2Vec or XGBoost, for bulk screening.
+
+The fitted tables are saved as a versioned JSON artifact (cost_model.json).
+
+Usage:
+  python cost_model.py --fit --public_json ../data/hackathon_public.json --circuit_dir circuits --ir_dir circuit_ir
+  python cost_model.py --circuit circuits/qft_indep_qiskit_30.qasm --backend CPU --precision single --threshold 16
+"""
+
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.optimize import nnls
+
+import circuit_ir
+import qasm_parsing
+
+MODEL_FORMAT = "qcost-v1"
+MODEL_PATH = "cost_model.json"
+BACKENDS = ["CPU", "GPU"]
+PRECISIONS = ["single", "double"]
+SWEEP_RUNGS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+ANGLE_CLASSES = ["none", "zero", "pi", "other"]  # circuit_ir.ANGLE_NONE .. ANGLE_OTHER, shifted by one
+
+
+def gate_counts(ir):
+    """{gate name: [count per angle class]} of one IR circuit."""
+    counts = np.zeros((len(ir.opcodes), len(ANGLE_CLASSES)), dtype=np.int64)
+    np.add.at(counts, (np.asarray(ir.op), np.asarray(ir.angle_class) + 1), 1)
+    return {name: counts[i] for i, name in enumerate(ir.opcodes)}
+
+
+def count_matrix(counts, gates):
+    """[len(gates), 4] counts in the order of `gates`; gates outside it are ignored."""
+    m = np.zeros((len(gates), len(ANGLE_CLASSES)), dtype=np.float64)
+    index = {g: i for i, g in enumerate(gates)}
+    for name, row in counts.items():
+        if name in index:
+            m[index[name]] = row
+    return m
+
+
+def hand_table(gates):
+    """qasm_parsing's hand-picked weights as (w, angle): a zero angle divides the weight by 1.5."""
+    w = np.array([qasm_parsing.runtime_weights.get(g, 0.) for g in gates])
+    return w, np.array([1., 1 / 1.5, 1., 1.])
+
+
+def fit_group(C, rung_idx, y, fixed=None, prior=None, ridge=0.0, iterations=30):
+    """
+    Alternating NNLS for one backend/precision.
+    C: [n, gates, 4] counts, rung_idx: [n] rung index per row, y: [n] run_wall_s.
+    With fixed=(w, angle) only the setup and rung multipliers are fitted.
+    With prior=(w, angle), ridge rows pull each weight towards its prior value
+    in relative terms (ridge * (w / w_prior - 1)).
+    """
+    n, num_gates, _ = C.shape
+    inv_y = 1.0 / y
+    if fixed is not None:
+        w, angle = fixed
+    elif prior is not None:
+        w, angle = prior[0].copy(), prior[1].copy()
+    else:
+        w, angle = np.ones(num_gates), np.ones(len(ANGLE_CLASSES))
+    rung = np.ones(len(SWEEP_RUNGS))
+    seen = np.bincount(rung_idx, minlength=len(SWEEP_RUNGS)) > 0
+
+    def with_prior(A, b, values):
+        if prior is None or not ridge:
+            return A, b
+        # Priors of 0 are pulled towards 0 on the scale of the other weights.
+        ref = np.where(values > 0, values, values[values > 0].mean() if (values > 0).any() else 1.0)
+        rows = np.zeros((len(values), A.shape[1]))
+        rows[:, A.shape[1] - len(values):] = np.diag(ridge / ref)
+        return np.vstack([A, rows]), np.concatenate([b, ridge * (values > 0)])
+
+    for _ in range(1 if fixed is not None else iterations):
+        if fixed is None:
+            # Gate weights and setup, given angle and rung multipliers.
+            A = np.column_stack([np.ones(n), rung[rung_idx, None] * (C @ angle)])
+            A, b = with_prior(A * inv_y[:, None], np.ones(n), None if prior is None else prior[0])
+            coef, _ = nnls(A, b)
+            w = coef[1:]
+
+            # Zero and pi multipliers, given the rest. "none" only occurs on
+            # gates without parameters and "other" is the reference: both stay 1.
+            per_class = rung[rung_idx, None] * np.einsum('ngc,g->nc', C, w)
+            rhs = 1.0 - (coef[0] + per_class[:, 0] + per_class[:, 3]) * inv_y
+            A, b = with_prior(per_class[:, 1:3] * inv_y[:, None], rhs, None if prior is None else prior[1][1:3])
+            coef, _ = nnls(A, b)
+            angle[1:3] = coef
+
+        # Setup and rung multipliers: one column per rung.
+        cost = np.einsum('ngc,g,c->n', C, w, angle)
+        R = np.zeros((n, 1 + len(SWEEP_RUNGS)))
+        R[:, 0] = 1.0
+        R[np.arange(n), 1 + rung_idx] = cost
+        coef, _ = nnls(R * inv_y[:, None], np.ones(n))
+        setup, rung = coef[0], coef[1:]
+        if fixed is None:
+            # Fold the scale into the gate weights so the lowest seen rung is 1.
+            scale = rung[seen][0] if rung[seen][0] > 0 else 1.0
+            rung = rung / scale
+            w = w * scale
+        # Unseen rungs get the multiplier of the nearest lower one.
+        for j in np.flatnonzero(~seen):
+            rung[j] = rung[j - 1] if j else 1.0
+
+    pred = setup + rung[rung_idx] * np.einsum('ngc,g,c->n', C, w, angle)
+    return setup, w, angle, rung, pred
+
+
+def load_sweep_rows(public_json):
+    """(file, backend, precision, threshold, run_wall_s) for every completed mirror run."""
+    with open(public_json, 'r') as f:
+        data = json.load(f)
+    rows = []
+    for r in data["results"]:
+        for s in r.get("threshold_sweep", []):
+            if s.get("returncode") == 0 and s.get("run_wall_s") and s.get("threshold") in SWEEP_RUNGS:
+                rows.append((r["file"], r["backend"], r["precision"], s["threshold"], s["run_wall_s"]))
+    return rows
+
+
+def hand_prior(C, rung_idx, y, gates):
+    """Hand-picked weights in seconds: rescaled so the lowest measured rung has multiplier 1."""
+    w, angle = hand_table(gates)
+    rung = fit_group(C, rung_idx, y, fixed=(w, angle))[3]
+    return w * rung[rung_idx.min()], angle
+
+
+def fit_calibrated(C, rung_idx, y, gates, ridge):
+    return fit_group(C, rung_idx, y, prior=hand_prior(C, rung_idx, y, gates), ridge=ridge)
+
+
+def leave_circuit_out(C, rung_idx, y, names, fit_fn):
+    """Out-of-circuit predictions: each circuit's runs predicted by a fit on all other circuits."""
+    pred = np.empty_like(y)
+    for name in np.unique(names):
+        test = names == name
+        setup, w, angle, rung, _ = fit_fn(C[~test], rung_idx[~test], y[~test])
+        pred[test] = setup + rung[rung_idx[test]] * np.einsum('ngc,g,c->n', C[test], w, angle)
+    return pred
+
+
+def fit(public_json, circuit_dir, ir_dir, out_path=MODEL_PATH, ridge=3.0, cv=False):
+    rows = load_sweep_rows(public_json)
+    counts = {}
+    for name in sorted({r[0] for r in rows}):
+        qasm_path = Path(circuit_dir) / name
+        if qasm_path.exists():
+            counts[name] = gate_counts(circuit_ir.load_ir(circuit_ir.compile_qasm_file(qasm_path, ir_dir)))
+    rows = [r for r in rows if r[0] in counts]
+    gates = sorted({g for c in counts.values() for g in c})
+
+    with open(public_json, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    model = {
+        "format": MODEL_FORMAT,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "source_sha256": digest,
+        "gates": gates,
+        "angle_classes": ANGLE_CLASSES,
+        "rungs": SWEEP_RUNGS,
+        "ridge": ridge,
+        "groups": {},
+    }
+    for backend in BACKENDS:
+        for precision in PRECISIONS:
+            group = [r for r in rows if r[1] == backend and r[2] == precision]
+            if not group:
+                continue
+            C = np.stack([count_matrix(counts[r[0]], gates) for r in group])
+            rung_idx = np.array([SWEEP_RUNGS.index(r[3]) for r in group])
+            y = np.array([r[4] for r in group])
+
+            setup, w, angle, rung, pred = fit_calibrated(C, rung_idx, y, gates, ridge)
+            log_err = np.abs(np.log10(pred / y))
+            hand_err = np.abs(np.log10(fit_group(C, rung_idx, y, fixed=hand_table(gates))[-1] / y))
+            model["groups"][f"{backend}|{precision}"] = {
+                "setup_s": float(setup),
+                "gate_weights_s": {g: float(x) for g, x in zip(gates, w)},
+                "angle_multipliers": dict(zip(ANGLE_CLASSES, angle.tolist())),
+                "rung_multipliers": dict(zip(map(str, SWEEP_RUNGS), rung.tolist())),
+                "samples": len(group),
+                "median_abs_log10_error": float(np.median(log_err)),
+                "hand_weights_median_abs_log10_error": float(np.median(hand_err)),
+            }
+            print(f"{backend}/{precision}: {len(group)} runs, median |log10 error| = {np.median(log_err):.3f} "
+                  f"(hand-picked weights: {np.median(hand_err):.3f})")
+
+            if cv:
+                names = np.array([r[0] for r in group])
+                calibrated = leave_circuit_out(C, rung_idx, y, names, lambda *a: fit_calibrated(*a, gates, ridge))
+                hand = leave_circuit_out(C, rung_idx, y, names, lambda *a: fit_group(*a, fixed=hand_table(gates)))
+                cv_err = np.abs(np.log10(calibrated / y))
+                cv_hand = np.abs(np.log10(hand / y))
+                model["groups"][f"{backend}|{precision}"]["cv_median_abs_log10_error"] = float(np.median(cv_err))
+                print(f"    leave-circuit-out: {np.median(cv_err):.3f} (hand-picked weights: {np.median(cv_hand):.3f})")
+
+    with open(out_path, 'w') as f:
+        json.dump(model, f, indent=2)
+    return model
+
+
+class CostModel:
+    """Fitted tables as dense arrays; predict() is one small dot product."""
+
+    def __init__(self, path=MODEL_PATH):
+        with open(path, 'r') as f:
+            model = json.load(f)
+        if model.get("format") != MODEL_FORMAT:
+            raise ValueError(f"{path}: unsupported cost model format {model.get('format')!r}")
+        self.gates = model["gates"]
+        self.tables = {}
+        for key, g in model["groups"].items():
+            w = np.array([g["gate_weights_s"][name] for name in self.gates])
+            angle = np.array([g["angle_multipliers"][c] for c in ANGLE_CLASSES])
+            rung = {int(t): m for t, m in g["rung_multipliers"].items()}
+            # Gate x angle-class cost table, so a prediction is a single contraction.
+            self.tables[key] = (g["setup_s"], np.outer(w, angle), rung)
+
+    def features(self, ir):
+        return count_matrix(gate_counts(ir), self.gates)
+
+    def predict(self, counts, backend, precision, threshold):
+        """Mirror run_wall_s for a count matrix from features()."""
+        setup, table, rung = self.tables[f"{backend}|{precision}"]
+        return setup + rung[threshold] * float(np.vdot(table, counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit or query the calibrated analytic cost model")
+    parser.add_argument("--fit", action="store_true", help="Fit the model instead of querying it")
+    parser.add_argument("--public_json", type=str, default="../data/hackathon_public.json")
+    parser.add_argument("--circuit_dir", type=str, default="circuits")
+    parser.add_argument("--ir_dir", type=str, default="circuit_ir", help="IR cache (see circuit_ir.py)")
+    parser.add_argument("--model", type=str, default=MODEL_PATH)
+    parser.add_argument("--ridge", type=float, default=3.0,
+                        help="Strength of the pull towards the hand-picked weights (0: unregularized)")
+    parser.add_argument("--cv", action="store_true", help="With --fit, also report leave-circuit-out error")
+    parser.add_argument("--circuit", type=str, help="QASM file to predict for")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default="CPU")
+    parser.add_argument("--precision", type=str, choices=PRECISIONS, default="single")
+    parser.add_argument("--threshold", type=int, choices=SWEEP_RUNGS, default=1)
+    args = parser.parse_args()
+
+    if args.fit:
+        fit(args.public_json, args.circuit_dir, args.ir_dir, args.model, ridge=args.ridge, cv=args.cv)
+        print(f"Cost model written to {args.model}")
+        return
+
+    model = CostModel(args.model)
+    counts = model.features(circuit_ir.load_ir(circuit_ir.compile_qasm_file(args.circuit, args.ir_dir)))
+    start = time.perf_counter()
+    runtime = model.predict(counts, args.backend, args.precision, args.threshold)
+    elapsed = time.perf_counter() - start
+    print(f"Predicted mirror run_wall_s: {runtime:.3f} ({elapsed * 1e6:.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+family_scaling.py
+
+Size-sweep predictions per circuit family, without generating circuits.
+
+Questions like "how do runtime and required threshold grow from
+qft_indep_qiskit_30 to 130?" normally need a QASM file per size, fed
+through parsing, featurization and Doc2Vec. Here every raw model feature is
+fitted as a power law of the qubit count within its family (the `family`
+and `n_qubits` metadata of hackathon_public.json):
+
+    log10(feature) = intercept + slope * log10(n_qubits)
+
+A family with a single size gets the median slope of the families with
+several sizes, and an intercept through its one point. The raw features are
+mapped to model inputs with the affine transform that qasm_parsing.py
+applied to the training set: log10 then StandardScaler, or MinMaxScaler.
+That transform is recovered by least squares from the raw features of
+circuits/ and the scaled training CSV. The Doc2Vec embedding of a new size
+is taken from the family member nearest in log n_qubits.
+
+predict_sweep() builds the input rows of every (size, threshold rung) pair
+at once and calls the runtime model and the fidelity models once each. The
+required threshold is the first rung whose mean predicted fidelity reaches
+0.79, the cutoff fidelity_prediction.py uses. The runtime exponent is the
+log-log slope of the predicted runtime at that threshold over the sweep.
+
+Only the cutoff is shared with fidelity_prediction.py, not the model. That
+script loads xgb_fidelity_model.json, which is not in the tree. The sweep
+deliberately uses the mean of the five fold models that
+fidelity_xgboost_kfold.ipynb trains on the same inputs
+(../fidelity_model_fold_*.json). Pass --fidelity_models
+xgb_fidelity_model.json, where that file exists, to make exactly the
+decision fidelity_prediction.py makes.
+
+The --fit report leaves each size out in turn and refits both the laws and
+the recovered scaler without it. The scaled training CSV and the runtime
+model still saw every circuit, so the featurized RMSE is the in-sample
+baseline the sweep RMSE is compared with.
+
+Usage:
+  python family_scaling.py --fit            # writes family_scaling.json, prints leave-one-size-out errors
+  python family_scaling.py --list
+  python family_scaling.py --family QFT     # the family's known sizes
+  python family_scaling.py --family QFT --sizes 15 30 60 130 --backend CPU --precision single
+"""
+
+import argparse
+import glob
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SCALING_PATH = "family_scaling.json"
+SCALING_FORMAT = "family-scaling-v1"
+RUNGS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+# Same cutoff fidelity_prediction.py selects the threshold with (applied here to the fold ensemble's mean).
+FIDELITY_CUTOFF = 0.79
+LOG_EPS = 1e-10  # qasm_parsing.py adds this before log10
+
+mapping = {
+    "precision": {"single": 0, "double": 1},
+    "backend": {"GPU": 0, "CPU": 1}
+}
+
+
+def raw_features(circuit_dir, files):
+    """Unscaled extract_features() values per file, from the array IR (nothing written to disk)."""
+    import qiskit.qasm2 as qasm
+    import circuit_ir
+    import qasm_parsing
+
+    rows = {}
+    for name in files:
+        text = qasm_parsing.standardize_qasm_gates((Path(circuit_dir) / name).read_text(encoding='utf-8'))
+        rows[name] = circuit_ir.ir_features(circuit_ir.lower_circuit(qasm.loads(text), name))
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def fit_transforms(raw, scaled, feature_cols):
+    """Per column: scaled = scale * (log10(raw + eps) if log else raw) + offset, and the fit residual."""
+    transforms = {}
+    for col in feature_cols:
+        best = None
+        for log in (True, False):
+            x = np.log10(raw[col].to_numpy(dtype=float) + LOG_EPS) if log else raw[col].to_numpy(dtype=float)
+            A = np.column_stack([x, np.ones_like(x)])
+            (scale, offset), *_ = np.linalg.lstsq(A, scaled[col].to_numpy(dtype=float), rcond=None)
+            residual = float(np.max(np.abs(A @ [scale, offset] - scaled[col].to_numpy(dtype=float))))
+            if best is None or residual < best['residual']:
+                best = {'log': log, 'scale': float(scale), 'offset': float(offset), 'residual': residual}
+        transforms[col] = best
+    return transforms
+
+
+def fit_laws(members, feature_cols):
+    """
+    members: {family: [(n_qubits, {col: raw value})]}.
+    Returns ({family: {col: (intercept, slope)}}, {col: pooled slope}).
+    """
+    slopes = {col: [] for col in feature_cols}
+    fitted = {}
+    for family, points in members.items():
+        if len({n for n, _ in points}) < 2:
+            continue
+        logn = np.log10([n for n, _ in points])
+        A = np.column_stack([np.ones_like(logn), logn])
+        fitted[family] = {}
+        for col in feature_cols:
+            y = np.log10([f[col] + LOG_EPS for _, f in points])
+            (a, b), *_ = np.linalg.lstsq(A, y, rcond=None)
+            fitted[family][col] = (float(a), float(b))
+            slopes[col].append(float(b))
+    pooled = {col: float(np.median(s)) if s else 0. for col, s in slopes.items()}
+
+    laws = {}
+    for family, points in members.items():
+        if family in fitted:
+            laws[family] = fitted[family]
+            continue
+        logn = np.log10([n for n, _ in points])
+        laws[family] = {
+            col: (float(np.mean([math.log10(f[col] + LOG_EPS) for _, f in points]) - pooled[col] * logn.mean()),
+                  pooled[col])
+            for col in feature_cols
+        }
+    return laws, pooled
+
+
+class FamilyScaling:
+    """Fitted scaling laws plus the models a sweep is predicted with."""
+
+    def __init__(self, table, runtime_model, fidelity_models=()):
+        self.table = table
+        self.feature_cols = table['feature_cols']
+        self.runtime_model = runtime_model
+        self.fidelity_models = list(fidelity_models)
+
+    @property
+    def families(self):
+        return sorted(self.table['families'])
+
+    def scaled_features(self, family, sizes):
+        """[len(sizes), features] model inputs (scaled) from the family's laws."""
+        fam = self.table['families'][family]
+        logn = np.log10(np.asarray(sizes, dtype=float))[:, None]
+        intercept = np.array([fam['laws'][c]['intercept'] for c in self.feature_cols])
+        slope = np.array([fam['laws'][c]['slope'] for c in self.feature_cols])
+        log_raw = intercept + slope * logn
+        t = [self.table['transforms'][c] for c in self.feature_cols]
+        x = np.where([tc['log'] for tc in t], log_raw, 10 ** log_raw - LOG_EPS)
+        return x * np.array([tc['scale'] for tc in t]) + np.array([tc['offset'] for tc in t])
+
+    def embeddings(self, family, sizes):
+        """[len(sizes), dims] embedding of the member nearest in log n_qubits."""
+        emb = self.table['families'][family]['embeddings']
+        known = np.array(sorted(int(n) for n in emb))
+        logn = np.log10(np.asarray(sizes, dtype=float))
+        nearest = known[np.abs(logn[:, None] - np.log10(known)[None, :]).argmin(axis=1)]
+        return np.array([emb[str(n)] for n in nearest])
+
+    def sweep_inputs(self, family, sizes, backend, precision, rungs=RUNGS):
+        """Model input rows for every (size, rung), size-major: [len(sizes) * len(rungs), columns]."""
+        feats = np.hstack([self.scaled_features(family, sizes), self.embeddings(family, sizes)])
+        feats = np.repeat(feats, len(rungs), axis=0)
+        head = np.column_stack([
+            np.full(len(feats), mapping['precision'][precision]),
+            np.full(len(feats), mapping['backend'][backend]),
+            np.tile((1/8) * np.log2(np.asarray(rungs, dtype=float)), len(sizes)),
+        ])
+        dims = feats.shape[1] - len(self.feature_cols)
+        columns = ['precision', 'backend', 'normalized_threshold'] + self.feature_cols + [str(i) for i in range(dims)]
+        return pd.DataFrame(np.hstack([head, feats]), columns=columns)
+
+    def predict_sweep(self, family, sizes, backend, precision, rungs=RUNGS):
+        """
+        Dict of arrays over `sizes`: runtime [sizes, rungs] seconds, fidelity [sizes, rungs]
+        (if fidelity models are loaded), threshold and runtime at that threshold, plus the runtime exponent.
+        """
+        sizes = np.asarray(sizes, dtype=float)
+        X = self.sweep_inputs(family, sizes, backend, precision, rungs)
+        shape = (len(sizes), len(rungs))
+        runtime = 10 ** self.runtime_model.predict(X).reshape(shape)
+        result = {'sizes': sizes, 'rungs': np.asarray(rungs), 'runtime': runtime}
+
+        if self.fidelity_models:
+            fidelity = np.mean([m.predict(X) for m in self.fidelity_models], axis=0).reshape(shape)
+            crossed = fidelity >= FIDELITY_CUTOFF
+            # No rung reaches the cutoff: fall back to the top rung.
+            idx = np.where(crossed.any(axis=1), crossed.argmax(axis=1), len(rungs) - 1)
+            result.update(fidelity=fidelity, threshold=np.asarray(rungs)[idx], reached=crossed.any(axis=1),
+                          runtime_at_threshold=runtime[np.arange(len(sizes)), idx])
+            selected = result['runtime_at_threshold']
+        else:
+            selected = runtime[:, 0]
+        if len(np.unique(sizes)) > 1:
+            result['runtime_exponent'] = float(np.polyfit(np.log10(sizes), np.log10(selected), 1)[0])
+        return result
+
+
+def _load_regressor(path):
+    import xgboost as xgb
+
+    model = xgb.XGBRegressor()
+    model.load_model(path)
+    return model
+
+
+def load_scaling(path=SCALING_PATH, runtime_model="xgb_runtime_model.json",
+                 fidelity_models="../fidelity_model_fold_*.json"):
+    with open(path, 'r') as f:
+        table = json.load(f)
+    if table.get('format') != SCALING_FORMAT:
+        raise ValueError(f"{path}: unknown format {table.get('format')!r}")
+    fidelity = [_load_regressor(p) for p in sorted(glob.glob(fidelity_models))] if fidelity_models else []
+    return FamilyScaling(table, _load_regressor(runtime_model), fidelity)
+
+
+def _table(members, raw, transforms, embeddings, feature_cols):
+    laws, pooled = fit_laws(
+        {fam: [(n, raw.loc[name]) for name, n in files] for fam, files in members.items()}, feature_cols)
+    return {
+        'format': SCALING_FORMAT,
+        'feature_cols': feature_cols,
+        'transforms': transforms,
+        'pooled_slopes': pooled,
+        'families': {
+            fam: {
+                'members': [{'file': name, 'n_qubits': n} for name, n in sorted(files, key=lambda m: m[1])],
+                'laws': {c: {'intercept': a, 'slope': b} for c, (a, b) in laws[fam].items()},
+                'embeddings': {str(n): embeddings.loc[name].tolist() for name, n in files},
+            }
+            for fam, files in members.items()
+        },
+    }
+
+
+def fit(public_json, circuit_dir, features_csv, embeddings_csv, public_csv, out_path=SCALING_PATH,
+        runtime_model="xgb_runtime_model.json"):
+    """Fit and write the scaling table; returns (table, leave-one-size-out report)."""
+    with open(public_json, 'r') as f:
+        circuits = json.load(f)['circuits']
+    scaled = pd.read_csv(features_csv).set_index('name')
+    embeddings = pd.read_csv(embeddings_csv)
+    embeddings = embeddings.drop(columns=['Unnamed: 0'], errors='ignore').set_index('name')
+    feature_cols = list(scaled.columns)
+
+    members = {}
+    for c in circuits:
+        if c['file'] in scaled.index and c['file'] in embeddings.index and (Path(circuit_dir) / c['file']).exists():
+            members.setdefault(c['family'], []).append((c['file'], int(c['n_qubits'])))
+    files_all = [name for files in members.values() for name, _ in files]
+    raw = raw_features(circuit_dir, files_all)
+    transforms = fit_transforms(raw.loc[files_all], scaled.loc[files_all], feature_cols)
+
+    table = _table(members, raw, transforms, embeddings, feature_cols)
+    with open(out_path, 'w') as f:
+        json.dump(table, f, indent=2)
+
+    # Leave one size out: refit without the circuit and predict it from the rest of its family.
+    runtime = _load_regressor(runtime_model)
+    measured = pd.read_csv(public_csv).dropna()
+    report = []
+    for fam, files in members.items():
+        if len(files) < 2:
+            continue
+        for name, n in files:
+            rest = {f: [m for m in fs if m[0] != name] for f, fs in members.items()}
+            # The scaler is recovered without the left-out circuit too, so it does not leak into its prediction.
+            kept = [f for f in files_all if f != name]
+            rest_transforms = fit_transforms(raw.loc[kept], scaled.loc[kept], feature_cols)
+            scaling = FamilyScaling(_table(rest, raw, rest_transforms, embeddings, feature_cols), runtime)
+            feature_err = np.abs(scaling.scaled_features(fam, [n])[0] - scaled.loc[name, feature_cols].to_numpy())
+            rows = measured[measured['circuit'] == name]
+            if rows.empty:
+                continue
+            sweep_log, actual_log = [], []
+            for (backend, precision), group in rows.groupby(['backend', 'precision']):
+                rungs = group['threshold'].astype(int).tolist()
+                X = scaling.sweep_inputs(fam, [n], backend, precision, rungs)
+                sweep_log.append(runtime.predict(X))
+                # Same rows from the circuit's real features and embedding, as runtime_prediction.py builds them.
+                X[feature_cols] = scaled.loc[name, feature_cols].to_numpy(dtype=float)
+                X[[str(i) for i in range(len(embeddings.columns))]] = embeddings.loc[name].to_numpy(dtype=float)
+                actual_log.append(runtime.predict(X))
+            y = np.log10(rows.sort_values(['backend', 'precision'], kind='stable')['expected_runtime_sec'].to_numpy())
+            report.append({
+                'circuit': name, 'family': fam, 'n_qubits': n,
+                'feature_mae': float(feature_err.mean()),
+                'rmse_sweep': float(np.sqrt(np.mean((np.concatenate(sweep_log) - y) ** 2))),
+                'rmse_featurized': float(np.sqrt(np.mean((np.concatenate(actual_log) - y) ** 2))),
+            })
+    return table, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-family size-sweep predictions from scaling laws")
+    parser.add_argument("--fit", action="store_true", help="Fit the scaling table from the public data")
+    parser.add_argument("--list", action="store_true", help="List the fitted families and their sizes")
+    parser.add_argument("--public_json", type=str, default="../data/hackathon_public.json")
+    parser.add_argument("--public_csv", type=str, default="../extracted_public_data.csv")
+    parser.add_argument("--circuit_dir", type=str, default="circuits")
+    parser.add_argument("--features", type=str, default="../qasm_features_scaled.csv",
+                        help="Scaled features the runtime model was trained on")
+    parser.add_argument("--embeddings", type=str, default="../generated_embeddings.csv")
+    parser.add_argument("--scaling", type=str, default=SCALING_PATH)
+    parser.add_argument("--runtime_model", type=str, default="xgb_runtime_model.json")
+    parser.add_argument("--fidelity_models", type=str, default="../fidelity_model_fold_*.json",
+                        help="Glob of fidelity models; their mean picks the threshold "
+                             "(the k-fold ensemble by default, not fidelity_prediction.py's xgb_fidelity_model.json)")
+    parser.add_argument("--family", type=str)
+    parser.add_argument("--sizes", type=int, nargs="+", help="Qubit counts to predict (default: the family's known sizes)")
+    parser.add_argument("--backend", type=str, choices=["GPU", "CPU"], default="CPU")
+    parser.add_argument("--precision", type=str, choices=["single", "double"], default="single")
+    args = parser.parse_args()
+
+    if args.fit:
+        table, report = fit(args.public_json, args.circuit_dir, args.features, args.embeddings,
+                            args.public_csv, args.scaling, args.runtime_model)
+        worst = max(t['residual'] for t in table['transforms'].values())
+        print(f"{len(table['families'])} families; scaler recovered with max residual {worst:.2e}")
+        print("Leave-one-size-out, log10 runtime RMSE vs measured (sweep / from the real circuit):")
+        for r in report:
+            print(f"  {r['circuit']:<40} feature MAE {r['feature_mae']:.3f}  "
+                  f"{r['rmse_sweep']:.3f} / {r['rmse_featurized']:.3f}")
+        sizes = {fam: len(f['members']) for fam, f in table['families'].items()}
+        # Two-size families keep a single point when one is left out, so their laws fall back to pooled slopes.
+        for label, subset in [("mean", report), ("mean, 3+ sizes", [r for r in report if sizes[r['family']] > 2])]:
+            if subset:
+                print(f"  {label:<40} feature MAE {np.mean([r['feature_mae'] for r in subset]):.3f}  "
+                      f"{np.mean([r['rmse_sweep'] for r in subset]):.3f} / "
+                      f"{np.mean([r['rmse_featurized'] for r in subset]):.3f}")
+        print(f"Scaling table written to {args.scaling}")
+        return
+
+    scaling = load_scaling(args.scaling, args.runtime_model, args.fidelity_models)
+    if args.list or not args.family:
+        for fam in scaling.families:
+            sizes = [m['n_qubits'] for m in scaling.table['families'][fam]['members']]
+            print(f"{fam}: {sizes}")
+        return
+
+    if args.family not in scaling.table['families']:
+        parser.error(f"unknown family {args.family!r}; see --list")
+    sizes = args.sizes or [m['n_qubits'] for m in scaling.table['families'][args.family]['members']]
+    result = scaling.predict_sweep(args.family, sizes, args.backend, args.precision)
+    print(f"{args.family} on {args.backend}/{args.precision}:")
+    for i, n in enumerate(sizes):
+        if 'threshold' in result:
+            note = "" if result['reached'][i] else " (cutoff not reached)"
+            print(f"  n={n:<5} threshold={result['threshold'][i]:<4} "
+                  f"runtime={result['runtime_at_threshold'][i]:.4f} s{note}")
+        else:
+            print(f"  n={n:<5} runtime@thr=1 {result['runtime'][i, 0]:.4f} s")
+    if 'runtime_exponent' in result:
+        print(f"  runtime ~ n^{result['runtime_exponent']:.2f} over this sweep")
+
+
+if __name__ == "__main__":
+    main()
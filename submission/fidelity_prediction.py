@@ -1,9 +1,11 @@
 import argparse
-import json
 import os
 import numpy as np
 import xgboost as xgb
 import pandas as pd
+import shared_models
+import tracing
+import workspace
 
 from sklearn.metrics import mean_squared_error
 from sklearn.model_selection import KFold, train_test_split
@@ -15,7 +17,11 @@ def main():
     parser.add_argument("--circuit_dir", type=str, required=True, help="Directory containing QASM files")
     parser.add_argument("--precision", type=str, choices=["single", "double"], required=True, help="Numerical precision")
     parser.add_argument("--backend", type=str, choices=["GPU", "CPU"], required=True, help="Execution backend")
+    parser.add_argument("--flat_models", action="store_true",
+                        help="Predict with the memory-mapped flat tree arrays (shared_models.py) instead of xgboost")
+    tracing.add_argument(parser)
     args = parser.parse_args()
+    tracing.configure(args.trace)
     print("Starting fidelity prediction...")
     for (threshold) in [2, 4, 8, 16, 32, 64, 128, 256]:
         mapping = {
@@ -29,18 +35,19 @@ def main():
             "normalized_threshold": (1/8) * np.log2(threshold)
         }])
 
-        qasm = pd.read_csv("qasm_features_scaled.csv")
-        filtered_row = qasm[qasm['name'] == args.circuit_dir]
-        embeddings = pd.read_csv("generated_embeddings.csv")
-        if 'Unnamed: 0' in embeddings.columns:
-            embeddings = embeddings.drop(columns=['Unnamed: 0'])
-        inputs = pd.merge(
-            filtered_row, 
-            embeddings, 
-            left_on=filtered_row.columns[0], 
-            right_on=embeddings.columns[0], 
-            how='left'
-        ).drop(columns=[embeddings.columns[0]])
+        with tracing.span("load_inputs", threshold=threshold):
+            qasm = pd.read_csv(workspace.path("qasm_features_scaled.csv"))
+            filtered_row = qasm[qasm['name'] == args.circuit_dir]
+            embeddings = pd.read_csv(workspace.path("generated_embeddings.csv"))
+            if 'Unnamed: 0' in embeddings.columns:
+                embeddings = embeddings.drop(columns=['Unnamed: 0'])
+            inputs = pd.merge(
+                filtered_row, 
+                embeddings, 
+                left_on=filtered_row.columns[0], 
+                right_on=embeddings.columns[0], 
+                how='left'
+            ).drop(columns=[embeddings.columns[0]])
 
         for col in params_df.columns:
             inputs[col] = params_df[col].iloc[0]
@@ -51,9 +58,15 @@ def main():
         
         X = inputs.dropna()
 
-        loaded_model_sklearn = xgb.XGBRegressor()
-        loaded_model_sklearn.load_model("xgb_fidelity_model.json")
-        preds = loaded_model_sklearn.predict(X)
+        with tracing.span("xgb_load"):
+            if args.flat_models:
+                loaded_model_sklearn = shared_models.load_forest("xgb_fidelity_model.json")
+            else:
+                loaded_model_sklearn = xgb.XGBRegressor()
+                loaded_model_sklearn.load_model("xgb_fidelity_model.json")
+        with tracing.span("xgb_predict", threshold=threshold):
+            preds = loaded_model_sklearn.predict(X)
+        tracing.count("thresholds_evaluated")
         bool = False
         
         for pred in enumerate(preds):
@@ -61,13 +74,13 @@ def main():
             print(f"Circuit: {circuit}, Threshold: {threshold}, Predicted Fidelity: {pred[1]}")
             circuit_name = os.path.basename(circuit)
             if pred[1] >= 0.79:  
-                json.dump(
+                workspace.write_json(
+                    workspace.path(f"fidelity_prediction_{circuit_name}.json"),
                     {
                         "circuit": circuit_name,
                         "threshold": threshold,
                         "predicted_fidelity": float(pred[1]),
-                    },
-                    open(f"fidelity_prediction_{circuit_name}.json", "w")
+                    }
                 )                
                 bool = True
                 break
@@ -4,9 +4,19 @@ from gensim.models.doc2vec import Doc2Vec
 from gensim.utils import simple_preprocess
 from pathlib import Path
 import pandas as pd
+import tracing
+import workspace
 
-# 1. Load the trained model
-model = Doc2Vec.load("qasm_doc2vec.model")
+# 1. The trained model, loaded in main() once tracing is configured
+model = None
+
+
+def load_model():
+    # Its arrays are mapped read-only, so parallel runs share one copy
+    global model
+    with tracing.span("doc2vec_load"):
+        model = Doc2Vec.load("qasm_doc2vec.model", mmap='r')
+    return model
 
 def get_qasm_vector(file_path):
     # 2. Read the new QASM file
@@ -15,24 +25,46 @@ def get_qasm_vector(file_path):
 
     # 3. Preprocess exactly like training (CRITICAL: min_len=1)
     # This turns "h q[0];" into ['h', 'q', '0']
-    tokens = simple_preprocess(content, min_len=1)
+    with tracing.span("tokenize"):
+        tokens = simple_preprocess(content, min_len=1)
+    tracing.count("tokens", len(tokens))
 
     # 4. Infer the vector
     # 'steps' is how many times it re-runs the inference to fine-tune the vector
-    vector = model.infer_vector(tokens, epochs=50)
+    with tracing.span("doc2vec_infer"):
+        vector = model.infer_vector(tokens, epochs=50)
     
     return vector
 
+def get_ir_vector(ir_path):
+    # Tokens were taken from the standardized QASM when the IR was compiled
+    # (see circuit_ir.py), so no text is read or re-tokenized here.
+    import circuit_ir
+
+    tokens = circuit_ir.load_ir(ir_path).token_list()
+    tracing.count("tokens", len(tokens))
+    with tracing.span("doc2vec_infer"):
+        vector = model.infer_vector(tokens, epochs=50)
+
+    return vector
+
 # Example Usage
 def main():
     parser = argparse.ArgumentParser(description="Quantum Fidelity Prediction Pipeline Wrapper")
     
     parser.add_argument("--circuit_dir", type=str, required=True, help="Directory containing QASM files")
+    parser.add_argument("--ir_dir", type=str, default=None, help="Read tokens from the compiled IR in this directory")
+    tracing.add_argument(parser)
     args = parser.parse_args()
-
+    tracing.configure(args.trace)
+    load_model()
 
     name_list = [args.circuit_dir]
-    emb_list = [get_qasm_vector(args.circuit_dir)]
+    if args.ir_dir:
+        import circuit_ir
+        emb_list = [get_ir_vector(circuit_ir.compile_qasm_file(args.circuit_dir, args.ir_dir))]
+    else:
+        emb_list = [get_qasm_vector(args.circuit_dir)]
 
 
 
@@ -43,7 +75,7 @@ def main():
 
     df = pd.concat([df_names, df_embs], axis=1)
 
-    df.to_csv('generated_embeddings.csv')
+    workspace.write_csv(df, workspace.path('generated_embeddings.csv'))
     print('Successful generation!')
 
 if __name__ == "__main__":
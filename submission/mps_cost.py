@@ -0,0 +1,181 @@
+"""
+mps_cost.py
+
+Symbolic MPS cost estimate per threshold rung, without simulating.
+
+The qubits are laid out as a chain. One pass over the gate list tracks an
+upper bound on the bond dimension across every cut. A gate spanning a cut
+multiplies that cut's bound by the gate's operator Schmidt rank (2 for
+controlled and ZZ-type gates, 4 for swaps and unknown gates, 1 for
+controlled rotations by a multiple of 2*pi). The bound never exceeds the
+exact limit 2^min(c+1, n-c-1).
+
+The threshold caps the bond dimension (chi_max = chi_scale * threshold).
+Because min(cap, r * b) = min(cap, r * min(cap, b)) for r >= 1, the capped
+bound of any rung equals min(cap, uncapped bound). So the sweep records the
+uncapped bonds around every gate once, and all rungs are evaluated
+afterwards, vectorized over the distinct (left, middle, right) bond triples.
+
+Per gate, with bonds chi_l | chi_m | chi_r around the sites it touches (d = 2):
+  two-site update, per cut spanned: d^2 chi_l chi_m chi_r (contract)
+                                    + d^4 chi_l chi_r (gate)
+                                    + d^3 chi_l chi_r min(chi_l, chi_r) (SVD)
+  one-site gate:                    d^2 chi_l chi_r
+Memory is the final MPS size, sum over sites of d chi_l chi_r complex values;
+bounds only grow, so that is also the peak.
+
+Usage:
+  python mps_cost.py --circuit circuits/qft_indep_qiskit_30.qasm
+"""
+
+import argparse
+import math
+from collections import Counter
+
+import numpy as np
+
+RUNGS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+PHYS_DIM = 2
+BYTES_PER_ELEMENT = {"single": 8, "double": 16}  # complex64 / complex128
+
+# log2 of the operator Schmidt rank across any cut the gate spans.
+gate_log_ranks = {
+    'cx': 1, 'cz': 1, 'cy': 1, 'ch': 1, 'cu1': 1, 'cp': 1, 'cu3': 1, 'crx': 1, 'cry': 1, 'crz': 1,
+    'rzz': 1, 'rxx': 1, 'ryy': 1, 'ccx': 1, 'rccx': 1,
+    'swap': 2, 'iswap': 2, 'cswap': 2,
+}
+DEFAULT_LOG_RANK = 2
+# Controlled rotations by a multiple of 2*pi are the identity.
+parametric_entanglers = {'cu1', 'cp', 'cu3', 'crx', 'cry', 'crz', 'rzz', 'rxx', 'ryy'}
+
+
+def gate_log_rank(name, trivial_angle=False):
+    if trivial_angle and name in parametric_entanglers:
+        return 0
+    return gate_log_ranks.get(name, DEFAULT_LOG_RANK)
+
+
+def mps_cost_from_gates(num_qubits, gates):
+    """
+    gates: iterable of (name, qubit indices, all angles a multiple of 2*pi).
+    Returns the bond-triple histograms the per-rung costs are evaluated from.
+    """
+    num_cuts = max(num_qubits - 1, 0)
+    # Index 0 and num_cuts + 1 are the open chain ends (bond dimension 1).
+    log_bond = [0] * (num_cuts + 2)
+    limit = [0] + [min(c + 1, num_qubits - c - 1) for c in range(num_cuts)] + [0]
+    two_site = Counter()
+    one_site = Counter()
+
+    for name, qubits, trivial in gates:
+        if len(qubits) == 1:
+            q = qubits[0]
+            one_site[(log_bond[q], log_bond[q + 1])] += 1
+            continue
+        if not qubits:
+            continue
+
+        lo, hi = min(qubits), max(qubits)
+        r = gate_log_rank(name, trivial)
+        # Cut c (between qubits c and c+1) is log_bond[c + 1].
+        for b in range(lo + 1, hi + 1):
+            log_bond[b] = min(log_bond[b] + r, limit[b])
+        for b in range(lo + 1, hi + 1):
+            two_site[(log_bond[b - 1], log_bond[b], log_bond[b + 1])] += 1
+
+    site_bonds = Counter(zip(log_bond[:-1], log_bond[1:]))
+    return {
+        'num_qubits': num_qubits,
+        'two_site': two_site,
+        'one_site': one_site,
+        'site_bonds': site_bonds,
+        'max_log2_bond': max(log_bond),
+    }
+
+
+def _capped_bonds(hist, width, caps):
+    """Bond dimensions of a triple/pair histogram capped per rung ([rungs, keys] each), and the counts."""
+    keys = np.asarray(list(hist), dtype=np.float64).reshape(len(hist), width)
+    counts = np.fromiter(hist.values(), dtype=np.float64, count=len(hist))
+    return [np.minimum(np.exp2(keys[:, i]), caps) for i in range(width)], counts
+
+
+def rung_costs(sweep, rungs=RUNGS, chi_scale=1.0):
+    """Estimated flops and MPS elements per rung: (flops[len(rungs)], elements[len(rungs)])."""
+    caps = chi_scale * np.asarray(rungs, dtype=np.float64)[:, None]
+    d = PHYS_DIM
+
+    (cl, cm, cr), n2 = _capped_bonds(sweep['two_site'], 3, caps)
+    (ol, orr), n1 = _capped_bonds(sweep['one_site'], 2, caps)
+    (sl, sr), ns = _capped_bonds(sweep['site_bonds'], 2, caps)
+
+    two = d**2 * cl * cm * cr + d**4 * cl * cr + d**3 * cl * cr * np.minimum(cl, cr)
+    flops = two @ n2 + (d**2 * ol * orr) @ n1
+    elements = (d * sl * sr) @ ns
+    return flops, elements
+
+
+def cost_features(sweep, precision="double", rungs=RUNGS, chi_scale=1.0):
+    """One row per rung: log10 flops and log10 memory bytes at `precision`."""
+    flops, elements = rung_costs(sweep, rungs, chi_scale)
+    return [
+        {
+            'threshold': rung,
+            'log10_mps_flops': math.log10(max(f, 1.)),
+            'log10_mps_memory_bytes': math.log10(max(e, 1.) * BYTES_PER_ELEMENT[precision]),
+        }
+        for rung, f, e in zip(rungs, flops, elements)
+    ]
+
+
+def _trivial(params):
+    return bool(params) and all(abs((float(p) / (2*math.pi)) % 1.) < 1e-10 for p in params)
+
+
+def estimate_mps_cost(qc, qc_data=None):
+    """mps_cost_from_gates() for a qiskit QuantumCircuit (barriers and measurements skipped)."""
+    qubit_index = {qb: i for i, qb in enumerate(qc.qubits)}
+    data = qc.data if qc_data is None else qc_data
+    gates = (
+        (instr.operation.name, [qubit_index[b] for b in instr.qubits], _trivial(instr.operation.params))
+        for instr in data
+        if instr.operation.name not in ('barrier', 'measure')
+    )
+    return mps_cost_from_gates(qc.num_qubits, gates)
+
+
+def ir_mps_cost(ir):
+    """mps_cost_from_gates() for a circuit_ir.CircuitIR."""
+    opcodes = ir.opcodes
+    skip = {i for i, name in enumerate(opcodes) if name == 'measure'}
+    # Angle class 0: every parameter is a multiple of 2*pi (see circuit_ir.ANGLE_ZERO).
+    gates = (
+        (opcodes[op], [q for q in qb if q >= 0], ac == 0)
+        for op, qb, ac in zip(ir.op.tolist(), ir.qubits.tolist(), ir.angle_class.tolist())
+        if op not in skip
+    )
+    return mps_cost_from_gates(ir.num_qubits, gates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate MPS flops and memory per threshold rung")
+    parser.add_argument("--circuit", type=str, required=True, help="QASM file")
+    parser.add_argument("--precision", type=str, choices=["single", "double"], default="double")
+    parser.add_argument("--chi_scale", type=float, default=1.0, help="Bond dimension cap per threshold unit")
+    args = parser.parse_args()
+
+    import qiskit.qasm2 as qasm
+    import qasm_parsing
+
+    with open(args.circuit, 'r') as f:
+        qc = qasm.loads(qasm_parsing.standardize_qasm_gates(f.read()))
+    sweep = estimate_mps_cost(qc)
+    flops, elements = rung_costs(sweep, chi_scale=args.chi_scale)
+
+    print(f"{args.circuit}: {qc.num_qubits} qubits, uncapped bond bound 2^{sweep['max_log2_bond']}")
+    for rung, f, e in zip(RUNGS, flops, elements):
+        print(f"  thr={rung:>3}  flops={f:.3e}  memory={e * BYTES_PER_ELEMENT[args.precision] / 2**20:.3f} MiB")
+
+
+if __name__ == "__main__":
+    main()
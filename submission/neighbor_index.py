@@ -0,0 +1,226 @@
+"""
+neighbor_index.py
+
+Nearest-neighbour lookup over the measured training circuits.
+
+The index is one .npz saved next to the XGBoost models. It holds:
+- a float32 matrix with one row per circuit in hackathon_public.json:
+  the scaled QASM features (qasm_features_scaled.csv) followed by the
+  Doc2Vec embedding (generated_embeddings.csv), plus precomputed row norms
+- the measured threshold_sweep of every circuit for each backend/precision
+  (fidelity and mirror run_wall_s per rung), the first rung that met the
+  fidelity target, and the 10k-shot forward run_wall_s
+
+A query is one matrix-vector product and an argpartition, well under a
+millisecond for this corpus. The neighbours explain an XGBoost output ("these
+measured circuits look like yours, and this is how their sweeps behaved").
+NeighborIndex.predict() gives a neighbour-only (threshold, runtime) estimate;
+it is used as the search prior in sweep_driver.py and printed by the query
+below, but predict_fidelity.py / predict_runtime.py do not fall back to it.
+
+Usage:
+  python neighbor_index.py --build \\
+      --public_json ../data/hackathon_public.json \\
+      --features ../qasm_features_scaled.csv --embeddings ../generated_embeddings.csv
+  python neighbor_index.py --circuit qft_indep_qiskit_30.qasm --backend CPU --precision single
+
+Both modes read the corpus-wide ../qasm_features_scaled.csv and
+../generated_embeddings.csv by default; the copies in submission/ only hold
+the circuits of the last prediction run.
+"""
+
+import argparse
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+INDEX_PATH = "neighbor_index.npz"
+BACKENDS = ["CPU", "GPU"]
+PRECISIONS = ["single", "double"]
+SWEEP_RUNGS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+THRESHOLD_RUNGS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+def load_feature_table(features_csv, embeddings_csv):
+    """Scaled features joined with embeddings, one row per circuit name."""
+    features = pd.read_csv(features_csv)
+    embeddings = pd.read_csv(embeddings_csv)
+    if 'Unnamed: 0' in embeddings.columns:
+        embeddings = embeddings.drop(columns=['Unnamed: 0'])
+    table = pd.merge(features, embeddings, on='name', how='inner')
+    return table.set_index('name')
+
+
+def build_index(public_json, features_csv, embeddings_csv, out_path=INDEX_PATH):
+    with open(public_json, 'r') as f:
+        data = json.load(f)
+
+    table = load_feature_table(features_csv, embeddings_csv)
+    names = [n for n in table.index if any(r["file"] == n for r in data["results"])]
+    table = table.loc[names]
+
+    n = len(names)
+    shape = (n, len(BACKENDS), len(PRECISIONS))
+    fidelity = np.full(shape + (len(SWEEP_RUNGS),), np.nan, dtype=np.float32)
+    mirror_wall = np.full(shape + (len(SWEEP_RUNGS),), np.nan, dtype=np.float32)
+    threshold_min = np.zeros(shape, dtype=np.int32)  # 0: target never met / no data
+    forward_wall = np.full(shape, np.nan, dtype=np.float32)
+
+    row_of = {name: i for i, name in enumerate(names)}
+    rung_of = {r: j for j, r in enumerate(SWEEP_RUNGS)}
+    for r in data["results"]:
+        i = row_of.get(r["file"])
+        if i is None or r.get("backend") not in BACKENDS or r.get("precision") not in PRECISIONS:
+            continue
+        b, p = BACKENDS.index(r["backend"]), PRECISIONS.index(r["precision"])
+        target = (r.get("selection") or {}).get("target", 0.99)
+
+        for s in r.get("threshold_sweep", []):
+            j = rung_of.get(s.get("threshold"))
+            if j is None:
+                continue
+            if s.get("sdk_get_fidelity") is not None:
+                fidelity[i, b, p, j] = s["sdk_get_fidelity"]
+                if s["sdk_get_fidelity"] >= target and threshold_min[i, b, p] == 0:
+                    threshold_min[i, b, p] = s["threshold"]
+            if s.get("run_wall_s") is not None:
+                mirror_wall[i, b, p, j] = s["run_wall_s"]
+
+        wall = (r.get("forward") or {}).get("run_wall_s")
+        if r.get("status") == "ok" and wall:
+            forward_wall[i, b, p] = wall
+
+    X = np.ascontiguousarray(table.to_numpy(dtype=np.float32))
+    np.savez(
+        out_path,
+        names=np.asarray(names),
+        columns=np.asarray(table.columns, dtype=str),
+        X=X,
+        sq_norms=np.einsum('ij,ij->i', X, X),
+        fidelity=fidelity,
+        mirror_wall=mirror_wall,
+        threshold_min=threshold_min,
+        forward_wall=forward_wall,
+    )
+    return out_path
+
+
+class NeighborIndex:
+    def __init__(self, path=INDEX_PATH):
+        with np.load(path) as z:
+            self.names = z["names"]
+            self.columns = list(z["columns"])
+            self.X = z["X"]
+            self.sq_norms = z["sq_norms"]
+            self.fidelity = z["fidelity"]
+            self.mirror_wall = z["mirror_wall"]
+            self.threshold_min = z["threshold_min"]
+            self.forward_wall = z["forward_wall"]
+
+    def vector(self, row):
+        """Feature vector in index column order from a merged features/embeddings row (Series or dict)."""
+        return np.asarray([row[c] for c in self.columns], dtype=np.float32)
+
+    def search(self, x, k=5, exclude=None):
+        """(row indices, distances) of the k nearest circuits, nearest first."""
+        x = np.asarray(x, dtype=np.float32)
+        d2 = self.sq_norms - 2 * (self.X @ x) + x @ x
+        if exclude is not None:
+            d2[self.names == exclude] = np.inf
+        k = min(k, len(d2))
+        idx = np.argpartition(d2, k - 1)[:k]
+        idx = idx[np.argsort(d2[idx], kind="stable")]
+        return idx, np.sqrt(np.maximum(d2[idx], 0))
+
+    def query(self, x, backend, precision, k=5, exclude=None):
+        """Top-k neighbours with their measured sweep for one backend/precision."""
+        b, p = BACKENDS.index(backend), PRECISIONS.index(precision)
+        idx, dist = self.search(x, k, exclude)
+        return [
+            {
+                "circuit": str(self.names[i]),
+                "distance": float(d),
+                "threshold_min": int(self.threshold_min[i, b, p]) or None,
+                "forward_wall_s": None if np.isnan(self.forward_wall[i, b, p]) else float(self.forward_wall[i, b, p]),
+                "sweep": [
+                    {"threshold": r, "fidelity": float(f), "run_wall_s": None if np.isnan(w) else float(w)}
+                    for r, f, w in zip(SWEEP_RUNGS, self.fidelity[i, b, p], self.mirror_wall[i, b, p])
+                    if not np.isnan(f)
+                ],
+            }
+            for i, d in zip(idx, dist)
+        ]
+
+    def predict_mirror_wall(self, x, backend, precision, k=5, exclude=None):
+        """Per-rung mirror run_wall_s (SWEEP_RUNGS order): weighted geometric mean over the neighbours."""
+        b, p = BACKENDS.index(backend), PRECISIONS.index(precision)
+        idx, dist = self.search(x, k, exclude)
+        walls = self.mirror_wall[idx, b, p].astype(np.float64)
+        w = np.where(np.isnan(walls), 0., (1.0 / (dist + 1e-6))[:, None])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            log_wall = (np.nan_to_num(np.log10(walls)) * w).sum(axis=0) / w.sum(axis=0)
+        return 10 ** log_wall
+
+    def predict(self, x, backend, precision, k=5, exclude=None):
+        """
+        Neighbour-only (threshold, 10k-shot runtime), weighted by
+        inverse distance. The threshold is the weighted mean rung rounded up;
+        missing the fidelity target scores 0, overshooting only halves it.
+        """
+        b, p = BACKENDS.index(backend), PRECISIONS.index(precision)
+        idx, dist = self.search(x, k, exclude)
+        thr = self.threshold_min[idx, b, p]
+        wall = self.forward_wall[idx, b, p]
+        w = 1.0 / (dist + 1e-6)
+
+        has_thr = thr > 0
+        if has_thr.any():
+            rung = np.average(np.log2(thr[has_thr]), weights=w[has_thr])
+            threshold = THRESHOLD_RUNGS[min(int(math.ceil(rung - 1e-9)), len(THRESHOLD_RUNGS) - 1)]
+        else:
+            threshold = THRESHOLD_RUNGS[-1]
+
+        has_wall = ~np.isnan(wall)
+        runtime = float(10 ** np.average(np.log10(wall[has_wall]), weights=w[has_wall])) if has_wall.any() else None
+        return threshold, runtime
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest measured circuits for a featurized circuit")
+    parser.add_argument("--build", action="store_true", help="Build the index instead of querying it")
+    parser.add_argument("--public_json", type=str, default="../data/hackathon_public.json")
+    parser.add_argument("--features", type=str, default="../qasm_features_scaled.csv")
+    parser.add_argument("--embeddings", type=str, default="../generated_embeddings.csv")
+    parser.add_argument("--index", type=str, default=INDEX_PATH)
+    parser.add_argument("--circuit", type=str, help="Circuit name to look up in --features/--embeddings")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default="CPU")
+    parser.add_argument("--precision", type=str, choices=PRECISIONS, default="single")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.build:
+        path = build_index(args.public_json, args.features, args.embeddings, args.index)
+        print(f"Index written to {path}")
+        return
+
+    index = NeighborIndex(args.index)
+    if not args.circuit:
+        parser.error("--circuit is required unless --build is given")
+    table = load_feature_table(args.features, args.embeddings)
+    if args.circuit not in table.index:
+        parser.error(f"circuit {args.circuit!r} not found in {args.features} / {args.embeddings}")
+    x = index.vector(table.loc[args.circuit])
+
+    for n in index.query(x, args.backend, args.precision, k=args.k, exclude=args.circuit):
+        print(f"{n['circuit']}: distance={n['distance']:.4f} threshold_min={n['threshold_min']} "
+              f"forward_wall_s={n['forward_wall_s']}")
+        for s in n['sweep']:
+            print(f"    thr={s['threshold']:>3}  fidelity={s['fidelity']:.4f}  run_wall_s={s['run_wall_s']}")
+    threshold, runtime = index.predict(x, args.backend, args.precision, k=args.k, exclude=args.circuit)
+    print(f"Neighbour estimate: threshold={threshold} predicted_forward_wall_s={runtime}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@ import argparse
 import subprocess
 import os
 import sys
+import tracing
+import clifford_fast_path
+import workspace
 
 def main():
     parser = argparse.ArgumentParser(description="Quantum Fidelity Prediction Pipeline Wrapper")
@@ -9,8 +12,37 @@ def main():
     parser.add_argument("--circuit", type=str, required=True, help="Directory containing QASM files")
     parser.add_argument("--precision", type=str, choices=["single", "double"], required=True, help="Numerical precision")
     parser.add_argument("--backend", type=str, choices=["GPU", "CPU"], required=True, help="Execution backend")
+    parser.add_argument("--flat_models", action="store_true", help="Predict with the memory-mapped flat tree arrays")
 
+    parser.add_argument("--output", type=str, default=None,
+                        help="Result JSON path (default: fidelity_prediction_<circuit>.json in the current directory)")
+    parser.add_argument("--keep_workspace", action="store_true",
+                        help="Keep this run's intermediate files instead of deleting them")
+    parser.add_argument("--fast_path", action="store_true",
+                        help="Answer Clifford-only circuits from clifford_rules.json (experimental, not validated held-out)")
+
+    tracing.add_argument(parser)
     args = parser.parse_args()
+    # Exports QR_TRACE so every stage below writes to the same sink
+    tracing.configure(args.trace)
+    circuit_name = os.path.basename(args.circuit)
+    result_name = f"fidelity_prediction_{circuit_name}.json"
+    output = args.output or result_name
+
+    # Clifford-only circuits are answered from the rule table, without features, embeddings or XGBoost
+    if args.fast_path and os.path.exists(clifford_fast_path.RULES_PATH):
+        with tracing.span("clifford_check"):
+            fast = clifford_fast_path.fast_path_predict(os.path.join("circuits", args.circuit), args.backend,
+                                                        args.precision, clifford_fast_path.load_rules())
+        if fast is not None:
+            tracing.count("clifford_fast_path")
+            print(f"Circuit: {args.circuit}, Clifford fast path, Threshold: {fast[0]}")
+            # Same keys as fidelity_prediction.py; predicted_fidelity is the rule's lowest measured fidelity
+            # at that threshold (null only for a rule fitted without one)
+            workspace.write_json(output, {"circuit": circuit_name, "threshold": fast[0], "predicted_fidelity": fast[2],
+                                          "fast_path": "clifford"})
+            print("--- Pipeline Execution Complete ---")
+            return
 
     # 2. Define the scripts you want to run in sequence
     # Replace these filenames with your actual processing scripts
@@ -20,34 +52,45 @@ def main():
         "runtime_prediction.py"  # Final prediction script
     ]
 
-    try:
-        command = [
-            sys.executable, "qasm_parsing.py",
-            "--circuit_dir", args.circuit]
-        result = subprocess.run(command, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred while running qasm_parsing.py: {e}")
-        sys.exit(1)
+    # Intermediate files go to a private directory (QR_WORKSPACE), so several
+    # predictions can run from the same directory at once
+    with workspace.run_workspace(args.keep_workspace):
+        try:
+            command = [
+                sys.executable, "qasm_parsing.py",
+                "--circuit_dir", args.circuit]
+            with tracing.span("qasm_parsing"):
+                result = subprocess.run(command, check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Error occurred while running qasm_parsing.py: {e}")
+            sys.exit(1)
     
-    try:
-        command = [
-            sys.executable, "gen_embeddings.py",
-            "--circuit_dir", args.circuit]
-        result = subprocess.run(command, check=True) 
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred while running gen_embeddings.py: {e}")
-        sys.exit(1)
-    try:
-        command = [
-            sys.executable, "fidelity_prediction.py",
-            "--circuit_dir", args.circuit,
-            "--precision", args.precision,
-            "--backend", args.backend,
-        ]   
-        result = subprocess.run(command, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred while running fidelity_prediction.py: {e}")
-        sys.exit(1)
+        try:
+            command = [
+                sys.executable, "gen_embeddings.py",
+                "--circuit_dir", args.circuit]
+            with tracing.span("gen_embeddings"):
+                result = subprocess.run(command, check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Error occurred while running gen_embeddings.py: {e}")
+            sys.exit(1)
+        try:
+            command = [
+                sys.executable, "fidelity_prediction.py",
+                "--circuit_dir", args.circuit,
+                "--precision", args.precision,
+                "--backend", args.backend,
+            ]   
+            if args.flat_models:
+                command.append("--flat_models")
+            with tracing.span("fidelity_prediction"):
+                result = subprocess.run(command, check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Error occurred while running fidelity_prediction.py: {e}")
+            sys.exit(1)
+
+        if os.path.exists(workspace.path(result_name)):
+            workspace.publish(result_name, output)
 
     print("--- Pipeline Execution Complete ---")
 
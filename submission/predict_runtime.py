@@ -2,6 +2,9 @@ import argparse
 import subprocess
 import os
 import sys
+import tracing
+import clifford_fast_path
+import workspace
 
 def main():
     parser = argparse.ArgumentParser(description="Quantum Runtime Prediction Pipeline Wrapper")
@@ -10,8 +13,46 @@ def main():
     parser.add_argument("--precision", type=str, choices=["single", "double"], required=True, help="Numerical precision")
     parser.add_argument("--backend", type=str, choices=["GPU", "CPU"], required=True, help="Execution backend")
     parser.add_argument("--threshold", type=str, choices=["1", "2", "4", "8", "16", "32", "64", "128", "256"], required=True, help="Threshold value")
+    parser.add_argument("--shots", type=int, default=None, help="Shot count (default: 10,000-shot total model)")
+    parser.add_argument("--deadline", type=float, default=None, help="With --shots: also report the most shots that fit in this many seconds")
+    parser.add_argument("--mps_features", action="store_true", help="Use the 10k-shot runtime model with MPS cost features (not with --shots)")
+    parser.add_argument("--flat_models", action="store_true", help="Predict with the memory-mapped flat tree arrays")
 
+    parser.add_argument("--output", type=str, default=None,
+                        help="Result JSON path (default: runtime_prediction_<circuit>.json in the current directory)")
+    parser.add_argument("--keep_workspace", action="store_true",
+                        help="Keep this run's intermediate files instead of deleting them")
+    parser.add_argument("--fast_path", action="store_true",
+                        help="Answer Clifford-only circuits from clifford_rules.json (experimental, not validated held-out)")
+
+    tracing.add_argument(parser)
     args = parser.parse_args()
+    if args.deadline is not None and args.shots is None:
+        parser.error("--deadline requires --shots")
+    if args.mps_features and args.shots is not None:
+        parser.error("--mps_features only applies to the 10k-shot model; the --shots models have no MPS columns")
+    # Exports QR_TRACE so every stage below writes to the same sink
+    tracing.configure(args.trace)
+    circuit_name = os.path.basename(args.circuit)
+    result_name = f"runtime_prediction_{circuit_name}.json"
+    output = args.output or result_name
+
+    # Clifford-only circuits are answered from the rule table, without features, embeddings or XGBoost
+    # (10k-shot total only: the fast path has no setup/per-shot split or MPS features). The rule runtime
+    # was measured at the rule's threshold, so any other --threshold goes through the full pipeline.
+    if (args.fast_path and args.shots is None and not args.mps_features
+            and os.path.exists(clifford_fast_path.RULES_PATH)):
+        with tracing.span("clifford_check"):
+            fast = clifford_fast_path.fast_path_predict(os.path.join("circuits", args.circuit), args.backend,
+                                                        args.precision, clifford_fast_path.load_rules())
+        if fast is not None and fast[0] == int(args.threshold):
+            tracing.count("clifford_fast_path")
+            print(f"Circuit: {args.circuit}, Clifford fast path, Predicted Runtime: {fast[1]:.6f} seconds")
+            # Same keys as runtime_prediction.py, which reports the circuit as given (not its basename)
+            workspace.write_json(output, {"circuit": args.circuit, "predicted_runtime": float(fast[1]),
+                                          "fast_path": "clifford"})
+            print("--- Pipeline Execution Complete ---")
+            return
 
     # 2. Define the scripts you want to run in sequence
     # Replace these filenames with your actual processing scripts
@@ -21,36 +62,55 @@ def main():
         "runtime_prediction.py"  # Final prediction script
     ]
 
-    try:
-        command = [
-            sys.executable, "qasm_parsing.py",
-            "--circuit_dir", args.circuit]
-        result = subprocess.run(command, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred while running qasm_parsing.py: {e}")
-        sys.exit(1)
+    # Intermediate files go to a private directory (QR_WORKSPACE), so several
+    # predictions can run from the same directory at once
+    with workspace.run_workspace(args.keep_workspace):
+        try:
+            command = [
+                sys.executable, "qasm_parsing.py",
+                "--circuit_dir", args.circuit]
+            if args.mps_features:
+                command.append("--mps_features")
+            with tracing.span("qasm_parsing"):
+                result = subprocess.run(command, check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Error occurred while running qasm_parsing.py: {e}")
+            sys.exit(1)
     
-    try:
-        command = [
-            sys.executable, "gen_embeddings.py",
-            "--circuit_dir", args.circuit]
-        result = subprocess.run(command, check=True) 
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred while running gen_embeddings.py: {e}")
-        sys.exit(1)
-
-    try:
-        command = [
-            sys.executable, "runtime_prediction.py",
-            "--circuit_dir", args.circuit,
-            "--precision", args.precision,
-            "--backend", args.backend,
-            "--threshold", args.threshold
-        ]   
-        result = subprocess.run(command, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred while running fidelity_prediction.py: {e}")
-        sys.exit(1)
+        try:
+            command = [
+                sys.executable, "gen_embeddings.py",
+                "--circuit_dir", args.circuit]
+            with tracing.span("gen_embeddings"):
+                result = subprocess.run(command, check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Error occurred while running gen_embeddings.py: {e}")
+            sys.exit(1)
+
+        try:
+            command = [
+                sys.executable, "runtime_prediction.py",
+                "--circuit_dir", args.circuit,
+                "--precision", args.precision,
+                "--backend", args.backend,
+                "--threshold", args.threshold
+            ]   
+            if args.shots is not None:
+                command += ["--shots", str(args.shots)]
+                if args.deadline is not None:
+                    command += ["--deadline", str(args.deadline)]
+            if args.mps_features:
+                command.append("--mps_features")
+            if args.flat_models:
+                command.append("--flat_models")
+            with tracing.span("runtime_prediction"):
+                result = subprocess.run(command, check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"Error occurred while running fidelity_prediction.py: {e}")
+            sys.exit(1)
+
+        if os.path.exists(workspace.path(result_name)):
+            workspace.publish(result_name, output)
 
     print("--- Pipeline Execution Complete ---")
 
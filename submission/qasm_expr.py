@@ -0,0 +1,70 @@
+"""
+qasm_expr.py
+
+Evaluation of OpenQASM 2 gate-parameter expressions.
+
+Parameter text comes straight from QASM files, so it is never passed to
+eval(). It is parsed with ast and only arithmetic is evaluated: numbers,
+pi, names bound by the caller (a gate definition's formal parameters),
++ - * / and ** (QASM's ^), unary minus and plus, and the OpenQASM 2
+functions sin, cos, tan, exp, ln and sqrt with one argument. Anything else
+raises ValueError, as do division by zero, overflow and domain errors.
+"""
+
+import ast
+import math
+import operator
+
+CONSTANTS = {'pi': math.pi}
+FUNCTIONS = {'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
+             'exp': math.exp, 'ln': math.log, 'sqrt': math.sqrt}
+
+_binary = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+           ast.Div: operator.truediv, ast.Pow: operator.pow}
+_unary = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+
+
+def split_args(text):
+    """Split a parameter list on top-level commas."""
+    args, depth, current = [], 0, []
+    for ch in text:
+        if ch == ',' and depth == 0:
+            args.append(''.join(current))
+            current = []
+            continue
+        depth += (ch == '(') - (ch == ')')
+        current.append(ch)
+    if current:
+        args.append(''.join(current))
+    return [a.strip() for a in args if a.strip()]
+
+
+def _eval(node, scope):
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        # Floats throughout, so 10**10**10 overflows instead of building a huge int.
+        return float(node.value)
+    if isinstance(node, ast.Name):
+        if node.id in scope:
+            return float(scope[node.id])
+        if node.id in CONSTANTS:
+            return CONSTANTS[node.id]
+    elif isinstance(node, ast.BinOp) and type(node.op) in _binary:
+        return _binary[type(node.op)](_eval(node.left, scope), _eval(node.right, scope))
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in _unary:
+        return _unary[type(node.op)](_eval(node.operand, scope))
+    elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS
+          and len(node.args) == 1 and not node.keywords):
+        return FUNCTIONS[node.func.id](_eval(node.args[0], scope))
+    raise ValueError(f"unsupported parameter expression: {ast.dump(node)}")
+
+
+def eval_expr(text, scope=None):
+    """Float value of one parameter expression; scope maps extra names to values."""
+    try:
+        tree = ast.parse(text.replace('^', '**').strip(), mode='eval')
+        value = _eval(tree.body, scope or {})
+    except (SyntaxError, TypeError, ZeroDivisionError, OverflowError, RecursionError) as e:
+        raise ValueError(f"cannot evaluate parameter expression {text!r}: {e}") from e
+    if isinstance(value, complex):
+        raise ValueError(f"complex value for parameter expression {text!r}")
+    return float(value)
@@ -1,15 +1,20 @@
 import argparse
+import multiprocessing
 import os
 import qiskit.qasm2 as qasm
 from pathlib import Path
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler, StandardScaler
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import math
 from qiskit.circuit import Barrier
 
 import re
+import mps_cost
+import tracing
+import workspace
 
 qelib1_pattern = r'(include\s+"qelib1\.inc";)'
 
@@ -111,15 +116,6 @@ def standardize_qasm_gates(qasm_content):
 
     return qasm_content
 
-def process_qasm_file(path):
-    with open(path, 'r') as f:
-        raw_qasm = f.read()
-    
-    clean_qasm = standardize_qasm_gates(raw_qasm)
-    
-    with open(path, 'w') as f:
-        f.write(clean_qasm)
-
 # Extract features from each quantum circuit
 eps = 1e-10
 
@@ -246,32 +242,240 @@ def calc_domain_size(qc):
     avg_set_size /= qc.num_qubits
     return avg_set_size
 
-def extract_features(qc):
+def calc_cut_profile(qc, qc_data):
+    """
+    One pass over the gate list that tracks, per wire, the layer the wire is
+    at. That gives the circuit depth (same value as qc.depth()) and the layer
+    of every multi-qubit gate. The cut-width profile over the linear qubit
+    order is then built with NumPy from the recorded (layer, lo, hi) spans;
+    cut c sits between qubits c and c+1.
+    """
     num_qubits = qc.num_qubits
-    depth = qc.depth()
+    wire_index = {qb: i for i, qb in enumerate(qc.qubits)}
+    wire_index.update({cb: num_qubits + i for i, cb in enumerate(qc.clbits)})
+
+    gate_wires = (
+        ([wire_index[b] for b in instr.qubits], [wire_index[b] for b in instr.clbits])
+        for instr in qc_data
+    )
+    return cut_profile_from_wires(num_qubits, num_qubits + qc.num_clbits, gate_wires)
+
+def cut_profile_from_wires(num_qubits, num_wires, gate_wires):
+    """calc_cut_profile() on (qubit wires, clbit wires) index pairs; clbit wires are offset by num_qubits."""
+    # Plain lists: scalar reads/writes per gate are much cheaper than on ndarrays.
+    frontier = [0] * num_wires
+    layers, los, his = [], [], []
+
+    for qb, cb in gate_wires:
+        wires = qb + cb if cb else qb
+        if not wires:
+            continue
+
+        layer = max(frontier[w] for w in wires) + 1
+        for w in wires:
+            frontier[w] = layer
+
+        if len(qb) > 1:
+            layers.append(layer)
+            los.append(min(qb))
+            his.append(max(qb))
+
+    depth = max(frontier, default=0)
+    num_cuts = max(num_qubits - 1, 0)
+
+    layers = np.asarray(layers, dtype=np.int64)
+    los = np.asarray(los, dtype=np.int64)
+    his = np.asarray(his, dtype=np.int64)
+
+    # Total gates crossing each cut: difference array over [lo, hi).
+    diff = np.zeros(num_cuts + 1, dtype=np.int64)
+    np.add.at(diff, los, 1)
+    np.add.at(diff, his, -1)
+    cut_widths = np.cumsum(diff)[:num_cuts]
+
+    # Gates crossing one cut within the same layer. Every layer's +1/-1 events
+    # sum to zero, so one running sum over events sorted by (layer, position,
+    # closing first) restarts at each layer boundary by itself.
+    ev_layer = np.concatenate([layers, layers])
+    ev_pos = np.concatenate([los, his])
+    ev_delta = np.concatenate([np.ones_like(los), -np.ones_like(his)])
+    order = np.lexsort((ev_delta, ev_pos, ev_layer))
+    running = np.cumsum(ev_delta[order])
+    layer_cut_widths = np.zeros(depth + 1, dtype=np.int64)
+    np.maximum.at(layer_cut_widths, ev_layer[order], running)
+    layer_cut_widths = layer_cut_widths[1:]
+
+    layer_2q_density = np.bincount(layers, minlength=depth + 1)[1:] / max(num_qubits, 1)
+
+    return {
+        'depth': depth,
+        'cut_widths': cut_widths,
+        'layer_cut_widths': layer_cut_widths,
+        'layer_2q_density': layer_2q_density,
+        'max_cut_width': int(cut_widths.max()) if num_cuts else 0,
+        'mean_cut_width': float(cut_widths.mean()) if num_cuts else 0.,
+        'max_layer_cut_width': int(layer_cut_widths.max()) if depth else 0,
+        'mean_layer_cut_width': float(layer_cut_widths.mean()) if depth else 0.,
+        'max_layer_2q_density': float(layer_2q_density.max()) if depth else 0.,
+        'layer_2q_density_std': float(layer_2q_density.std()) if depth else 0.,
+    }
 
-    qc_data = [instr for instr in qc.data if not isinstance(instr.operation, Barrier)]
+cut_feature_columns = ['max_cut_width', 'mean_cut_width', 'max_layer_cut_width', 'mean_layer_cut_width',
+                       'max_layer_2q_density', 'layer_2q_density_std']
+
+# Circuit shared with forked chunk workers; set only while a pool is running.
+_chunk_qc = None
+
+def _chunk_partials(bounds):
+    """Mergeable feature parts over qc.data[start:end] of the circuit inherited from the parent."""
+    start, end = bounds
+    qc = _chunk_qc
+    num_qb_counts = Counter()
+    runtime_weights_list = []
+    magic_weights_list = []
+    entanglement_metric = 0
+    parent = {}
+
+    def find(i):
+        while parent.get(i, i) != i:
+            i = parent[i]
+        return i
 
-    gate_counts_by_num_qb = Counter([instr.operation.num_qubits for instr in qc_data])
-    mul_qb_gate_count = sum(v for k, v in gate_counts_by_num_qb.items() if k > 1)
-    mul_qb_gate_density = mul_qb_gate_count / (num_qubits * depth)
+    for instr in qc.data[start:end]:
+        num_qubits = instr.operation.num_qubits
+        # calc_domain_size() iterates qc.data, barriers included.
+        if num_qubits > 1:
+            qb_indices = [qc.find_bit(qb).index for qb in instr.qubits]
+            root = find(qb_indices[0])
+            for idx in qb_indices[1:]:
+                other = find(idx)
+                if other != root:
+                    parent[other] = root
+        if isinstance(instr.operation, Barrier):
+            continue
+
+        num_qb_counts[num_qubits] += 1
+        runtime_weights_list.append(calc_runtime_weight(instr))
+        magic_weights_list.append(calc_magic_weight(instr))
+        if num_qubits > 1:
+            entanglement_metric += max(qb_indices) - min(qb_indices)
+
+    domains = {}
+    for q in parent:
+        domains.setdefault(find(q), []).append(q)
+    return num_qb_counts, runtime_weights_list, magic_weights_list, entanglement_metric, list(domains.values())
+
+def _merge_domain_sizes(num_qubits, partial_domains):
+    """calc_domain_size() from the per-chunk domains: union them, then average the set sizes."""
+    parent = list(range(num_qubits))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for domains in partial_domains:
+        for domain in domains:
+            root = find(domain[0])
+            for q in domain[1:]:
+                other = find(q)
+                if other != root:
+                    parent[other] = root
+
+    sizes = Counter(find(i) for i in range(num_qubits))
+    avg_set_size = 0
+    for size in sizes.values():
+        avg_set_size += size
+    avg_set_size /= num_qubits
+    return avg_set_size
 
+def _extract_features_chunked(qc, qc_data, workers, chunk_size):
+    """
+    Gate weights, entanglement metric and domains computed by a forked pool
+    over chunks of qc.data, while this process runs the (sequential) cut
+    profile sweep. The weight lists are summed here in gate order, so the
+    float totals are bit-identical to the serial loop.
+    """
+    global _chunk_qc
+    n = len(qc.data)
+    bounds = [(i, min(i + chunk_size, n)) for i in range(0, n, chunk_size)]
+    _chunk_qc = qc
+    try:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            futures = [pool.submit(_chunk_partials, b) for b in bounds]
+            with tracing.span("cut_profile"):
+                cut_profile = calc_cut_profile(qc, qc_data)
+            partials = [f.result() for f in futures]
+    finally:
+        _chunk_qc = None
+    tracing.count("feature_chunks", len(bounds))
+
+    gate_counts_by_num_qb = Counter()
     runtime_weight_sum = 0
     magic_weight_sum = 0
-    for instr in qc_data:
-        runtime_weight_sum += calc_runtime_weight(instr)
-        magic_weight_sum += calc_magic_weight(instr)
-    
-    weighted_gate_count = runtime_weight_sum
-    magic_metric = magic_weight_sum
-
     entanglement_metric = 0
+    for counts, runtime_ws, magic_ws, ent, _ in partials:
+        gate_counts_by_num_qb.update(counts)
+        for w in runtime_ws:
+            runtime_weight_sum += w
+        for w in magic_ws:
+            magic_weight_sum += w
+        entanglement_metric += ent
+    entanglement_domain_size = _merge_domain_sizes(qc.num_qubits, [p[4] for p in partials])
+
+    return (cut_profile, gate_counts_by_num_qb, runtime_weight_sum, magic_weight_sum,
+            entanglement_metric, entanglement_domain_size)
+
+def extract_features(qc, workers=None, chunk_size=20000):
+    """
+    Features of one circuit. With workers > 1, circuits of more than
+    chunk_size instructions are split into chunks processed by a worker pool
+    (fork start method only); the result is identical to the serial path.
+    """
+    num_qubits = qc.num_qubits
 
-    for instr in qc_data:
-        if instr.operation.num_qubits > 1:
-            entanglement_metric += calc_entropy_contribution(qc, instr)
-
-    entanglement_domain_size = calc_domain_size(qc)
+    qc_data = [instr for instr in qc.data if not isinstance(instr.operation, Barrier)]
+    tracing.count("gates_processed", len(qc_data))
+    tracing.count("qubits", num_qubits)
+
+    chunked = (workers is not None and workers > 1 and len(qc.data) > chunk_size
+               and 'fork' in multiprocessing.get_all_start_methods())
+    if chunked:
+        (cut_profile, gate_counts_by_num_qb, weighted_gate_count, magic_metric,
+         entanglement_metric, entanglement_domain_size) = _extract_features_chunked(qc, qc_data, workers, chunk_size)
+        depth = cut_profile['depth']
+        mul_qb_gate_count = sum(v for k, v in gate_counts_by_num_qb.items() if k > 1)
+        mul_qb_gate_density = mul_qb_gate_count / (num_qubits * depth)
+    else:
+        # Replaces qc.depth(): the same sweep also yields the cut-width profile.
+        with tracing.span("cut_profile"):
+            cut_profile = calc_cut_profile(qc, qc_data)
+        depth = cut_profile['depth']
+
+        gate_counts_by_num_qb = Counter([instr.operation.num_qubits for instr in qc_data])
+        mul_qb_gate_count = sum(v for k, v in gate_counts_by_num_qb.items() if k > 1)
+        mul_qb_gate_density = mul_qb_gate_count / (num_qubits * depth)
+
+        runtime_weight_sum = 0
+        magic_weight_sum = 0
+        with tracing.span("gate_weights"):
+            for instr in qc_data:
+                runtime_weight_sum += calc_runtime_weight(instr)
+                magic_weight_sum += calc_magic_weight(instr)
+
+        weighted_gate_count = runtime_weight_sum
+        magic_metric = magic_weight_sum
+
+        entanglement_metric = 0
+
+        with tracing.span("entanglement_metric"):
+            for instr in qc_data:
+                if instr.operation.num_qubits > 1:
+                    entanglement_metric += calc_entropy_contribution(qc, instr)
+
+        with tracing.span("domain_size"):
+            entanglement_domain_size = calc_domain_size(qc)
 
     qc_features = {
         'num_qubits': num_qubits,
@@ -282,42 +486,92 @@ def extract_features(qc):
         'magic_metric': magic_metric,
         'entanglement_domain_size': entanglement_domain_size
     }
+    for col in cut_feature_columns:
+        qc_features[col] = cut_profile[col]
     return qc_features
 
 
+def mps_cost_rows(name, sweep):
+    """Per-rung MPS cost estimates of one circuit, one row per (precision, threshold)."""
+    rows = []
+    for precision in mps_cost.BYTES_PER_ELEMENT:
+        for row in mps_cost.cost_features(sweep, precision):
+            rows.append({'name': name, 'precision': precision, **row})
+    return rows
+
+
 def main():
     parser = argparse.ArgumentParser(description="Quantum Fidelity Prediction Pipeline Wrapper")
     
     parser.add_argument("--circuit_dir", type=str, required=True, help="Directory containing QASM files")
+    parser.add_argument("--ir_dir", type=str, default=None,
+                        help="Compile circuits to the array IR in this directory and extract features from it")
+    parser.add_argument("--no_templates", action="store_true",
+                        help="With --ir_dir: parse and featurize every file on its own, without skeleton templates")
+    parser.add_argument("--cut_features", action="store_true",
+                        help="Also write the cut-width profile features (models trained on them only)")
+    parser.add_argument("--mps_features", action="store_true",
+                        help="Also write per-rung MPS flop/memory estimates to mps_cost_features.csv")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Split circuits with more than --chunk_size instructions across this many processes")
+    parser.add_argument("--chunk_size", type=int, default=20000)
+    tracing.add_argument(parser)
     args = parser.parse_args()
+    tracing.configure(args.trace)
 
     directory_path = Path('circuits')  # Use '.' for the current directory, or specify a path
-
-    for file_path in directory_path.iterdir():
-        if file_path.is_file():
-            file_name = str(file_path)
-            process_qasm_file(file_name)
-    print('Refactoring QASM files complete')
-
-    
-
-
-    qc_arr = []
-    qc_names = []
-
-    for file_path in directory_path.iterdir():
-        if file_path.is_file():
-            file_name = str(file_path)
-            qc_names.append(file_name[9:])
-            qc_arr.append(qasm.load(file_name))
-    print('Loading into Qiskit circuits complete')
-
-    feature_data = []
-
-    for [qc, name] in zip(qc_arr, qc_names):
-        features = extract_features(qc)
-        features['name'] = name
-        feature_data.append(features)
+    mps_rows = []
+
+    if args.ir_dir:
+        # Lower each file to the array IR once (cached by content hash) and
+        # compute the features from its columns; the QASM files are not rewritten.
+        import circuit_ir
+        import circuit_templates
+
+        # Variants sharing a gate/qubit skeleton reuse its lowering and angle-independent features.
+        templates = None if args.no_templates else circuit_templates.TemplateCache()
+        feature_data = []
+        for file_path in directory_path.iterdir():
+            if file_path.is_file():
+                name = str(file_path)[9:]
+                ir = circuit_ir.load_ir(circuit_ir.compile_qasm_file(file_path, args.ir_dir, templates=templates))
+                with tracing.span("extract_features", file=name):
+                    features = templates.features(ir) if templates else circuit_ir.ir_features(ir)
+                features['name'] = name
+                feature_data.append(features)
+                if args.mps_features:
+                    with tracing.span("mps_cost", file=name):
+                        mps_rows += mps_cost_rows(name, mps_cost.ir_mps_cost(ir))
+        if templates:
+            print(f"Skeleton templates: {templates.stats}")
+        print('IR feature extraction complete')
+    else:
+        # Standardized in memory: rewriting the shared circuits/ files in place
+        # would race with any other run reading them.
+        qc_arr = []
+        qc_names = []
+
+        for file_path in directory_path.iterdir():
+            if file_path.is_file():
+                file_name = str(file_path)
+                qc_names.append(file_name[9:])
+                with tracing.span("standardize_qasm", file=file_path.name):
+                    clean_qasm = standardize_qasm_gates(file_path.read_text())
+                with tracing.span("qasm_load", file=file_name[9:]):
+                    qc_arr.append(qasm.loads(clean_qasm))
+                tracing.count("circuits_loaded")
+        print('Standardizing and loading into Qiskit circuits complete')
+
+        feature_data = []
+
+        for [qc, name] in zip(qc_arr, qc_names):
+            with tracing.span("extract_features", file=name):
+                features = extract_features(qc, workers=args.workers, chunk_size=args.chunk_size)
+            features['name'] = name
+            feature_data.append(features)
+            if args.mps_features:
+                with tracing.span("mps_cost", file=name):
+                    mps_rows += mps_cost_rows(name, mps_cost.estimate_mps_cost(qc))
 
     df_features = pd.DataFrame(feature_data)
 
@@ -327,6 +581,9 @@ def main():
 
     min_max_columns = ['num_qubits', 'mul_qb_gate_density']
     standard_columns = ['weighted_gate_count', 'depth', 'entanglement_metric', 'magic_metric']
+    if args.cut_features:
+        min_max_columns += ['max_layer_2q_density', 'layer_2q_density_std']
+        standard_columns += ['max_cut_width', 'mean_cut_width', 'max_layer_cut_width', 'mean_layer_cut_width']
 
     # Apply log transformation to standardization columns
     df_features[standard_columns] = np.log10(df_features[standard_columns] + 1e-10)
@@ -339,8 +596,13 @@ def main():
     df_scaled[standard_columns] = standard_scalar.fit_transform(df_features[standard_columns])
     df_scaled[min_max_columns] = min_max_scaler.fit_transform(df_features[min_max_columns])
 
-    df_scaled.to_csv('qasm_features_scaled.csv', index=False)
+    workspace.write_csv(df_scaled, workspace.path('qasm_features_scaled.csv'), index=False)
     print(df_scaled.head())
+
+    if args.mps_features:
+        # Already log10 and comparable across circuits, so not rescaled.
+        workspace.write_csv(pd.DataFrame(mps_rows), workspace.path('mps_cost_features.csv'), index=False)
+        print('MPS cost features written to mps_cost_features.csv')
     print('Parsing script complete')
 
 if __name__ == "__main__":
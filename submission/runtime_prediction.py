@@ -1,14 +1,38 @@
 import argparse
-import json
 import os
 import numpy as np
 import xgboost as xgb
 import pandas as pd
+import shared_models
+import tracing
+import workspace
 
 from sklearn.metrics import mean_squared_error
 from sklearn.model_selection import KFold, train_test_split
 from xgboost import plot_importance
 
+def max_shots_within(deadline, setup, per_shot):
+    """Largest shot count whose predicted runtime fits in `deadline` seconds (0 if none does)."""
+    return max(int((deadline - setup) // per_shot), 0)
+
+def load_regressor(path, flat=False):
+    """XGBRegressor for a JSON model, or its memory-mapped FlatForest (shared_models.py) with flat=True."""
+    if flat:
+        return shared_models.load_forest(path)
+    model = xgb.XGBRegressor()
+    model.load_model(path)
+    return model
+
+def predict_shot_terms(X, flat=False):
+    """Predicted (setup seconds, seconds per shot) arrays from the split timing models."""
+    with tracing.span("xgb_load"):
+        setup_model = load_regressor("xgb_setup_model.json", flat)
+        per_shot_model = load_regressor("xgb_per_shot_model.json", flat)
+    with tracing.span("xgb_predict"):
+        setup = 10**setup_model.predict(X)
+        per_shot = 10**per_shot_model.predict(X)
+    return setup, per_shot
+
 def main():
     parser = argparse.ArgumentParser(description="Predict Runtime")
 
@@ -16,7 +40,22 @@ def main():
     parser.add_argument("--precision", type=str, choices=["single", "double"], required=True, help="Numerical precision")
     parser.add_argument("--backend", type=str, choices=["GPU", "CPU"], required=True, help="Execution backend")
     parser.add_argument("--threshold", type=float, required=True, help="Threshold value for fidelity")
+    parser.add_argument("--shots", type=int, default=None,
+                        help="Shot count; predicts setup and per-shot cost separately instead of the 10k-shot total")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="With --shots: also report the most shots that fit in this many seconds")
+    parser.add_argument("--mps_features", action="store_true",
+                        help="10k-shot model only: add the MPS flop/memory estimates "
+                             "(qasm_parsing.py --mps_features) and use the model trained on them")
+    parser.add_argument("--flat_models", action="store_true",
+                        help="Predict with the memory-mapped flat tree arrays (shared_models.py) instead of xgboost")
+    tracing.add_argument(parser)
     args = parser.parse_args()
+    if args.deadline is not None and args.shots is None:
+        parser.error("--deadline requires --shots")
+    if args.mps_features and args.shots is not None:
+        parser.error("--mps_features only applies to the 10k-shot model; the --shots models have no MPS columns")
+    tracing.configure(args.trace)
     print("Starting runtime prediction...")
 
     mapping = {
@@ -30,19 +69,20 @@ def main():
         "normalized_threshold": (1/8) * np.log2(args.threshold)
     }])
 
-    qasm = pd.read_csv("qasm_features_scaled.csv")
-    filtered_row = qasm[qasm['name'] == args.circuit_dir]
-    print(filtered_row)
-    embeddings = pd.read_csv("generated_embeddings.csv")
-    if 'Unnamed: 0' in embeddings.columns:
-        embeddings = embeddings.drop(columns=['Unnamed: 0'])
-    inputs = pd.merge(
-        filtered_row, 
-        embeddings, 
-        left_on=filtered_row.columns[0], 
-        right_on=embeddings.columns[0], 
-        how='left'
-    ).drop(columns=[embeddings.columns[0]])
+    with tracing.span("load_inputs"):
+        qasm = pd.read_csv(workspace.path("qasm_features_scaled.csv"))
+        filtered_row = qasm[qasm['name'] == args.circuit_dir]
+        print(filtered_row)
+        embeddings = pd.read_csv(workspace.path("generated_embeddings.csv"))
+        if 'Unnamed: 0' in embeddings.columns:
+            embeddings = embeddings.drop(columns=['Unnamed: 0'])
+        inputs = pd.merge(
+            filtered_row, 
+            embeddings, 
+            left_on=filtered_row.columns[0], 
+            right_on=embeddings.columns[0], 
+            how='left'
+        ).drop(columns=[embeddings.columns[0]])
 
     for col in params_df.columns:
         inputs[col] = params_df[col].iloc[0]
@@ -50,20 +90,51 @@ def main():
     cols = list(inputs.columns)
     inputs = inputs[cols[-3:] + cols[:-3]]
 
+    if args.mps_features:
+        mps = pd.read_csv(workspace.path("mps_cost_features.csv"))
+        mps_row = mps[(mps['name'] == args.circuit_dir) & (mps['precision'] == args.precision)
+                      & (mps['threshold'] == args.threshold)]
+        for col in ['log10_mps_flops', 'log10_mps_memory_bytes']:
+            inputs[col] = mps_row[col].iloc[0]
+
 
     X = inputs.dropna()
     print(X.head())
-    loaded_model_sklearn = xgb.XGBRegressor()
-    loaded_model_sklearn.load_model("xgb_runtime_model.json")
-    preds = loaded_model_sklearn.predict(X)
     circuit_name = os.path.basename(args.circuit_dir)
 
+    if args.shots is not None:
+        setup, per_shot = predict_shot_terms(X, args.flat_models)
+        for s, ps in zip(setup, per_shot):
+            circuit = args.circuit_dir
+            runtime = s + args.shots * ps
+            print(f"Circuit: {circuit}, Setup: {s:.6f} s, Per shot: {ps:.6g} s, "
+                  f"Predicted Runtime ({args.shots} shots): {runtime:.6f} seconds")
+            result = {
+                "circuit": circuit,
+                "predicted_runtime": float(runtime),
+                "shots": args.shots,
+                "predicted_setup_s": float(s),
+                "predicted_per_shot_s": float(ps),
+            }
+            if args.deadline is not None:
+                result["max_shots_within_deadline"] = max_shots_within(args.deadline, s, ps)
+                print(f"Max shots within {args.deadline} s: {result['max_shots_within_deadline']}")
+            workspace.write_json(workspace.path(f"runtime_prediction_{circuit_name}.json"), result)
+        return
+
+    with tracing.span("xgb_load"):
+        loaded_model_sklearn = load_regressor(
+            "xgb_runtime_mps_model.json" if args.mps_features else "xgb_runtime_model.json", args.flat_models)
+    with tracing.span("xgb_predict"):
+        preds = loaded_model_sklearn.predict(X)
+
 
     for pred in enumerate(preds):
         circuit = args.circuit_dir
         runtime = 10**pred[1]
         print(f"Circuit: {circuit}, Predicted Runtime: {runtime:.6f} seconds")
-        json.dump({"circuit": circuit, "predicted_runtime": float(runtime)}, open(f"runtime_prediction_{circuit_name}.json", "w"))
+        workspace.write_json(workspace.path(f"runtime_prediction_{circuit_name}.json"),
+                             {"circuit": circuit, "predicted_runtime": float(runtime)})
 
         
 
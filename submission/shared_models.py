@@ -0,0 +1,340 @@
+"""
+shared_models.py
+
+Read-only model storage that worker processes can share.
+
+A pool of N prediction workers normally loads N copies of the Doc2Vec
+model and the XGBoost boosters, so resident memory grows with the worker
+count. This module keeps both models in plain .npy files that every worker
+opens with mmap. The pages come from the page cache and are mapped
+read-only, so all workers share one physical copy, whether they are forked
+or started fresh.
+
+Doc2Vec: export_doc2vec() re-saves a model with every array in its own .npy
+file (gensim's sep_limit=0). load_doc2vec() opens it with mmap='r'.
+infer_vector() only writes to its own new document vector, so it works on
+the read-only arrays and returns the same vectors.
+
+XGBoost: flatten_booster() turns the trees of a saved JSON model into a
+few node arrays, concatenated over all trees:
+    left.npy, right.npy        int32 child node index (-1 at leaves)
+    feature.npy, threshold.npy split feature and condition (go left when x < threshold)
+    default_left.npy           uint8, the branch missing values take
+    value.npy                  float32 leaf value (meaningful at leaves only)
+    roots.npy                  int32 root node of each tree
+    meta.json                  format, base_score, feature count, objective
+FlatForest evaluates all rows and all trees at once with NumPy, one tree
+level per step. Early-stopped models keep only the trees up to
+best_iteration, matching XGBRegressor.predict. Only reg:squarederror gbtree models are supported, which
+covers every model in this directory.
+
+Usage:
+  python shared_models.py --flatten xgb_runtime_model.json            # writes xgb_runtime_model.flat/
+  python shared_models.py --flatten xgb_runtime_model.json --check    # compare with xgboost on the inputs
+  python shared_models.py --export_doc2vec qasm_doc2vec.model         # writes qasm_doc2vec.mmap.model (+ .npy)
+  python shared_models.py --measure 4 --models xgb_runtime_model.json xgb_setup_model.json
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+FLAT_FORMAT = "flat-forest-v1"
+_ARRAYS = ("left", "right", "feature", "threshold", "default_left", "value", "roots")
+
+
+def flat_dir(model_path):
+    """Directory holding the flattened arrays of a JSON model: xgb_x.json -> xgb_x.flat/."""
+    path = Path(model_path)
+    return path.with_name(path.stem + ".flat")
+
+
+def _base_score(learner):
+    raw = learner["learner_model_param"]["base_score"]
+    # XGBoost 3 writes a bracketed list ('[3.52E-1]'), older versions a scalar string.
+    return float(str(raw).strip("[]").split(",")[0])
+
+
+def flatten_booster(model_path, out_dir=None):
+    """Write the flat arrays of a saved XGBoost JSON model; returns the output directory."""
+    with open(model_path, 'r') as f:
+        learner = json.load(f)["learner"]
+    booster = learner["gradient_booster"]
+    objective = learner["objective"]["name"]
+    if booster["name"] != "gbtree" or objective != "reg:squarederror":
+        raise ValueError(f"{model_path}: only reg:squarederror gbtree models can be flattened "
+                         f"(got {booster['name']}, {objective})")
+
+    trees = booster["model"]["trees"]
+    # Early-stopped models predict with the trees up to best_iteration, as XGBRegressor.predict does.
+    best_iteration = (learner.get("attributes") or {}).get("best_iteration")
+    if best_iteration is not None:
+        trees = trees[:booster["model"]["iteration_indptr"][int(best_iteration) + 1]]
+
+    parts = {name: [] for name in _ARRAYS}
+    offset = 0
+    for tree in trees:
+        left = np.asarray(tree["left_children"], dtype=np.int32)
+        right = np.asarray(tree["right_children"], dtype=np.int32)
+        leaf = left == -1
+        parts["left"].append(np.where(leaf, -1, left + offset).astype(np.int32))
+        parts["right"].append(np.where(leaf, -1, right + offset).astype(np.int32))
+        parts["feature"].append(np.asarray(tree["split_indices"], dtype=np.int32))
+        # At leaves split_conditions holds the leaf value (scaled by the learning rate).
+        conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+        parts["threshold"].append(conditions)
+        parts["default_left"].append(np.asarray(tree["default_left"], dtype=np.uint8))
+        parts["value"].append(np.where(leaf, conditions, 0).astype(np.float32))
+        parts["roots"].append(np.array([offset], dtype=np.int32))
+        offset += len(left)
+
+    out_dir = Path(out_dir) if out_dir else flat_dir(model_path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Each file is written under a per-process name and renamed into place, as
+    # circuit_ir.save_ir does: workers that already mmap the old arrays keep
+    # their inode, and concurrent flattens never expose a partial file.
+    tmp_suffix = f".{os.getpid()}.tmp"
+    for name in _ARRAYS:
+        tmp = out_dir / f"{name}.npy{tmp_suffix}"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(np.concatenate(parts[name])))
+        os.replace(tmp, out_dir / f"{name}.npy")
+    meta = {
+        "format": FLAT_FORMAT,
+        "source": str(model_path),
+        "base_score": _base_score(learner),
+        "num_feature": int(learner["learner_model_param"]["num_feature"]),
+        "num_trees": len(parts["roots"]),
+        "num_nodes": offset,
+        "best_iteration": None if best_iteration is None else int(best_iteration),
+        "objective": objective,
+    }
+    # meta.json goes last: a fresh meta.json marks a complete directory.
+    tmp = out_dir / f"meta.json{tmp_suffix}"
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(tmp, out_dir / "meta.json")
+    return out_dir
+
+
+class FlatForest:
+    """Memory-mapped flat tree arrays with a vectorized predict()."""
+
+    def __init__(self, path, mmap_mode='r'):
+        path = Path(path)
+        self.path = path
+        self.meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        if self.meta.get("format") != FLAT_FORMAT:
+            raise ValueError(f"{path}: unknown format {self.meta.get('format')!r}")
+        for name in _ARRAYS:
+            setattr(self, name, np.load(path / f"{name}.npy", mmap_mode=mmap_mode))
+        self.base_score = np.float32(self.meta["base_score"])
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in _ARRAYS)
+
+    def predict(self, X):
+        """Predictions for a [rows, features] array or DataFrame; NaN follows default_left."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.meta["num_feature"]:
+            raise ValueError(f"expected [rows, {self.meta['num_feature']}] inputs, got {X.shape}")
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(np.asarray(self.roots), (len(X), len(self.roots))).copy()
+        while True:
+            inner = self.left[node] != -1
+            if not inner.any():
+                break
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node] != 0, x < self.threshold[node])
+            node = np.where(inner, np.where(go_left, self.left[node], self.right[node]), node)
+        return self.value[node].sum(axis=1, dtype=np.float32) + self.base_score
+
+
+def load_forest(model_path):
+    """FlatForest for a JSON model, flattening it first if the .flat directory is missing or older."""
+    out_dir = flat_dir(model_path)
+    meta = out_dir / "meta.json"
+    if not meta.exists() or meta.stat().st_mtime < Path(model_path).stat().st_mtime:
+        flatten_booster(model_path, out_dir)
+    return FlatForest(out_dir)
+
+
+def mmap_doc2vec_path(model_path):
+    path = Path(model_path)
+    return path.with_name(path.stem + ".mmap" + path.suffix)
+
+
+def export_doc2vec(model_path, out_path=None):
+    """Re-save a Doc2Vec model with each array in its own .npy file, ready for mmap loading."""
+    from gensim.models.doc2vec import Doc2Vec
+
+    out_path = out_path or mmap_doc2vec_path(model_path)
+    Doc2Vec.load(str(model_path)).save(str(out_path), sep_limit=0)
+    return out_path
+
+
+def load_doc2vec(model_path):
+    """Doc2Vec with its arrays memory-mapped read-only (a model saved without separate arrays is read normally)."""
+    from gensim.models.doc2vec import Doc2Vec
+
+    return Doc2Vec.load(str(model_path), mmap='r')
+
+
+def _memory_kib():
+    """Rss, Pss and private (clean + dirty) KiB of this process from /proc/self/smaps_rollup."""
+    fields = {}
+    with open("/proc/self/smaps_rollup", 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _load_models(mode, models, doc2vec):
+    """(tree models, Doc2Vec or None), each worker's own copies for "private", mmap'd files otherwise."""
+    if mode == "private":
+        import xgboost as xgb
+        from gensim.models.doc2vec import Doc2Vec
+
+        loaded = []
+        for path in models:
+            m = xgb.XGBRegressor()
+            m.load_model(path)
+            loaded.append(m)
+        return loaded, Doc2Vec.load(str(doc2vec)) if doc2vec else None
+    return [FlatForest(flat_dir(path)) for path in models], load_doc2vec(mmap_doc2vec_path(doc2vec)) if doc2vec else None
+
+
+def _measure_worker(mode, models, doc2vec, X, preloaded, barrier, conn):
+    before = _memory_kib()
+    loaded, d2v = preloaded or _load_models(mode, models, doc2vec)
+    for m in loaded:
+        m.predict(X)
+    if d2v is not None:
+        # Touch every array, as a long-lived worker eventually does.
+        float(d2v.wv.vectors.sum() + d2v.dv.vectors.sum() + d2v.syn1neg.sum())
+        d2v.infer_vector(["h", "cx", "measure"], epochs=5)
+    # Sample once every worker has its models mapped, so Pss splits shared pages across all of them.
+    barrier.wait()
+    after = _memory_kib()
+    conn.send({k: after[k] - before[k] for k in after})
+    conn.close()
+
+
+def measure(models, doc2vec, workers, X):
+    """
+    Average per-worker memory growth (KiB) from loading and using the models:
+      private  every worker loads its own xgboost boosters and Doc2Vec
+      mmap     every worker maps the flat forests and the mmap Doc2Vec files
+      preload  the parent maps them once before forking (the pool pattern)
+    """
+    import multiprocessing as mp
+
+    # Libraries are imported before forking, as a pool parent would, so only model memory is counted.
+    import xgboost  # noqa: F401
+    if doc2vec:
+        import gensim.models.doc2vec  # noqa: F401
+    # The shared modes read prepared files; build them outside the measured workers.
+    for path in models:
+        load_forest(path)
+    if doc2vec and not mmap_doc2vec_path(doc2vec).exists():
+        export_doc2vec(doc2vec)
+
+    ctx = mp.get_context("fork")
+    results = {}
+    for mode in ("private", "mmap", "preload"):
+        preloaded = _load_models(mode, models, doc2vec) if mode == "preload" else None
+        procs, pipes = [], []
+        barrier = ctx.Barrier(workers)
+        for _ in range(workers):
+            recv, send = ctx.Pipe(duplex=False)
+            p = ctx.Process(target=_measure_worker, args=(mode, models, doc2vec, X, preloaded, barrier, send))
+            p.start()
+            procs.append(p)
+            pipes.append(recv)
+        samples = [r.recv() for r in pipes]
+        for p in procs:
+            p.join()
+        results[mode] = {k: sum(s[k] for s in samples) / workers for k in samples[0]}
+    return results
+
+
+def _check(model_path, X):
+    import xgboost as xgb
+
+    reference = xgb.XGBRegressor()
+    reference.load_model(model_path)
+    expected = reference.predict(X)
+    got = load_forest(model_path).predict(X)
+    return float(np.max(np.abs(expected - got)))
+
+
+def _sample_inputs(num_feature, rows=256, seed=0):
+    """Model inputs from qasm_features_scaled.csv + generated_embeddings.csv when available, else random."""
+    rng = np.random.default_rng(seed)
+    try:
+        import pandas as pd
+        features = pd.read_csv("qasm_features_scaled.csv")
+        embeddings = pd.read_csv("generated_embeddings.csv")
+        if 'Unnamed: 0' in embeddings.columns:
+            embeddings = embeddings.drop(columns=['Unnamed: 0'])
+        merged = pd.merge(features, embeddings, left_on='name', right_on=embeddings.columns[0], how='inner')
+        body = merged.drop(columns=['name', embeddings.columns[0]], errors='ignore').to_numpy(dtype=np.float32)
+    except (OSError, ValueError, KeyError):
+        body = np.zeros((0, num_feature - 3), dtype=np.float32)
+    if len(body) == 0 or body.shape[1] != num_feature - 3:
+        body = rng.normal(size=(rows, num_feature - 3)).astype(np.float32)
+    body = body[rng.integers(0, len(body), size=rows)]
+    head = np.column_stack([
+        rng.integers(0, 2, size=rows),                       # precision
+        rng.integers(0, 2, size=rows),                       # backend
+        np.log2(2.0 ** rng.integers(0, 9, size=rows)) / 8,  # normalized_threshold
+    ]).astype(np.float32)
+    return np.hstack([head, body])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared read-only model files for worker pools")
+    parser.add_argument("--flatten", type=str, nargs="*", default=[], help="XGBoost JSON models to flatten")
+    parser.add_argument("--check", action="store_true", help="With --flatten: compare predictions with xgboost")
+    parser.add_argument("--export_doc2vec", type=str, help="Doc2Vec model to re-save for mmap loading")
+    parser.add_argument("--measure", type=int, metavar="WORKERS",
+                        help="Measure per-worker memory with private vs shared models")
+    parser.add_argument("--models", type=str, nargs="+",
+                        default=["xgb_runtime_model.json", "xgb_setup_model.json", "xgb_per_shot_model.json"])
+    parser.add_argument("--doc2vec", type=str, default="qasm_doc2vec.model")
+    args = parser.parse_args()
+
+    for path in args.flatten:
+        forest = load_forest(path)
+        print(f"{path} -> {forest.path}: {forest.meta['num_trees']} trees, "
+              f"{forest.meta['num_nodes']} nodes, {forest.nbytes / 1024:.1f} KiB")
+        if args.check:
+            X = _sample_inputs(forest.meta["num_feature"])
+            print(f"  max |flat - xgboost| over {len(X)} rows: {_check(path, X):.3g}")
+
+    if args.export_doc2vec:
+        print(f"{args.export_doc2vec} -> {export_doc2vec(args.export_doc2vec)}")
+
+    if args.measure:
+        doc2vec = args.doc2vec if os.path.exists(args.doc2vec) else None
+        if doc2vec is None:
+            print(f"{args.doc2vec} not found; measuring the XGBoost models only")
+        num_feature = FlatForest(load_forest(args.models[0]).path).meta["num_feature"]
+        X = _sample_inputs(num_feature)
+        results = measure(args.models, doc2vec, args.measure, X)
+        print(f"Per-worker memory growth, {args.measure} workers (KiB):")
+        for mode, r in results.items():
+            print(f"  {mode:>7}: rss={r['rss']:.0f} pss={r['pss']:.0f} private={r['private']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""
+sweep_driver.py
+
+Prediction-guided threshold sweep orchestrator.
+
+The public data comes from full mirror sweeps over rungs 1..512 with
+stop_when=first_cross, where every rung is a real simulation (up to ~1900 s
+for ae_indep_qiskit_130). This driver looks for the same first crossing
+rung with far fewer runs:
+
+1. The predicted crossing rung is run first.
+2. If it crosses, the rung below is run; if not, the rung above. A correct
+   prediction is confirmed with two runs.
+3. Otherwise the driver bisects the rungs still undecided, assuming fidelity
+   does not drop as the threshold grows.
+
+Every (circuit, backend, precision) sweep is an asyncio task. A semaphore
+caps how many simulations run at once, and each run has a timeout; a run
+that times out counts as not crossing. With --adaptive_timeout the per-run
+timeout is scaled from the predicted mirror runtime of that rung.
+
+Predictions come from a submission-format JSON whose ids are
+"file|backend|precision" (e.g. evaluate_circuit_cv.py output), or from the
+neighbour index with the circuit itself left out.
+
+Offline, ReplaySimulator answers runs from the recorded threshold_sweep
+data. The report compares simulator-seconds spent with what a linear
+first_cross walk (and the full recorded sweep) would have cost. Runs above
+a recorded crossing were never simulated; their cost is extrapolated, and
+the report also gives the savings if they cost no more than the last
+recorded run (an upper bound) and the share of runs that were imputed:
+
+  python sweep_driver.py --public_json ../data/hackathon_public.json --out sweep_report.json
+
+CommandSimulator runs a real simulator through a command template that
+prints one JSON object with sdk_get_fidelity and run_wall_s:
+
+  python sweep_driver.py --sim_cmd "python run_mirror.py {circuit} {backend} {precision} {threshold}"
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import shlex
+import time
+
+import numpy as np
+
+SWEEP_RUNGS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+TIMEOUT_RETURNCODE = 124
+
+
+def crossed(point, target):
+    return point["returncode"] == 0 and point["fidelity"] is not None and point["fidelity"] >= target
+
+
+class ReplaySimulator:
+    """
+    Stand-in simulator answering mirror runs from recorded threshold sweeps.
+
+    Recorded sweeps stop at the first crossing, so rungs above it were never
+    run. Those are answered as crossed (fidelity is taken as non-decreasing in
+    the threshold) and flagged "imputed". Their cost is the highest recorded
+    run below them times the median rung-to-rung cost ratio over all recorded
+    sweeps for each step in between (never below 1); "lower_bound_s" keeps the
+    unscaled cost. Unrecorded rungs with no crossing below them count as
+    timeouts.
+    """
+
+    def __init__(self, public_json, time_scale=0.0):
+        with open(public_json, 'r') as f:
+            data = json.load(f)
+        self.time_scale = time_scale
+        self.sweeps = {}
+        for r in data["results"]:
+            key = (r["file"], r["backend"], r["precision"])
+            self.sweeps[key] = {s["threshold"]: s for s in r.get("threshold_sweep", [])}
+        self.step_ratio = self._step_ratios()
+
+    def _step_ratios(self):
+        """Median run_wall_s ratio from each rung to the next over the recorded sweeps, at least 1."""
+        def wall(s):
+            if s is None or s.get("returncode", 0) != 0 or not s.get("run_wall_s"):
+                return None
+            return s["run_wall_s"]
+
+        ratios = [[] for _ in SWEEP_RUNGS[1:]]
+        for sweep in self.sweeps.values():
+            for j, (a, b) in enumerate(zip(SWEEP_RUNGS, SWEEP_RUNGS[1:])):
+                wa, wb = wall(sweep.get(a)), wall(sweep.get(b))
+                if wa is not None and wb is not None:
+                    ratios[j].append(wb / wa)
+        pooled = [x for r in ratios for x in r]
+        fallback = max(1.0, float(np.median(pooled))) if pooled else 1.0
+        return [max(1.0, float(np.median(r))) if r else fallback for r in ratios]
+
+    def tasks(self):
+        return list(self.sweeps)
+
+    def lookup(self, task, threshold, timeout):
+        sweep = self.sweeps[task]
+        s = sweep.get(threshold)
+        if s is not None:
+            wall = s.get("run_wall_s")
+            if s.get("returncode") == TIMEOUT_RETURNCODE or wall is None or wall > timeout:
+                return {"fidelity": None, "run_wall_s": timeout, "returncode": TIMEOUT_RETURNCODE}
+            return {"fidelity": s.get("sdk_get_fidelity"), "run_wall_s": wall, "returncode": s.get("returncode", 0)}
+
+        below = [sweep[t] for t in sorted(sweep) if t < threshold]
+        hit = next((b for b in reversed(below) if b.get("returncode") == 0 and b.get("sdk_get_fidelity") is not None), None)
+        timed_out = {"fidelity": None, "run_wall_s": timeout, "returncode": TIMEOUT_RETURNCODE,
+                     "imputed": True, "lower_bound_s": timeout}
+        if hit is None or hit["run_wall_s"] > timeout:
+            return timed_out
+        steps = self.step_ratio[SWEEP_RUNGS.index(hit["threshold"]):SWEEP_RUNGS.index(threshold)]
+        wall = hit["run_wall_s"] * math.prod(steps)
+        if wall > timeout:
+            return {**timed_out, "lower_bound_s": hit["run_wall_s"]}
+        return {"fidelity": hit["sdk_get_fidelity"], "run_wall_s": wall, "returncode": 0,
+                "imputed": True, "lower_bound_s": hit["run_wall_s"]}
+
+    async def run(self, circuit, backend, precision, threshold, timeout):
+        point = self.lookup((circuit, backend, precision), threshold, timeout)
+        # A timed-out run holds its slot for the whole timeout.
+        await asyncio.sleep(point["run_wall_s"] * self.time_scale)
+        return point
+
+
+class CommandSimulator:
+    """Runs one mirror simulation per call through an external command."""
+
+    def __init__(self, template):
+        self.template = template
+
+    async def run(self, circuit, backend, precision, threshold, timeout):
+        cmd = shlex.split(self.template.format(circuit=circuit, backend=backend,
+                                               precision=precision, threshold=threshold))
+        start = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE)
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return {"fidelity": None, "run_wall_s": timeout, "returncode": TIMEOUT_RETURNCODE}
+        wall = time.perf_counter() - start
+        if proc.returncode != 0:
+            return {"fidelity": None, "run_wall_s": wall, "returncode": proc.returncode}
+        lines = stdout.decode().strip().splitlines()
+        try:
+            out = json.loads(lines[-1])
+        except (IndexError, ValueError):
+            # Exited cleanly without a result line: counted as a failed run.
+            return {"fidelity": None, "run_wall_s": wall, "returncode": 1, "error": "no JSON result on stdout"}
+        return {"fidelity": out.get("sdk_get_fidelity"), "run_wall_s": out.get("run_wall_s", wall), "returncode": 0}
+
+
+def next_probe(lo, hi, history):
+    """Rung index to run next; the first crossing is known to lie in [lo, hi]."""
+    if len(history) == 1:
+        first, was_crossed = history[0]
+        probe = first - 1 if was_crossed else first + 1
+        if lo <= probe < hi:
+            return probe
+    # Lower middle: on a tie the cheaper rung is run.
+    return (lo + hi - 1) // 2
+
+
+async def guided_sweep(sim, semaphore, task, start_idx, target, timeouts):
+    circuit, backend, precision = task
+    lo, hi = 0, len(SWEEP_RUNGS)  # hi == len(SWEEP_RUNGS): target never met
+    history = []
+    runs = []
+    probe = min(max(start_idx, lo), hi - 1)
+
+    while lo < hi:
+        threshold = SWEEP_RUNGS[probe]
+        async with semaphore:
+            point = await sim.run(circuit, backend, precision, threshold, timeouts[probe])
+        runs.append({"threshold": threshold, **point})
+
+        was_crossed = crossed(point, target)
+        history.append((probe, was_crossed))
+        if was_crossed:
+            hi = probe
+        else:
+            lo = probe + 1
+        if lo < hi:
+            probe = next_probe(lo, hi, history)
+
+    return {
+        "found_threshold": SWEEP_RUNGS[lo] if lo < len(SWEEP_RUNGS) else None,
+        "runs": runs,
+        "sim_s": sum(r["run_wall_s"] for r in runs),
+        "sim_s_lower": sum(r.get("lower_bound_s", r["run_wall_s"]) for r in runs),
+    }
+
+
+def linear_baseline(sim, task, target, timeout):
+    """first_cross walk up the rungs: (threshold found, seconds spent, seconds for the recorded sweep)."""
+    found, spent = None, 0.0
+    for threshold in SWEEP_RUNGS:
+        point = sim.lookup(task, threshold, timeout)
+        spent += point["run_wall_s"]
+        if crossed(point, target):
+            found = threshold
+            break
+
+    full = sum(timeout if s.get("returncode") == TIMEOUT_RETURNCODE or s.get("run_wall_s") is None
+               else s["run_wall_s"] for s in sim.sweeps[task].values())
+    return found, spent, full
+
+
+def load_priors(args, tasks):
+    """Predicted crossing rung index (and optional per-rung mirror runtime) per task."""
+    start = {t: len(SWEEP_RUNGS) // 2 for t in tasks}
+    walls = {}
+
+    if args.predictions:
+        with open(args.predictions, 'r') as f:
+            preds = json.load(f)
+        preds = preds["predictions"] if isinstance(preds, dict) else preds
+        by_id = {p["id"]: p["predicted_threshold_min"] for p in preds}
+        for t in tasks:
+            thr = by_id.get("|".join(t))
+            if thr in SWEEP_RUNGS:
+                start[t] = SWEEP_RUNGS.index(thr)
+
+    elif not args.no_prior:
+        from neighbor_index import NeighborIndex
+
+        index = NeighborIndex(args.index)
+        rows = {str(n): i for i, n in enumerate(index.names)}
+        for t in tasks:
+            circuit, backend, precision = t
+            if circuit not in rows:
+                continue
+            # Leave the circuit itself out, so replaying the public data is honest.
+            x = index.X[rows[circuit]]
+            thr, _ = index.predict(x, backend, precision, k=args.k, exclude=circuit)
+            start[t] = SWEEP_RUNGS.index(thr)
+            walls[t] = index.predict_mirror_wall(x, backend, precision, k=args.k, exclude=circuit)
+
+    return start, walls
+
+
+async def drive(args):
+    if args.sim_cmd:
+        sim = CommandSimulator(args.sim_cmd)
+        with open(args.public_json, 'r') as f:
+            tasks = [(r["file"], r["backend"], r["precision"]) for r in json.load(f)["results"]]
+    else:
+        sim = ReplaySimulator(args.public_json, args.time_scale)
+        tasks = sim.tasks()
+
+    start, walls = load_priors(args, tasks)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    def timeouts_for(task):
+        if args.adaptive_timeout and task in walls:
+            w = np.nan_to_num(walls[task], nan=args.timeout)
+            return [min(args.timeout, max(args.min_timeout, args.adaptive_timeout * x)) for x in w]
+        return [args.timeout] * len(SWEEP_RUNGS)
+
+    t0 = time.perf_counter()
+    # One failing sweep must not discard the others: it is reported with its error.
+    results = await asyncio.gather(*(
+        guided_sweep(sim, semaphore, t, start[t], args.target, timeouts_for(t)) for t in tasks
+    ), return_exceptions=True)
+    elapsed = time.perf_counter() - t0
+
+    rows = []
+    failed = []
+    for task, res in zip(tasks, results):
+        row = {
+            "circuit": task[0], "backend": task[1], "precision": task[2],
+            "start_threshold": SWEEP_RUNGS[start[task]],
+        }
+        if isinstance(res, BaseException):
+            failed.append({**row, "error": repr(res)})
+            continue
+        row.update({
+            "found_threshold": res["found_threshold"],
+            "rungs_run": [r["threshold"] for r in res["runs"]],
+            "guided_sim_s": res["sim_s"],
+            "guided_sim_s_lower": res["sim_s_lower"],
+            "imputed_runs": sum(bool(r.get("imputed")) for r in res["runs"]),
+            "imputed_sim_s": sum(r["run_wall_s"] for r in res["runs"] if r.get("imputed")),
+        })
+        if isinstance(sim, ReplaySimulator):
+            found, spent, full = linear_baseline(sim, task, args.target, args.timeout)
+            row.update({"linear_threshold": found, "linear_sim_s": spent, "full_sweep_sim_s": full,
+                        "matches_linear": found == res["found_threshold"]})
+        rows.append(row)
+
+    report = {
+        "tasks": len(rows),
+        "failed_tasks": len(failed),
+        "driver_wall_s": elapsed,
+        "guided_runs": sum(len(r["rungs_run"]) for r in rows),
+        "guided_sim_s": sum(r["guided_sim_s"] for r in rows),
+        "guided_sim_s_lower": sum(r["guided_sim_s_lower"] for r in rows),
+        "imputed_runs": sum(r["imputed_runs"] for r in rows),
+        "imputed_sim_s": sum(r["imputed_sim_s"] for r in rows),
+    }
+    report["imputed_run_share"] = report["imputed_runs"] / report["guided_runs"] if report["guided_runs"] else 0.0
+    report["imputed_sim_s_share"] = (report["imputed_sim_s"] / report["guided_sim_s"]
+                                     if report["guided_sim_s"] else 0.0)
+    if isinstance(sim, ReplaySimulator):
+        linear = sum(r["linear_sim_s"] for r in rows)
+        report.update({
+            "linear_runs": sum(
+                next((i + 1 for i, rung in enumerate(SWEEP_RUNGS) if rung == r["linear_threshold"]),
+                     len(SWEEP_RUNGS))
+                for r in rows
+            ),
+            "linear_sim_s": linear,
+            "full_sweep_sim_s": sum(r["full_sweep_sim_s"] for r in rows),
+            "sim_s_saved_vs_linear": linear - report["guided_sim_s"],
+            "fraction_saved_vs_linear": (linear - report["guided_sim_s"]) / linear if linear else math.nan,
+            # Upper bound: every imputed run charged only the last recorded run below it.
+            "fraction_saved_vs_linear_upper": (linear - report["guided_sim_s_lower"]) / linear if linear else math.nan,
+            "mismatches_vs_linear": sum(not r["matches_linear"] for r in rows),
+        })
+    report["results"] = rows
+    report["failed"] = failed
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prediction-guided mirror threshold sweeps")
+    parser.add_argument("--public_json", type=str, default="../data/hackathon_public.json",
+                        help="Recorded sweeps to replay (and the task list)")
+    parser.add_argument("--sim_cmd", type=str, default=None,
+                        help="Command template for a real simulator instead of the replay")
+    parser.add_argument("--predictions", type=str, default=None,
+                        help="Submission-format JSON with ids 'file|backend|precision'")
+    parser.add_argument("--index", type=str, default="neighbor_index.npz",
+                        help="Neighbour index used for predictions when --predictions is not given")
+    parser.add_argument("--no_prior", action="store_true",
+                        help="Ignore predictions and start every sweep at the middle rung")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--target", type=float, default=0.99)
+    parser.add_argument("--concurrency", type=int, default=4, help="Simulations running at once")
+    parser.add_argument("--timeout", type=float, default=3600.0, help="Per-run timeout in seconds")
+    parser.add_argument("--adaptive_timeout", type=float, default=None,
+                        help="Per-run timeout = this many times the predicted mirror runtime")
+    parser.add_argument("--min_timeout", type=float, default=60.0)
+    parser.add_argument("--time_scale", type=float, default=0.0,
+                        help="Replay: wall seconds slept per recorded simulator second")
+    parser.add_argument("--out", type=str, default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(drive(args))
+
+    print(f"Tasks: {report['tasks']}" + (f" ({report['failed_tasks']} failed)" if report['failed_tasks'] else ""))
+    print(f"Guided: {report['guided_runs']} runs, {report['guided_sim_s']:.1f} simulator-s; "
+          f"{report['imputed_runs']} runs ({100 * report['imputed_run_share']:.1f}%, "
+          f"{100 * report['imputed_sim_s_share']:.1f}% of simulator-s) imputed above a recorded crossing")
+    if "linear_sim_s" in report:
+        print(f"Linear first_cross: {report['linear_runs']} runs, {report['linear_sim_s']:.1f} simulator-s")
+        print(f"Full recorded sweep: {report['full_sweep_sim_s']:.1f} simulator-s")
+        print(f"Saved vs linear: {report['sim_s_saved_vs_linear']:.1f} simulator-s "
+              f"({100 * report['fraction_saved_vs_linear']:.1f}% with imputed runs extrapolated, "
+              f"at most {100 * report['fraction_saved_vs_linear_upper']:.1f}% if they cost no more "
+              f"than the last recorded run)")
+        print(f"Threshold differs from linear on {report['mismatches_vs_linear']} tasks")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
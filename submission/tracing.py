@@ -0,0 +1,191 @@
+"""
+tracing.py
+
+Lightweight stage timing and counters for the prediction pipeline.
+
+Tracing is off unless a sink path is given, either with --trace on one of the
+pipeline scripts or through the QR_TRACE environment variable (the wrappers
+forward it to every stage they launch). When off, span() returns a shared
+no-op context manager and count() returns immediately.
+
+Sinks:
+- *.prom  -> Prometheus text file; samples are summed with whatever the
+             earlier pipeline stages already wrote to the same file
+- anything else -> JSON lines, one record per span plus one per counter
+
+Several pipelines may share one sink: JSON lines are appended with a single
+write per process, and the Prometheus read-sum-replace is done under an
+exclusive lock on <sink>.lock.
+"""
+
+import atexit
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: concurrent .prom updates are not serialized
+    fcntl = None
+
+TRACE_ENV = "QR_TRACE"
+METRIC_PREFIX = "qr_pipeline"
+
+_NULL_SPAN = nullcontext()
+
+sink = None
+enabled = False
+_spans = []
+_counters = Counter()
+_flush_registered = False
+_script = Path(sys.argv[0]).stem if sys.argv and sys.argv[0] else "python"
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "start", "wall")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        _spans.append((self.name, self.wall, elapsed, self.attrs, exc_type is None))
+        return False
+
+
+def configure(path):
+    """Enable tracing to `path` (None or empty disables it)."""
+    global sink, enabled, _flush_registered
+    sink = str(path) if path else None
+    enabled = sink is not None
+    if enabled:
+        os.environ[TRACE_ENV] = sink
+        if not _flush_registered:
+            atexit.register(flush)
+            _flush_registered = True
+
+
+def add_argument(parser):
+    parser.add_argument(
+        "--trace", type=str, default=os.environ.get(TRACE_ENV),
+        help="Write stage timings/counters to this file (.prom for Prometheus text, otherwise JSON lines)",
+    )
+
+
+def span(name, **attrs):
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+
+def count(name, value=1):
+    if enabled:
+        _counters[name] += value
+
+
+def flush():
+    if not enabled or (not _spans and not _counters):
+        return
+    path = Path(sink)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".prom":
+        _write_prometheus(path)
+    else:
+        _write_json_lines(path)
+    _spans.clear()
+    _counters.clear()
+
+
+def _write_json_lines(path):
+    pid = os.getpid()
+    now = time.time()
+    lines = []
+    for name, wall, elapsed, attrs, ok in _spans:
+        record = {"type": "span", "script": _script, "pid": pid, "name": name,
+                  "seconds": elapsed, "ok": ok, "ts": wall}
+        if attrs:
+            record["attrs"] = attrs
+        lines.append(json.dumps(record) + "\n")
+    for name, value in sorted(_counters.items()):
+        lines.append(json.dumps({"type": "counter", "script": _script, "pid": pid,
+                                 "name": name, "value": value, "ts": now}) + "\n")
+    # One O_APPEND write, so records of concurrent runs do not interleave
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, "".join(lines).encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+_sample_re = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*(?:\{[^}]*\})?)\s+(\S+)$")
+
+
+@contextmanager
+def _locked(path):
+    if fcntl is None:
+        yield
+        return
+    with open(path.with_name(f"{path.name}.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _write_prometheus(path):
+    with _locked(path):
+        _update_prometheus(path)
+
+
+def _update_prometheus(path):
+    samples = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            m = _sample_re.match(line.strip())
+            if m:
+                samples[m.group(1)] = float(m.group(2))
+
+    def add(key, value):
+        samples[key] = samples.get(key, 0.0) + value
+
+    for name, _, elapsed, _, _ in _spans:
+        labels = f'{{script="{_script}",stage="{name}"}}'
+        add(f"{METRIC_PREFIX}_stage_seconds_sum{labels}", elapsed)
+        add(f"{METRIC_PREFIX}_stage_seconds_count{labels}", 1)
+    for name, value in _counters.items():
+        add(f'{METRIC_PREFIX}_{name}_total{{script="{_script}"}}', value)
+
+    families = {}
+    for key in sorted(samples):
+        families.setdefault(key.split("{", 1)[0], []).append(key)
+
+    lines = []
+    typed = set()
+    for family, keys in families.items():
+        if family.endswith("_total"):
+            lines.append(f"# TYPE {family} counter")
+        else:
+            base = family.rsplit("_", 1)[0]
+            if base not in typed:
+                typed.add(base)
+                lines.append(f"# TYPE {base} summary")
+        lines.extend(f"{key} {samples[key]:.9g}" for key in keys)
+
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+configure(os.environ.get(TRACE_ENV))
@@ -0,0 +1,96 @@
+"""
+workspace.py
+
+Per-run workspaces and atomic writes for the prediction pipeline.
+
+The stages pass data through files: qasm_parsing.py writes
+qasm_features_scaled.csv (and mps_cost_features.csv), gen_embeddings.py
+writes generated_embeddings.csv, and the prediction scripts read them and
+write *_prediction_<name>.json. With fixed names in the current directory,
+two predictions started at once overwrite each other's inputs.
+
+The wrappers open a private directory per run with run_workspace() and
+export it as QR_WORKSPACE, the same way tracing.py forwards QR_TRACE.
+path() resolves the intermediate file names inside it. A stage run on its
+own, without QR_WORKSPACE, keeps using the current directory.
+
+write_json(), write_csv() and publish() write a temporary file next to the
+target and rename it over the target, so a reader sees either the old file
+or the complete new one.
+"""
+
+import json
+import os
+import shutil
+import stat
+import tempfile
+from contextlib import contextmanager
+
+WORKSPACE_ENV = "QR_WORKSPACE"
+
+
+def path(name):
+    """`name` inside the current run's workspace (the current directory outside a run)."""
+    return os.path.join(os.environ.get(WORKSPACE_ENV) or ".", name)
+
+
+def _target_mode(target):
+    """Permission bits of an existing target, else 0666 minus the umask."""
+    try:
+        return stat.S_IMODE(os.stat(target).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def _atomic_write(target, write):
+    directory = os.path.dirname(os.path.abspath(target))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(target)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            write(f)
+        # mkstemp creates the file 0600; give it the mode a plain open() would have.
+        os.chmod(tmp, _target_mode(target))
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def write_json(target, obj):
+    _atomic_write(target, lambda f: json.dump(obj, f))
+
+
+def write_csv(df, target, **kwargs):
+    _atomic_write(target, lambda f: df.to_csv(f, **kwargs))
+
+
+def publish(name, target):
+    """Atomically copy a file from the workspace to `target` (no-op if they are the same file)."""
+    source = path(name)
+    if os.path.abspath(source) == os.path.abspath(target):
+        return
+    with open(source, "r", encoding="utf-8") as f:
+        content = f.read()
+    _atomic_write(target, lambda f: f.write(content))
+
+
+@contextmanager
+def run_workspace(keep=False):
+    """Create a private workspace for one run and export it to the stages; removed afterwards unless keep."""
+    previous = os.environ.get(WORKSPACE_ENV)
+    directory = tempfile.mkdtemp(prefix="qr_run_")
+    os.environ[WORKSPACE_ENV] = directory
+    try:
+        yield directory
+    finally:
+        if previous is None:
+            os.environ.pop(WORKSPACE_ENV, None)
+        else:
+            os.environ[WORKSPACE_ENV] = previous
+        if keep:
+            print(f"Workspace kept at {directory}")
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The pipeline modules import each other as top-level modules from their own directories.
+ROOT = Path(__file__).resolve().parent.parent
+for directory in ("submission", "scripts"):
+    sys.path.insert(0, str(ROOT / directory))
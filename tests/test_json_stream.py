@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import json_stream
+from json_stream import iter_json_array, iter_json_batches, json_root_kind
+
+ITEMS = [
+    {"id": "a", "value": 1.5, "tags": ["x", "y"]},
+    {"id": "b},{c", "value": -2e-10, "nested": [{"k": [1, 2]}, {"k": []}]},
+    [1, 2.25, None, True],
+    "plain ] string, with [separators]",
+    12345678901234567890,
+    {},
+]
+
+
+@pytest.fixture(params=[1, 3, 16, 1 << 20], ids=lambda n: f"chunk{n}")
+def chunk_size(request, monkeypatch):
+    monkeypatch.setattr(json_stream, "CHUNK_SIZE", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_array_under_key(tmp_path, chunk_size, indent):
+    path = tmp_path / "doc.json"
+    path.write_text(json.dumps({"before": {"items": [0]}, "items": ITEMS, "after": 1}, indent=indent))
+    assert list(iter_json_array(path, "items")) == ITEMS
+    assert [x for batch in iter_json_batches(path, "items") for x in batch] == ITEMS
+
+
+def test_top_level_array_ignores_key(tmp_path, chunk_size):
+    path = tmp_path / "doc.json"
+    path.write_text(json.dumps(ITEMS, separators=(" , ", " : ")))
+    assert list(iter_json_array(path, "anything")) == ITEMS
+
+
+def test_empty_array(tmp_path):
+    path = tmp_path / "doc.json"
+    path.write_text('{"items": [ ]}')
+    assert list(iter_json_array(path, "items")) == []
+
+
+def test_missing_key(tmp_path):
+    path = tmp_path / "doc.json"
+    path.write_text('{"other": [1]}')
+    with pytest.raises(KeyError):
+        list(iter_json_array(path, "items"))
+
+
+def test_key_not_a_list(tmp_path):
+    path = tmp_path / "doc.json"
+    path.write_text('{"items": {"a": 1}}')
+    with pytest.raises(ValueError):
+        list(iter_json_array(path, "items"))
+
+
+def test_malformed_separator(tmp_path):
+    path = tmp_path / "doc.json"
+    path.write_text('[1 2]')
+    with pytest.raises(ValueError):
+        list(iter_json_array(path))
+
+
+def test_root_kind(tmp_path):
+    for text, kind in [("[1]", "list"), (' {"a": 1}', "object"), ("3", "other")]:
+        path = tmp_path / "doc.json"
+        path.write_text(text)
+        assert json_root_kind(path) == kind
@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+import qasm_expr
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("pi", math.pi),
+    ("-pi/2", -math.pi / 2),
+    ("+3", 3.0),
+    ("2*pi - 1", 2 * math.pi - 1),
+    ("2^3", 8.0),
+    ("2**-1", 0.5),
+    ("-(1 + 2) * 4", -12.0),
+    ("sqrt(4) + ln(1) + cos(0)", 3.0),
+    ("1e-3", 1e-3),
+])
+def test_arithmetic(text, expected):
+    assert qasm_expr.eval_expr(text) == pytest.approx(expected)
+
+
+def test_scope_names():
+    assert qasm_expr.eval_expr("theta/2", {"theta": math.pi}) == pytest.approx(math.pi / 2)
+
+
+@pytest.mark.parametrize("text", [
+    '__import__("os")',
+    '__import__("os").system("true")',
+    "().__class__",
+    "pi.real",
+    "open",
+    "sin(1, 2)",
+    "sin(x=1)",
+    "[1][0]",
+    "lambda: 1",
+    "1 if 1 else 0",
+    "True",
+    "'1'",
+    "1 < 2",
+    "pi;1",
+])
+def test_rejects_anything_but_arithmetic(text):
+    with pytest.raises(ValueError):
+        qasm_expr.eval_expr(text)
+
+
+@pytest.mark.parametrize("text", ["10**10**10", "exp(1000)", "1/0", "sqrt(-1)", "(-8)**(1/3)"])
+def test_numeric_errors_raise_value_error(text):
+    with pytest.raises(ValueError):
+        qasm_expr.eval_expr(text)
+
+
+def test_split_args():
+    assert qasm_expr.split_args("pi/2, sin(a, b) ,-1") == ["pi/2", "sin(a, b)", "-1"]
+    assert qasm_expr.split_args("") == []
@@ -0,0 +1,53 @@
+import os
+import stat
+
+import pytest
+
+import workspace
+
+
+def test_run_workspace_exports_and_removes(monkeypatch):
+    monkeypatch.delenv(workspace.WORKSPACE_ENV, raising=False)
+    with workspace.run_workspace() as directory:
+        assert os.environ[workspace.WORKSPACE_ENV] == directory
+        assert workspace.path("x.csv") == os.path.join(directory, "x.csv")
+        workspace.write_json(workspace.path("x.json"), {"a": 1})
+    assert workspace.WORKSPACE_ENV not in os.environ
+    assert not os.path.exists(directory)
+
+
+def test_run_workspace_restores_previous_value(monkeypatch, tmp_path):
+    monkeypatch.setenv(workspace.WORKSPACE_ENV, str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with workspace.run_workspace() as directory:
+            raise RuntimeError
+    assert os.environ[workspace.WORKSPACE_ENV] == str(tmp_path)
+    assert not os.path.exists(directory)
+
+
+def test_run_workspace_keep(monkeypatch):
+    monkeypatch.delenv(workspace.WORKSPACE_ENV, raising=False)
+    with workspace.run_workspace(keep=True) as directory:
+        pass
+    try:
+        assert os.path.isdir(directory)
+    finally:
+        os.rmdir(directory)
+
+
+def test_path_outside_a_run(monkeypatch):
+    monkeypatch.delenv(workspace.WORKSPACE_ENV, raising=False)
+    assert workspace.path("x.csv") == os.path.join(".", "x.csv")
+
+
+def test_atomic_writes_keep_normal_modes(tmp_path):
+    target = tmp_path / "result.json"
+    workspace.write_json(target, {"a": 1})
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(target.stat().st_mode) == 0o666 & ~umask
+    target.chmod(0o640)
+    workspace.write_json(target, {"a": 2})
+    assert stat.S_IMODE(target.stat().st_mode) == 0o640
+    assert target.read_text() == '{"a": 2}'
+    assert [p.name for p in tmp_path.iterdir()] == ["result.json"]
@@ -1,4 +1,5 @@
 import os
+import time
 import gensim
 from gensim.models.doc2vec import Doc2Vec, TaggedDocument
 from gensim.utils import simple_preprocess
@@ -20,6 +21,12 @@ MODEL_PATH = "qasm_doc2vec.model"
 VECTOR_SIZE = 50             
 EPOCHS = 40                  
 
+# Near-duplicate filtering (corpus_dedup.py): files whose MinHash Jaccard
+# estimate reaches this threshold share one training document and, after
+# training, its vector. None disables it.
+DEDUP_THRESHOLD = 0.9
+DEDUP_WORKERS = os.cpu_count()
+
 def read_corpus(directories):
     """
     Reads QASM files from a LIST of directories and yields TaggedDocument objects.
@@ -64,6 +71,18 @@ def train_qasm_model():
 
     print(f"   Found {len(train_corpus)} scripts total.")
 
+    stats = None
+    aliases = {}
+    if DEDUP_THRESHOLD is not None:
+        from corpus_dedup import dedup_corpus
+
+        print(f"1b. Removing near-duplicates (Jaccard >= {DEDUP_THRESHOLD})...")
+        start = time.perf_counter()
+        train_corpus, stats, aliases = dedup_corpus(train_corpus, DEDUP_THRESHOLD, workers=DEDUP_WORKERS)
+        print(f"   Kept {stats['kept_documents']} of {stats['documents']} scripts, "
+              f"{stats['kept_tokens']} of {stats['tokens']} tokens "
+              f"({100 * stats['token_reduction']:.1f}% fewer) in {time.perf_counter() - start:.1f} s")
+
     print("2. Initializing Doc2Vec model...")
     model = Doc2Vec(vector_size=VECTOR_SIZE, 
                     min_count=1,      
@@ -76,10 +95,23 @@ def train_qasm_model():
     model.build_vocab(train_corpus)
 
     print("4. Training...")
+    start = time.perf_counter()
     model.train(train_corpus, total_examples=model.corpus_count, epochs=model.epochs)
+    elapsed = time.perf_counter() - start
+    print(f"   Training took {elapsed:.1f} s")
+    if stats is not None and stats['kept_tokens']:
+        # Every kept document has one tag, so training time is roughly linear in the words trained on.
+        full = elapsed * stats['tokens'] / stats['kept_tokens']
+        print(f"   Estimated time on the full corpus: {full:.1f} s (saved ~{full - elapsed:.1f} s)")
+    if aliases:
+        # Dropped near-duplicates get their representative's vector.
+        keys = list(aliases)
+        model.dv.add_vectors(keys, model.dv[[aliases[k] for k in keys]])
+        print(f"   {len(keys)} near-duplicate tags share their representative's vector")
 
     print("5. Saving model...")
-    model.save(MODEL_PATH)
+    # Every array in its own .npy file, so gen_embeddings.py can memory-map them.
+    model.save(MODEL_PATH, sep_limit=0)
     print(f"   Model saved to '{MODEL_PATH}'")
     
     return model
@@ -0,0 +1,87 @@
+"""
+train_runtime_mps.py
+
+Trains the runtime model with the symbolic MPS cost estimates as extra
+inputs: log10 flops and log10 memory at the row's threshold and precision
+(mps_cost_features.csv, written by qasm_parsing.py --mps_features). Other
+than those two columns, the inputs and target match
+runtime_xgboost_kfold.ipynb: the training_cache.py matrix and log10
+expected_runtime_sec of every sweep row.
+
+Before saving, the leave-circuit-out RMSE is printed with and without the
+MPS columns. The model goes to submission/xgb_runtime_mps_model.json,
+which runtime_prediction.py --mps_features loads.
+
+Usage (from the repo root):
+  python train_runtime_mps.py
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import GroupKFold
+
+from training_cache import CACHE_DIR, load_training_matrix
+
+params = dict(
+    n_estimators=400,
+    max_depth=4,
+    learning_rate=0.04,
+    subsample=0.8,
+    colsample_bytree=0.9,
+    objective="reg:squarederror",
+    random_state=42,
+)
+
+mps_columns = ['log10_mps_flops', 'log10_mps_memory_bytes']
+MODEL_PATH = "submission/xgb_runtime_mps_model.json"
+
+
+def group_rmse(X, y, groups):
+    rmses = []
+    for train_idx, val_idx in GroupKFold(n_splits=5).split(X, y, groups):
+        model = xgb.XGBRegressor(**params)
+        model.fit(X.iloc[train_idx], y.iloc[train_idx])
+        rmses.append(np.sqrt(mean_squared_error(y.iloc[val_idx], model.predict(X.iloc[val_idx]))))
+    return np.mean(rmses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the runtime model with MPS cost features")
+    parser.add_argument("--public_csv", type=str, default="extracted_public_data.csv")
+    parser.add_argument("--features", type=str, default="qasm_features_scaled.csv")
+    parser.add_argument("--embeddings", type=str, default="generated_embeddings.csv")
+    parser.add_argument("--mps_features", type=str, default="mps_cost_features.csv")
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR,
+                        help="Training matrix cache (rebuilt automatically when a source CSV changes)")
+    args = parser.parse_args()
+
+    tm = load_training_matrix(args.public_csv, args.features, args.embeddings, args.cache_dir)
+    data = tm.frame()
+    # MPS features are looked up by precision name; the cache holds it encoded.
+    data['precision_name'] = data['task'].str.split('|').str[2]
+    mps = pd.read_csv(args.mps_features)
+    inputs = pd.merge(data, mps, left_on=['circuit', 'precision_name', 'threshold'],
+                      right_on=['name', 'precision', 'threshold'], how='inner', suffixes=('', '_mps'))
+    groups = inputs['circuit']
+    y = np.log10(inputs['runtime'])
+
+    # Runtime model column order, with the MPS columns appended last
+    # (the order runtime_prediction.py --mps_features builds).
+    X = inputs[tm.feature_cols + mps_columns].astype(float)
+
+    base = group_rmse(X.drop(columns=mps_columns), y, groups)
+    with_mps = group_rmse(X, y, groups)
+    print(f"Leave-circuit-out RMSE (log10 s): {base:.4f} without MPS features, {with_mps:.4f} with")
+
+    model = xgb.XGBRegressor(**params)
+    model.fit(X, y)
+    model.save_model(MODEL_PATH)
+    print(f"Model saved as {MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+train_shot_runtime.py
+
+Trains the two halves of the shot-count-aware runtime model:
+
+    runtime(shots) = setup_s + shots * per_shot_s
+
+from the forward_timing_estimates of every result (extracted_timing_data.csv,
+written by extract_public_json.py). The sweep rows and per-circuit inputs
+come from the training_cache.py matrix. Each term gets its own XGBoost regressor
+on log10 seconds, using the same inputs as the runtime model (precision,
+backend, normalized threshold, scaled QASM features, embeddings). The
+models are saved to submission/, where runtime_prediction.py --shots picks
+them up.
+
+The split is only measured at each task's selected threshold, and which
+threshold that is depends on the circuit, so rows at that threshold alone
+leave the threshold effect confounded with the circuit. Every task is
+therefore expanded to all rungs of its threshold sweep
+(the cached sweep rows): both terms are scaled by the measured sweep
+run_wall_s at that rung over the one at the selected rung. This assumes the
+setup/per-shot proportion does not change with the threshold; the threshold
+effect itself comes from measurements on the same circuit.
+
+Usage (from the repo root, after extract_public_json.py):
+  python train_shot_runtime.py
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import GroupKFold
+
+from training_cache import CACHE_DIR, load_training_matrix
+
+mapping = {
+    "precision": {"single": 0, "double": 1},
+    "backend": {"GPU": 0, "CPU": 1}
+}
+
+params = dict(
+    n_estimators=400,
+    max_depth=3,
+    learning_rate=0.05,
+    subsample=0.8,
+    colsample_bytree=0.8,
+    objective="reg:squarederror",
+    random_state=42,
+)
+
+targets = {
+    "setup_sec": "submission/xgb_setup_model.json",
+    "per_shot_sec": "submission/xgb_per_shot_model.json",
+}
+
+
+def expand_to_sweep(timing, sweep):
+    """One row per (task, sweep rung): the selected rung's terms scaled by the sweep wall-time ratio."""
+    task = ['circuit', 'precision', 'backend']
+    selected = pd.merge(timing, sweep, on=task + ['threshold'], how='inner')
+    selected = selected.rename(columns={'threshold': 'selected_threshold',
+                                        'expected_runtime_sec': 'selected_wall'})
+    rows = pd.merge(selected, sweep, on=task, how='inner')
+    ratio = rows['expected_runtime_sec'] / rows['selected_wall']
+    rows['setup_sec'] = rows['setup_sec'] * ratio
+    rows['per_shot_sec'] = rows['per_shot_sec'] * ratio
+    print(f"{len(selected)} tasks expanded to {len(rows)} sweep rows")
+    return rows[task + ['threshold', 'setup_sec', 'per_shot_sec']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train setup and per-shot runtime models")
+    parser.add_argument("--timing_csv", type=str, default="extracted_timing_data.csv")
+    parser.add_argument("--public_csv", type=str, default="extracted_public_data.csv")
+    parser.add_argument("--features", type=str, default="qasm_features_scaled.csv")
+    parser.add_argument("--embeddings", type=str, default="generated_embeddings.csv")
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR,
+                        help="Training matrix cache (rebuilt automatically when a source CSV changes)")
+    args = parser.parse_args()
+
+    tm = load_training_matrix(args.public_csv, args.features, args.embeddings, args.cache_dir)
+    data = tm.frame()
+    data[['backend_name', 'precision_name']] = data['task'].str.split('|', expand=True)[[1, 2]]
+    sweep = data[['circuit', 'precision_name', 'backend_name', 'threshold', 'runtime']].rename(columns={
+        'precision_name': 'precision', 'backend_name': 'backend', 'runtime': 'expected_runtime_sec'})
+
+    timing = pd.read_csv(args.timing_csv).dropna()
+    timing = expand_to_sweep(timing, sweep)
+    timing = timing.replace(mapping)
+    timing['normalized_threshold'] = (1/8) * np.log2(timing['threshold'])
+
+    # Scaled features and embeddings are per circuit: the cache columns after the three task columns.
+    circuit_cols = tm.feature_cols[3:]
+    inputs = pd.merge(timing, data.drop_duplicates('circuit')[['circuit'] + circuit_cols], on='circuit', how='inner')
+    groups = inputs['circuit']
+
+    # Same column order the runtime model sees in runtime_prediction.py.
+    X = inputs[tm.feature_cols].astype(float)
+
+    for target, model_path in targets.items():
+        y = np.log10(inputs[target])
+
+        rmses = []
+        for train_idx, val_idx in GroupKFold(n_splits=5).split(X, y, groups):
+            model = xgb.XGBRegressor(**params)
+            model.fit(X.iloc[train_idx], y.iloc[train_idx])
+            rmses.append(np.sqrt(mean_squared_error(y.iloc[val_idx], model.predict(X.iloc[val_idx]))))
+        print(f"{target}: leave-circuit-out RMSE (log10 s) = {np.mean(rmses):.4f}")
+
+        model = xgb.XGBRegressor(**params)
+        model.fit(X, y)
+        model.save_model(model_path)
+        print(f"Model saved as {model_path}")
+
+
+if __name__ == "__main__":
+    main()
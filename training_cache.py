@@ -0,0 +1,247 @@
+"""
+training_cache.py
+
+Materialized training matrix for the fidelity/runtime models.
+
+Every notebook run rebuilds the same inputs: it reads extracted_public_data.csv,
+qasm_features_scaled.csv and generated_embeddings.csv, applies the encoding
+mapping, does two merges and drops columns. This module does that once and
+writes the result to a cache directory:
+
+    X.npy        float32 [rows, features], C-contiguous (open with mmap_mode='r')
+    labels.npz   circuit, task ("file|backend|precision"), threshold, fidelity, runtime
+    meta.json    format, feature column names, number of labeled rows, and
+                 size/mtime/sha256 of each source file
+
+Rows with both labels come first, in their original order, so the training
+rows are a prefix of X and TrainingMatrix.arrays() hands out a slice of the
+memory map without copying it.
+
+load_training_matrix() memory-maps the cache when it is current and rebuilds
+it when any source changed. A changed size or mtime triggers a hash check,
+so touching a file without editing it does not force a rebuild; the new
+mtime is then stored so the next load skips the hash. load() does the same
+with the repo-root source files. TrainingMatrix.arrays() gives X and the
+labels as NumPy arrays, which the notebooks pass straight to XGBoost;
+TrainingMatrix.frame() gives the pandas view the training scripts work on.
+
+Usage (from the repo root):
+  python training_cache.py                # build or refresh training_cache/
+  python training_cache.py --force        # rebuild unconditionally
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+CACHE_FORMAT = "train-cache-v2"
+CACHE_DIR = "training_cache"
+SOURCES = ("extracted_public_data.csv", "qasm_features_scaled.csv", "generated_embeddings.csv")
+
+mapping = {
+    "precision": {"single": 0, "double": 1},
+    "backend": {"GPU": 0, "CPU": 1}
+}
+
+
+def normalized_threshold(threshold):
+    return (1/8) * np.log2(threshold)
+
+
+def build_training_frame(public_csv, features_csv, embeddings_csv):
+    """Same joins as the *_xgboost_kfold notebooks; returns (frame, feature column names)."""
+    public_data = pd.read_csv(public_csv)
+    public_data['task'] = public_data['circuit'] + "|" + public_data['backend'] + "|" + public_data['precision']
+    public_data = public_data.replace(mapping)
+    public_data['normalized_threshold'] = normalized_threshold(public_data['threshold'])
+
+    features = pd.read_csv(features_csv)
+    embeddings = pd.read_csv(embeddings_csv)
+    if 'Unnamed: 0' in embeddings.columns:
+        embeddings = embeddings.drop(columns=['Unnamed: 0'])
+
+    frame = pd.merge(public_data, features, left_on='circuit', right_on='name', how='inner')
+    frame = pd.merge(frame, embeddings, left_on='circuit', right_on='name', how='inner')
+    frame = frame.drop(columns=['name_x', 'name_y']).reset_index(drop=True)
+
+    feature_cols = ['precision', 'backend', 'normalized_threshold'] + [
+        c for c in frame.columns
+        if c not in ('circuit', 'task', 'precision', 'backend', 'threshold', 'fidelity',
+                     'expected_runtime_sec', 'normalized_threshold')
+    ]
+    return frame, feature_cols
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _source_stamp(path, with_hash=True):
+    st = os.stat(path)
+    stamp = {"path": str(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if with_hash:
+        stamp["sha256"] = _file_hash(path)
+    return stamp
+
+
+def _is_current(meta, sources):
+    """
+    (current, refreshed). Stamps whose content the hash confirmed get the new
+    mtime in `meta`; refreshed says meta.json should be rewritten.
+    """
+    if meta.get("format") != CACHE_FORMAT or len(meta.get("sources", [])) != len(sources):
+        return False, False
+    refreshed = False
+    for old, path in zip(meta["sources"], sources):
+        st = os.stat(path)
+        if old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+            continue
+        if old["size"] != st.st_size or old["sha256"] != _file_hash(path):
+            return False, False
+        old["mtime_ns"] = st.st_mtime_ns
+        refreshed = True
+    return True, refreshed
+
+
+def _atomic_save(path, write):
+    # A unique temp name, so concurrent builds never write into each other's file.
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        # mkstemp creates the file 0600; give it the mode a plain open() would have.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0o666 & ~umask)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _save_meta(path, meta):
+    _atomic_save(path, lambda f: f.write((json.dumps(meta, indent=2) + "\n").encode()))
+
+
+def build_cache(public_csv, features_csv, embeddings_csv, cache_dir=CACHE_DIR):
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # An old meta.json must not vouch for half-written arrays.
+    (cache_dir / "meta.json").unlink(missing_ok=True)
+
+    frame, feature_cols = build_training_frame(public_csv, features_csv, embeddings_csv)
+    labeled = frame[['fidelity', 'expected_runtime_sec']].notna().all(axis=1).to_numpy()
+    frame = frame.iloc[np.argsort(~labeled, kind='stable')].reset_index(drop=True)
+    X = np.ascontiguousarray(frame[feature_cols].to_numpy(dtype=np.float32))
+
+    _atomic_save(cache_dir / "X.npy", lambda f: np.save(f, X))
+    _atomic_save(cache_dir / "labels.npz", lambda f: np.savez(
+        f,
+        circuit=frame['circuit'].to_numpy(dtype=str),
+        task=frame['task'].to_numpy(dtype=str),
+        threshold=frame['threshold'].to_numpy(dtype=np.float64),
+        fidelity=frame['fidelity'].to_numpy(dtype=np.float64),
+        runtime=frame['expected_runtime_sec'].to_numpy(dtype=np.float64),
+    ))
+    meta = {
+        "format": CACHE_FORMAT,
+        "rows": int(X.shape[0]),
+        "labeled_rows": int(labeled.sum()),
+        "feature_cols": feature_cols,
+        "sources": [_source_stamp(p) for p in (public_csv, features_csv, embeddings_csv)],
+    }
+    # meta.json goes last: its presence marks a complete cache.
+    _save_meta(cache_dir / "meta.json", meta)
+    return cache_dir
+
+
+class TrainingMatrix:
+    """Memory-mapped X plus label arrays of one cache directory."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        cache_dir = Path(cache_dir)
+        self.path = cache_dir
+        self.meta = json.loads((cache_dir / "meta.json").read_text(encoding="utf-8"))
+        self.feature_cols = self.meta["feature_cols"]
+        self.X_path = cache_dir / "X.npy"
+        self.labels_path = cache_dir / "labels.npz"
+        self.X = np.load(self.X_path, mmap_mode='r')
+        with np.load(self.labels_path) as z:
+            self.labels = {k: z[k] for k in z.files}
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def arrays(self, dropna=True):
+        """
+        (X, labels) without copies: X is a slice of the float32 memory map and
+        labels maps each label name to its array. dropna keeps only the rows
+        with both labels, as the notebooks' public_data.dropna() did.
+        """
+        n = self.meta["labeled_rows"] if dropna else len(self)
+        return self.X[:n], {k: v[:n] for k, v in self.labels.items()}
+
+    def frame(self, dropna=True):
+        """
+        Labels (circuit, task, threshold, fidelity, runtime) followed by the
+        feature_cols, one row per sweep row; rows as in arrays().
+        """
+        X, labels = self.arrays(dropna)
+        frame = pd.DataFrame({k: labels[k] for k in ('circuit', 'task', 'threshold', 'fidelity', 'runtime')})
+        return pd.concat([frame, pd.DataFrame(np.asarray(X), columns=self.feature_cols)], axis=1)
+
+
+def name_features(model, feature_cols):
+    """Store the column names and types on a model fitted on arrays(), as a DataFrame fit would; returns it."""
+    booster = model.get_booster()
+    booster.feature_names = list(feature_cols)
+    booster.feature_types = ['float'] * len(feature_cols)
+    return model
+
+
+def load_training_matrix(public_csv, features_csv, embeddings_csv, cache_dir=CACHE_DIR, force=False):
+    """TrainingMatrix for the given sources, rebuilding the cache first if it is missing or stale."""
+    sources = (public_csv, features_csv, embeddings_csv)
+    meta_path = Path(cache_dir) / "meta.json"
+    current = False
+    if not force and meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        current, refreshed = _is_current(meta, sources)
+        if refreshed:
+            _save_meta(meta_path, meta)
+    if not current:
+        build_cache(public_csv, features_csv, embeddings_csv, cache_dir)
+    return TrainingMatrix(cache_dir)
+
+
+def load(cache_dir=CACHE_DIR, force=False):
+    """load_training_matrix() for the default sources, relative to the current (repo root) directory."""
+    return load_training_matrix(*SOURCES, cache_dir=cache_dir, force=force)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the materialized training matrix")
+    parser.add_argument("--public_csv", type=str, default=SOURCES[0])
+    parser.add_argument("--features", type=str, default=SOURCES[1])
+    parser.add_argument("--embeddings", type=str, default=SOURCES[2])
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the cache is current")
+    args = parser.parse_args()
+
+    tm = load_training_matrix(args.public_csv, args.features, args.embeddings, args.cache_dir, args.force)
+    print(f"{tm.path}: {len(tm)} rows x {len(tm.feature_cols)} features ({tm.X.dtype}, {tm.X.nbytes} bytes)")
+
+
+if __name__ == "__main__":
+    main()